@@ -19,7 +19,6 @@
 
 
 import re
-import hashlib
 import urllib
 
 from weboob.deprecated.browser import Page, BrowserIncorrectPassword
@@ -64,15 +63,13 @@ class VirtKeyboard(MappedVirtKeyboard):
 
     def checksum(self, coords):
         x1, y1, x2, y2 = coords
-        s = ''
-        for y in range(y1, min(y2 + 1, self.height)):
-            for x in range(x1, min(x2 + 1, self.width)):
-                # strip pixels on borders
-                if self.check_color(self.pixar[x, y]) and x > x1+2 and y > y1+2 and x < x2-2 and y < y2-2:
-                    s += "."
-                else:
-                    s += " "
-        return hashlib.md5(s).hexdigest()
+        mask = self.get_mask()[y1:y2 + 1, x1:x2 + 1].copy()
+        # strip pixels on borders
+        mask[:3] = False
+        mask[max(y2 - y1 - 2, 0):] = False
+        mask[:, :3] = False
+        mask[:, max(x2 - x1 - 2, 0):] = False
+        return self.fingerprint(mask)
 
 
 class LoginPage(Page):
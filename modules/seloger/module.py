@@ -36,6 +36,9 @@ class SeLogerModule(Module, CapHousing):
     LICENSE = 'AGPLv3+'
     ICON = 'http://static.poliris.com/z/portail/svx/portals/sv6_gen/favicon.png'
     BROWSER = SeLogerBrowser
+    # details of housings are fetched from a stateless webservice, so
+    # several of them can be filled at the same time
+    BROWSERS_POOL_SIZE = 4
 
     def search_housings(self, query):
         cities = [c.id for c in query.cities if c.backend == self.name]
@@ -19,6 +19,7 @@
 
 import hashlib
 
+import numpy
 from PIL import Image
 
 from weboob.tools.log import getLogger
@@ -37,20 +38,28 @@ class Captcha(object):
         self.nbr = int(infos["nbrows"])
         self.nbc = int(infos["nbcols"])
         (self.nx, self.ny) = self.inim.size
-        self.inmat = self.inim.load()
+        self.inmat = numpy.asarray(self.inim)
         self.map = {}
 
         self.tiles = [[Tile(y * self.nbc + x) for y in xrange(4)] for x in xrange(4)]
 
     def __getitem__(self, coords):
         x, y = coords
-        return self.inmat[x % self.nx, y % self.ny]
+        return tuple(self.inmat[y % self.ny, x % self.nx])
 
     def all_coords(self):
         for y in xrange(self.ny):
             for x in xrange(self.nx):
                 yield x, y
 
+    def get_block(self, x, y, width, height):
+        """
+        Get pixels of a rectangle, as an array indexed by [y, x], wrapping
+        around edges of the image.
+        """
+        return self.inmat.take(xrange(y, y + height), axis=0, mode='wrap') \
+                         .take(xrange(x, x + width), axis=1, mode='wrap')
+
     def get_codes(self, code):
         s = ''
         num = 0
@@ -71,10 +80,7 @@ class Captcha(object):
                 x = tx * 24
 
                 tile = self.tiles[tx][ty]
-
-                for yy in xrange(y, y + 23):
-                    for xx in xrange(x, x + 24):
-                        tile.map.append(self[xx, yy])
+                tile.map = self.get_block(x, y, 24, 23)
 
                 num = tile.get_num()
                 if num > -1:
@@ -83,6 +89,9 @@ class Captcha(object):
 
 
 class Tile(object):
+    # '%02d' of each value a pixel component can have
+    DIGITS = ['%02d' % i for i in xrange(256)]
+
     hash = {'ff1441b2c5f90703ef04e688e399aca5': 1,
             '53d7f3dfd64f54723b231fc398b6be57': 2,
             '5bcba7fa2107ba9a606e8d0131c162eb': 3,
@@ -112,16 +121,13 @@ class Tile(object):
         self.id = _id
         self.valid = False
         self.logger = getLogger('societegenerale.captcha')
-        self.map = []
+        self.map = None
 
     def __repr__(self):
         return "<Tile(%02d) valid=%s>" % (self.id, self.valid)
 
     def checksum(self):
-        s = ''
-        for pxls in self.map:
-            for pxl in pxls:
-                s += '%02d' % pxl
+        s = ''.join(map(self.DIGITS.__getitem__, self.map.ravel().tolist()))
         return hashlib.md5(s).hexdigest()
 
     def get_num(self):
@@ -134,6 +140,5 @@ class Tile(object):
 
     def display(self):
         self.logger.debug(self.checksum())
-        #im = Image.new('RGB', (24, 23))
-        #im.putdata(self.map)
+        #im = Image.fromarray(self.map)
         #im.save('/tmp/%s.png' % self.checksum())
@@ -180,6 +180,10 @@ def install_weboob():
         data_files=data_files,
 
         install_requires=requirements,
+        # only needed by modules with virtual keyboards
+        extras_require={
+            'captcha': ['numpy'],
+        },
     )
 
 
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2017 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure memory and time used to build capability objects, with the
+implementation of this tree and with the one of an older git revision.
+
+Each implementation is measured in its own process, as memory released by
+Python is not given back to the system.
+
+Usage: benchmark_objects.py REVISION [COUNT]
+"""
+
+from __future__ import print_function
+
+import datetime
+import gc
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss():
+    """
+    Resident memory of the process, in bytes (Linux only).
+    """
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def build(count):
+    from weboob.capabilities.bank import Transaction
+
+    objs = []
+    date = datetime.date(2017, 1, 1)
+    for i in xrange(count):
+        tr = Transaction(u'%d' % i)
+        tr.date = date
+        tr.rdate = date
+        tr.raw = u'CB CARREFOUR %d' % i
+        tr.label = u'CARREFOUR'
+        tr.amount = Decimal('-12.50')
+        objs.append(tr)
+    return objs
+
+
+def measure(tree, count):
+    sys.path.insert(0, tree)
+    import weboob
+    assert os.path.dirname(os.path.dirname(os.path.abspath(weboob.__file__))) == os.path.abspath(tree)
+    # import everything before measuring memory
+    build(1)
+
+    gc.collect()
+    before = rss()
+    start = time.time()
+    objs = build(count)
+    elapsed = time.time() - start
+    gc.collect()
+    used = rss() - before
+    assert len(objs) == count
+    return used, elapsed
+
+
+def export(revision):
+    """
+    Extract the weboob package of a git revision in a temporary directory.
+    """
+    tree = tempfile.mkdtemp(prefix='weboob_benchmark_')
+    archive = subprocess.Popen(['git', 'archive', revision, 'weboob'], cwd=ROOT, stdout=subprocess.PIPE)
+    subprocess.check_call(['tar', '-x', '-C', tree], stdin=archive.stdout)
+    archive.stdout.close()
+    if archive.wait() != 0:
+        shutil.rmtree(tree)
+        raise SystemExit('Unable to export revision %s' % revision)
+    return tree
+
+
+def main(revision, count=100000):
+    print('Building %d transactions' % count)
+    old_tree = export(revision)
+    try:
+        for name, tree in ((revision, old_tree), ('current', ROOT)):
+            out = subprocess.check_output([sys.executable, __file__, '--measure', tree, str(count)])
+            used, elapsed = out.split()
+            used, elapsed = int(used), float(elapsed)
+            print('%-12s %8.1f MiB %8.2f s  (%d bytes/object)' % (name, used / 1024. / 1024, elapsed, used // count))
+    finally:
+        shutil.rmtree(old_tree)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--measure':
+        print('%d %f' % measure(sys.argv[2], int(sys.argv[3])))
+    elif len(sys.argv) in (2, 3):
+        main(sys.argv[1], *[int(arg) for arg in sys.argv[2:3]])
+    else:
+        print(__doc__.strip(), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2017 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmarks of the parsing of pages by browsers.
+
+Each benchmark builds a page of realistic size and measures the stages
+modules go through to get objects from it:
+
+* decode: decoding of the content of the response;
+* parse: building of the document by the Page class (pages parsing
+  text also decode it);
+* select: selection of the nodes of items by the ListElement;
+* filter: evaluation of filters of ItemElement on every node;
+* build: iteration on the ListElement, which builds objects (filters
+  included).
+
+Run it with ``python tools/benchmarks [-h]``. Results are appended to a file
+so runs can be compared over time.
+"""
+
+from __future__ import print_function
+
+import gc
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+__all__ = ['Benchmark', 'Measure', 'measure']
+
+
+STAGES = ('decode', 'parse', 'select', 'filter', 'build')
+
+
+class Measure(object):
+    """
+    Result of a stage.
+
+    Memory is measured on what a run leaves allocated, including its
+    result, not on the total of its allocations, which Python 2 can't count.
+
+    :param time: best time of a run, in seconds
+    :param containers: net number of objects tracked by the garbage
+                       collector (lists, dicts, instances...) left by a run
+    :param blocks: net number of memory blocks left by a run (only with
+                   :func:`sys.getallocatedblocks`, on Python 3)
+    :param peak: peak of memory allocated by a run, in bytes (only with
+                 tracemalloc, on Python 3)
+    """
+
+    def __init__(self, time, containers, blocks=None, peak=None):
+        self.time = time
+        self.containers = containers
+        self.blocks = blocks
+        self.peak = peak
+
+    def to_dict(self):
+        return {'time': self.time, 'containers': self.containers, 'blocks': self.blocks, 'peak': self.peak}
+
+
+def measure(func, setup=None, repeat=5):
+    """
+    Measure a function.
+
+    :param func: function to measure, called with the value returned by *setup*
+    :param setup: function called before each run, not measured
+    :param repeat: number of runs, the best time is kept
+    :rtype: :class:`Measure`
+    """
+    def run():
+        arg = setup() if setup is not None else None
+        start = time.time()
+        result = func(arg)
+        return time.time() - start, result
+
+    best = min(run()[0] for _ in range(repeat))
+
+    # Allocations are measured on an other run, as tracing slows it down.
+    arg = setup() if setup is not None else None
+    gc.collect()
+    gc.disable()
+    try:
+        if tracemalloc is not None:
+            tracemalloc.start()
+        blocks_before = sys.getallocatedblocks() if hasattr(sys, 'getallocatedblocks') else None
+        before = gc.get_count()[0]
+        result = func(arg)
+        containers = gc.get_count()[0] - before
+        blocks = None
+        if blocks_before is not None:
+            blocks = sys.getallocatedblocks() - blocks_before
+        peak = None
+        if tracemalloc is not None:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    finally:
+        gc.enable()
+    del result
+
+    return Measure(best, containers, blocks, peak)
+
+
+class Benchmark(object):
+    """
+    Base class of benchmarks.
+
+    Subclasses implement a method for each stage they measure, which get
+    the result of :meth:`setup_STAGE` (if defined) as argument.
+    """
+
+    NAME = None
+
+    def run_stage(self, stage, repeat=5):
+        """
+        :rtype: :class:`Measure`
+        """
+        return measure(getattr(self, stage), getattr(self, 'setup_%s' % stage, None), repeat)
+
+    def run(self, repeat=5):
+        """
+        :rtype: dict[:class:`str`, :class:`Measure`]
+        """
+        return dict((stage, self.run_stage(stage, repeat)) for stage in STAGES if hasattr(self, stage))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2017 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Usage: python tools/benchmarks [options] [BENCHMARK...]
+
+Run benchmarks of the parsing of pages, compare results with the previous
+stored run, and store them.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from optparse import OptionParser
+
+if not __package__:
+    # run as "python tools/benchmarks": make the benchmarks package and
+    # weboob importable
+    TOOLS_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.dirname(TOOLS_PATH))
+    sys.path.insert(0, TOOLS_PATH)
+
+from benchmarks import STAGES
+from benchmarks.parsing import BENCHMARKS
+
+
+DEFAULT_RESULTS = os.path.join(os.environ.get('XDG_DATA_HOME', os.path.join(os.path.expanduser('~'), '.local', 'share')),
+                               'weboob', 'benchmarks.json')
+
+
+def get_revision():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+                                           cwd=os.path.dirname(os.path.abspath(__file__)),
+                                           stderr=devnull).strip().decode('ascii')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_runs(path):
+    """
+    Get stored runs; the file contains a JSON document for each line.
+    """
+    runs = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    runs.append(json.loads(line))
+    return runs
+
+
+def store_run(path, run):
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    with open(path, 'a') as f:
+        f.write(json.dumps(run, sort_keys=True) + '\n')
+
+
+def format_delta(value, previous):
+    if not previous:
+        return ''
+    return '%+6.1f%%' % ((value - previous) * 100. / previous)
+
+
+def main():
+    parser = OptionParser(usage=__doc__.strip())
+    parser.add_option('-r', '--repeat', type='int', default=5, help='runs of each stage (default: %default)')
+    parser.add_option('-f', '--results', default=DEFAULT_RESULTS, help='file where results are stored (default: %default)')
+    parser.add_option('-n', '--no-store', action='store_true', help='do not store results')
+    parser.add_option('-l', '--list', action='store_true', help='list benchmarks')
+    options, args = parser.parse_args()
+
+    if options.list:
+        for klass in BENCHMARKS:
+            print(klass.NAME)
+        return 0
+
+    benchmarks = [klass for klass in BENCHMARKS if not args or klass.NAME in args]
+    if not benchmarks:
+        parser.error('unknown benchmark(s): %s' % ', '.join(args))
+
+    runs = load_runs(options.results)
+    previous = runs[-1]['results'] if runs else {}
+    if runs:
+        print('Compared with the run of %s (%s)' % (runs[-1]['date'], runs[-1]['revision']))
+
+    print('%-20s %-7s %10s %8s %10s %10s %10s' % ('benchmark', 'stage', 'time', 'delta', 'containers', 'blocks', 'peak'))
+    results = {}
+    for klass in benchmarks:
+        bench = klass()
+        results[klass.NAME] = {}
+        for stage in STAGES:
+            if not hasattr(bench, stage):
+                continue
+            m = bench.run_stage(stage, options.repeat)
+            results[klass.NAME][stage] = m.to_dict()
+            prev = previous.get(klass.NAME, {}).get(stage, {}).get('time')
+            print('%-20s %-7s %8.1fms %8s %10d %10s %10s' % (klass.NAME, stage, m.time * 1000, format_delta(m.time, prev),
+                                                            m.containers, m.blocks if m.blocks is not None else '-',
+                                                            '%dk' % (m.peak // 1024) if m.peak is not None else '-'))
+            sys.stdout.flush()
+
+    if not options.no_store:
+        store_run(options.results, {'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                    'revision': get_revision(),
+                                    'python': platform.python_version(),
+                                    'results': results,
+                                   })
+        print('Results stored in %s' % options.results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2017 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Pages used by benchmarks.
+
+They are generated with a fixed seed, so every run parses the same
+content, and mimic the markup of real websites: layout around the data,
+nested nodes, whitespaces, non-ASCII text, and French formats of dates
+and amounts.
+"""
+
+from __future__ import print_function
+
+import datetime
+import json
+from random import Random
+
+
+__all__ = ['bank_history_html', 'bank_history_json', 'bank_history_csv', 'housing_list_html']
+
+
+LABELS = [u'CB CARREFOUR MARKET %d', u'PRLV SEPA EDF CLIENTS PARTICULIERS', u'VIR SEPA M. DUPONT JEAN',
+          u'CB SNCF INTERNET %d', u'RETRAIT DAB %d BD HAUSSMANN', u'CHQ N°%07d', u'COTIS CARTE VISA PREMIER',
+          u'CB BOULANGERIE DU MARCHÉ', u'PRLV SEPA FREE MOBILE', u'VIR SALAIRE ÉTABLISSEMENT %d']
+
+CITIES = [u'Paris 11ème', u'Lyon 3ème', u'Montréal', u'Saint-Étienne', u'Nantes', u'Aix-en-Provence']
+
+LAYOUT = u"""<!DOCTYPE html>
+<html>
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=%(charset)s">
+<title>%(title)s</title>
+<link rel="stylesheet" href="/static/css/main.css">
+<script type="text/javascript">
+var config = {"tracking": true, "user": "1234567", "menu": [%(menu_js)s]};
+</script>
+</head>
+<body>
+<div id="header"><ul class="menu">%(menu)s</ul></div>
+<div id="content">
+%(content)s
+</div>
+<div id="footer"><p>Mentions légales &mdash; Tarifs &mdash; Sécurité</p></div>
+</body>
+</html>
+"""
+
+
+def layout(title, content, charset='utf-8'):
+    menu = [u'Comptes', u'Virements', u'Bourse', u'Crédits', u'Épargne', u'Assurances', u'Services']
+    return LAYOUT % {'charset': charset,
+                     'title': title,
+                     'menu_js': u', '.join(u'"%s"' % item for item in menu * 20),
+                     'menu': u''.join(u'<li><a href="/%d">%s</a></li>' % (i, item) for i, item in enumerate(menu * 20)),
+                     'content': content,
+                    }
+
+
+def french_amount(value):
+    """
+    >>> french_amount(-1234.5)
+    u'-1 234,50'
+    """
+    integer, decimals = (u'%.2f' % abs(value)).split(u'.')
+    groups = []
+    while integer:
+        groups.insert(0, integer[-3:])
+        integer = integer[:-3]
+    return u'%s%s,%s' % (u'-' if value < 0 else u'', u' '.join(groups), decimals)
+
+
+def iter_transactions(rows, seed=42):
+    rand = Random(seed)
+    date = datetime.date(2017, 1, 1)
+    for i in range(rows):
+        if rand.random() < 0.4:
+            date -= datetime.timedelta(days=1)
+        label = rand.choice(LABELS)
+        if u'%' in label:
+            label = label % rand.randint(1, 9999999)
+        amount = round(rand.uniform(-1500, 300), 2) if rand.random() < 0.9 else round(rand.uniform(500, 4000), 2)
+        yield i, date, label, amount
+
+
+def bank_history_html(rows=5000):
+    """
+    History of a bank account, in a table with debit and credit columns,
+    declared as iso-8859-1.
+
+    :rtype: :class:`bytes`
+    """
+    lines = []
+    for i, date, label, amount in iter_transactions(rows):
+        lines.append(u"""<tr class="%s">
+  <td class="date"><span>%s</span></td>
+  <td class="label"><a href="/operation/%d" title="Détail">%s</a>
+      <div class="details">  %s  </div></td>
+  <td class="amount debit">%s</td>
+  <td class="amount credit">%s</td>
+</tr>""" % ('odd' if i % 2 else 'even', date.strftime('%d/%m/%Y'), i, label, label.lower(),
+            french_amount(-amount) + u' €' if amount < 0 else u'',
+            french_amount(amount) + u' €' if amount >= 0 else u''))
+
+    content = u"""<h1>Compte chèque n°0123456789</h1>
+<table id="history" class="table">
+<thead><tr><th>Date</th><th>Libellé</th><th>Débit</th><th>Crédit</th></tr></thead>
+<tbody>
+%s
+</tbody>
+</table>""" % u'\n'.join(lines)
+    return layout(u'Historique du compte', content, 'iso-8859-1').encode('iso-8859-1', 'xmlcharrefreplace')
+
+
+def bank_history_json(rows=5000):
+    """
+    History of a bank account, as returned by APIs of mobile applications.
+
+    :rtype: :class:`bytes`
+    """
+    transactions = []
+    for i, date, label, amount in iter_transactions(rows):
+        transactions.append({'id': u'%08d' % i,
+                             'dateOperation': date.strftime('%Y-%m-%d'),
+                             'dateValeur': date.strftime('%Y-%m-%d'),
+                             'libelle': label,
+                             'montant': {'valeur': u'%.2f' % amount, 'devise': u'EUR'},
+                             'categorie': {'code': i % 40, 'libelle': u'Catégorie %d' % (i % 40)},
+                            })
+    return json.dumps({'compte': {'numero': u'0123456789', 'solde': 1234.56},
+                       'operations': transactions}, indent=2).encode('utf-8')
+
+
+def bank_history_csv(rows=5000):
+    """
+    History of a bank account, as downloaded from websites, with a header
+    line, semicolons and windows newlines.
+
+    :rtype: :class:`bytes`
+    """
+    lines = [u'Date;Libellé;Montant;Devise']
+    for i, date, label, amount in iter_transactions(rows):
+        lines.append(u'%s;"%s";%s;EUR' % (date.strftime('%d/%m/%Y'), label, french_amount(amount)))
+    return u'\r\n'.join(lines).encode('utf-8')
+
+
+def housing_list_html(listings=500, seed=42):
+    """
+    Search results of a housing website, with photos and descriptions.
+
+    :rtype: :class:`bytes`
+    """
+    rand = Random(seed)
+    items = []
+    for i in range(listings):
+        area = rand.randint(12, 180)
+        cost = area * rand.randint(15, 40)
+        photos = u''.join(u'<li><img src="https://img.example.org/%d/%d.jpg" alt="Photo %d"></li>' % (i, j, j)
+                          for j in range(rand.randint(1, 8)))
+        items.append(u"""<article class="listing" data-id="%(id)d">
+  <header>
+    <h2 class="title"><a href="/annonce/%(id)d.htm">Appartement %(rooms)d pièces %(area)d m²</a></h2>
+    <span class="price">%(cost)s €<sup>CC</sup></span>
+  </header>
+  <ul class="photos">%(photos)s</ul>
+  <div class="infos">
+    <span class="area">%(area)d m²</span>
+    <span class="location">%(city)s</span>
+    <span class="date">publiée le %(date)s</span>
+  </div>
+  <p class="description">%(text)s</p>
+</article>""" % {'id': 100000 + i,
+                 'rooms': rand.randint(1, 6),
+                 'area': area,
+                 'cost': french_amount(cost).replace(u',00', u''),
+                 'photos': photos,
+                 'city': rand.choice(CITIES),
+                 'date': (datetime.date(2017, 1, 1) - datetime.timedelta(days=rand.randint(0, 90))).strftime('%d/%m/%Y'),
+                 'text': u' '.join([u'Bel appartement lumineux, proche des commerces et des transports, '
+                                    u'cuisine équipée, double vitrage, parquet.'] * rand.randint(1, 4)),
+                })
+
+    content = u"""<div class="results"><p class="count">%d annonces</p>
+%s
+<a class="next" href="/recherche?page=2">Page suivante</a>
+</div>""" % (listings, u'\n'.join(items))
+    return layout(u'Location appartements', content).encode('utf-8')
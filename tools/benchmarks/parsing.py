@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2017 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from weboob.browser.elements import ListElement, ItemElement, TableElement
+from weboob.browser.filters.html import Attr, Link
+from weboob.browser.filters.json import Dict
+from weboob.browser.filters.standard import CleanText, CleanDecimal, Date, Regexp, TableCell
+from weboob.browser.filters.standard import _Filter
+from weboob.browser.pages import HTMLPage, JsonPage, CsvPage
+from weboob.capabilities.bank import Transaction
+from weboob.capabilities.housing import Housing
+from weboob.tools.log import getLogger
+
+from . import Benchmark
+from . import fixtures
+
+
+__all__ = ['BENCHMARKS']
+
+
+class FakeBrowser(object):
+    def __init__(self):
+        self.logger = getLogger('benchmark')
+
+
+def build_response(content, content_type, url='https://www.example.org/'):
+    response = Response()
+    response.status_code = 200
+    response.url = url
+    response.headers = CaseInsensitiveDict({'Content-Type': content_type})
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = content
+    return response
+
+
+def iter_filters(list_element):
+    """
+    Evaluate filters of item elements on every node, without building
+    objects.
+    """
+    page = list_element.page
+    for el in list_element.find_elements():
+        for klass in list_element.get_items_classes():
+            item = klass(page, list_element, el)
+            for attr, func in klass.get_attrs_plan():
+                if isinstance(func, _Filter):
+                    yield item.use_selector(func, key=attr)
+
+
+class PageBenchmark(Benchmark):
+    """
+    Benchmark of a page class and a list element.
+    """
+
+    PAGE = None
+    LIST = None
+    CONTENT_TYPE = None
+
+    def __init__(self):
+        self.content = self.get_content()
+        self.browser = FakeBrowser()
+        self.page = self.PAGE(self.browser, self.new_response())
+
+    def get_content(self):
+        raise NotImplementedError()
+
+    def new_response(self):
+        return build_response(self.content, self.CONTENT_TYPE)
+
+    def setup_decode(self):
+        return self.new_response()
+
+    def decode(self, response):
+        return response.text
+
+    def setup_parse(self):
+        return self.new_response()
+
+    def parse(self, response):
+        return self.PAGE(self.browser, response)
+
+    def select(self, _):
+        return list(self.LIST(self.page).find_elements())
+
+    def filter(self, _):
+        return list(iter_filters(self.LIST(self.page)))
+
+    def build(self, _):
+        objs = list(self.LIST(self.page)())
+        assert len(objs) > 0
+        return objs
+
+
+class BankHistoryPage(HTMLPage):
+    class iter_history(TableElement):
+        head_xpath = '//table[@id="history"]/thead/tr/th'
+        item_xpath = '//table[@id="history"]/tbody/tr'
+
+        col_date = u'Date'
+        col_label = u'Libellé'
+        col_debit = u'Débit'
+        col_credit = u'Crédit'
+
+        class item(ItemElement):
+            klass = Transaction
+
+            obj_id = Regexp(Link('./td[2]/a'), r'/operation/(\d+)')
+            obj_date = Date(CleanText(TableCell('date')), dayfirst=True)
+            obj_rdate = Date(CleanText(TableCell('date')), dayfirst=True)
+            obj_raw = CleanText('./td[2]/a')
+            obj_label = CleanText('./td[2]/div[has-class("details")]')
+            obj_type = Transaction.TYPE_UNKNOWN
+
+            def obj_amount(self):
+                debit = CleanDecimal(TableCell('debit'), replace_dots=True, default=None)(self)
+                if debit is not None:
+                    return -debit
+                return CleanDecimal(TableCell('credit'), replace_dots=True)(self)
+
+
+class BankHistoryHTML(PageBenchmark):
+    NAME = 'bank_history_html'
+    PAGE = BankHistoryPage
+    LIST = BankHistoryPage.iter_history
+    CONTENT_TYPE = 'text/html'
+
+    def get_content(self):
+        return fixtures.bank_history_html()
+
+
+class BankHistoryJsonPage(JsonPage):
+    class iter_history(ListElement):
+        def find_elements(self):
+            return iter(self.el['operations'])
+
+        class item(ItemElement):
+            klass = Transaction
+
+            obj_id = Dict('id')
+            obj_date = Date(Dict('dateOperation'))
+            obj_rdate = Date(Dict('dateValeur'))
+            obj_raw = CleanText(Dict('libelle'))
+            obj_label = CleanText(Dict('libelle'))
+            obj_amount = CleanDecimal(Dict('montant/valeur'))
+            obj_category = Dict('categorie/libelle')
+
+
+class BankHistoryJSON(PageBenchmark):
+    NAME = 'bank_history_json'
+    PAGE = BankHistoryJsonPage
+    LIST = BankHistoryJsonPage.iter_history
+    CONTENT_TYPE = 'application/json; charset=utf-8'
+
+    def get_content(self):
+        return fixtures.bank_history_json()
+
+
+class BankHistoryCsvPage(CsvPage):
+    HEADER = 1
+    FMTPARAMS = {'delimiter': ';'}
+
+    class iter_history(ListElement):
+        def find_elements(self):
+            return iter(self.el)
+
+        class item(ItemElement):
+            klass = Transaction
+
+            obj_date = Date(Dict(u'Date'), dayfirst=True)
+            obj_raw = CleanText(Dict(u'Libellé'))
+            obj_label = CleanText(Dict(u'Libellé'))
+            obj_amount = CleanDecimal(Dict(u'Montant'), replace_dots=True)
+
+
+class BankHistoryCSV(PageBenchmark):
+    NAME = 'bank_history_csv'
+    PAGE = BankHistoryCsvPage
+    LIST = BankHistoryCsvPage.iter_history
+    CONTENT_TYPE = 'text/csv'
+
+    def get_content(self):
+        return fixtures.bank_history_csv()
+
+
+class HousingListPage(HTMLPage):
+    class iter_housings(ListElement):
+        item_xpath = '//div[has-class("results")]/article'
+
+        class item(ItemElement):
+            klass = Housing
+
+            obj_id = Attr('.', 'data-id')
+            obj_title = CleanText('./header/h2')
+            obj_cost = CleanDecimal('./header/span[has-class("price")]/text()', replace_dots=True)
+            obj_currency = Regexp(CleanText('./header/span[has-class("price")]'), u'([€$£])')
+            obj_area = CleanDecimal(Regexp(CleanText('./div/span[has-class("area")]'), r'(\d+)'))
+            obj_location = CleanText('./div/span[has-class("location")]')
+            obj_date = Date(Regexp(CleanText('./div/span[has-class("date")]'), r'(\d+/\d+/\d+)'), dayfirst=True)
+            obj_text = CleanText('./p[has-class("description")]')
+            obj_url = Link('./header/h2/a')
+
+            def obj_photos(self):
+                return [img.attrib['src'] for img in self.el.xpath('./ul[has-class("photos")]//img')]
+
+
+class HousingListHTML(PageBenchmark):
+    NAME = 'housing_list_html'
+    PAGE = HousingListPage
+    LIST = HousingListPage.iter_housings
+    CONTENT_TYPE = 'text/html; charset=utf-8'
+
+    def get_content(self):
+        return fixtures.housing_list_html()
+
+
+BENCHMARKS = [BankHistoryHTML, BankHistoryJSON, BankHistoryCSV, HousingListHTML]
@@ -26,6 +26,7 @@ from weboob.capabilities.account import CapAccount
 from weboob.core.modules import ModuleLoadError
 from weboob.tools.application.repl import ReplApplication
 from weboob.tools.ordereddict import OrderedDict
+from weboob.tools.storage import is_sqlite, migrate_yaml_storage
 from weboob.tools.application.formatters.iformatter import IFormatter
 
 __all__ = ['WeboobCfg']
@@ -308,3 +309,29 @@ class WeboobCfg(ReplApplication):
         Update weboob.
         """
         self.weboob.update()
+
+    def do_migrate_storage(self, line):
+        """
+        migrate_storage [FILENAME ...]
+
+        Convert storage files of applications to databases, which are saved
+        faster. By default, every storage file of the configuration
+        directory is converted. Previous files are kept with a .yaml suffix.
+        """
+        workdir = self.weboob.workdir
+        filenames = line.split()
+        if not filenames:
+            filenames = sorted(filename for filename in os.listdir(workdir) if filename.endswith('.storage'))
+
+        ret = 0
+        for filename in filenames:
+            path = os.path.join(workdir, filename)
+            if not os.path.isfile(path):
+                print('Error: storage file "%s" not found' % path, file=self.stderr)
+                ret = 1
+            elif is_sqlite(path):
+                print('%s is already converted' % path)
+            else:
+                migrate_yaml_storage(path)
+                print('%s is converted, the previous file is %s.yaml' % (path, path))
+        return ret
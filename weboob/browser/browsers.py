@@ -26,6 +26,8 @@ except ImportError:
     from urlparse import urlparse, urljoin
 import os
 import sys
+import tempfile
+import time
 from copy import deepcopy
 import inspect
 
@@ -35,14 +37,18 @@ try:
         raise ImportError()
 except ImportError:
     raise ImportError('Please install python-requests >= 2.0')
+from requests.adapters import DEFAULT_POOLSIZE
 
 from weboob.tools.log import getLogger
 from weboob.tools.ordereddict import OrderedDict
 
+from .cache import CacheAdapter, CacheStats, HTTPCache
+from .limits import RateLimiter, RateLimitedAdapter
 from .cookies import WeboobCookieJar
 from .exceptions import HTTPNotFound, ClientError, ServerError
 from .sessions import FuturesSession
 from .profiles import Firefox
+from .replay import ReplayAdapter
 from .pages import NextPage
 from .url import URL
 
@@ -83,6 +89,43 @@ class Browser(object):
     Maximum of threads for asynchronous requests.
     """
 
+    HTTP_CACHE = False
+    """
+    Store responses in a persistent HTTP cache, when applications give a
+    directory for it. Only set it for websites whose pages do not depend
+    on the user.
+    """
+
+    HTTP_CACHE_SIZE = 50 * 1024 * 1024
+    """
+    Maximum size of the HTTP cache, in bytes.
+    """
+
+    RATE_LIMIT = None
+    """
+    Maximum number of requests per second sent to each host. Limits are
+    shared by every browser of the same class.
+    """
+
+    RATE_BURST = 1
+    """
+    Number of requests which can be sent at once to a host before
+    :attr:`RATE_LIMIT` applies.
+    """
+
+    MAX_INFLIGHT = None
+    """
+    Maximum number of requests sent at the same time to each host, for
+    instance by asynchronous requests. Bodies of streamed responses are not
+    counted.
+    """
+
+    RATE_LIMIT_SHARED = False
+    """
+    Share :attr:`RATE_LIMIT` with other processes running this browser, with
+    files in the temporary directory.
+    """
+
     @classmethod
     def asset(cls, localfile):
         """
@@ -92,9 +135,11 @@ class Browser(object):
             return localfile
         return os.path.join(os.path.dirname(inspect.getfile(cls)), localfile)
 
-    def __init__(self, logger=None, proxy=None, responses_dirname=None):
+    def __init__(self, logger=None, proxy=None, responses_dirname=None, cache_dirname=None, replay_dirname=None):
         self.logger = getLogger('browser', logger)
         self.PROXIES = proxy
+        self.cache_dirname = cache_dirname
+        self.replay_dirname = replay_dirname
         self._setup_session(self.PROFILE)
         self.url = None
         self.response = None
@@ -107,7 +152,6 @@ class Browser(object):
 
     def _save(self, response, warning=False, **kwargs):
         if self.responses_dirname is None:
-            import tempfile
             self.responses_dirname = tempfile.mkdtemp(prefix='weboob_session_')
             print('Debug data will be saved in this directory: %s' % self.responses_dirname, file=sys.stderr)
         elif not os.path.isdir(self.responses_dirname):
@@ -164,6 +208,7 @@ class Browser(object):
         Set up a python-requests session for our usage.
         """
         session = FuturesSession(max_workers=self.MAX_WORKERS)
+        self.limiter = self.get_rate_limiter()
 
         session.proxies = self.PROXIES
 
@@ -171,7 +216,17 @@ class Browser(object):
 
         # defines a max_retries. It's mandatory in case a server is not
         # handling keep alive correctly, like the proxy burp
-        a = requests.adapters.HTTPAdapter(max_retries=self.MAX_RETRIES)
+        if self.replay_dirname:
+            # responses are read from a session saved by _save()
+            a = ReplayAdapter(self.replay_dirname)
+        elif self.cache_dirname:
+            # statistics of every browser are gathered in logger settings
+            if self.logger.settings['http_cache_stats'] is None:
+                self.logger.settings['http_cache_stats'] = CacheStats()
+            cache = HTTPCache(self.cache_dirname, self.HTTP_CACHE_SIZE, self.logger.settings['http_cache_stats'])
+            a = CacheAdapter(cache, self.get_cache_ttl, limiter=self.limiter, **self.get_adapter_kwargs())
+        else:
+            a = RateLimitedAdapter(self.limiter, **self.get_adapter_kwargs())
         session.mount('http://', a)
         session.mount('https://', a)
 
@@ -189,6 +244,36 @@ class Browser(object):
 
         session.cookies = WeboobCookieJar()
 
+    def get_adapter_kwargs(self):
+        kwargs = {'max_retries': self.MAX_RETRIES}
+        # keep a connection for each worker of asynchronous requests
+        if self.MAX_WORKERS > DEFAULT_POOLSIZE:
+            kwargs['pool_connections'] = kwargs['pool_maxsize'] = self.MAX_WORKERS
+        return kwargs
+
+    def get_rate_limiter(self):
+        """
+        Get the :class:`weboob.browser.limits.RateLimiter` which limits
+        requests, or None.
+
+        Override it to share limits with other browsers.
+        """
+        if self.replay_dirname or not (self.RATE_LIMIT or self.MAX_INFLIGHT):
+            return None
+
+        return RateLimiter.get('%s.%s' % (type(self).__module__, type(self).__name__),
+                               rate=self.RATE_LIMIT,
+                               burst=self.RATE_BURST,
+                               max_inflight=self.MAX_INFLIGHT,
+                               shared_dirname=tempfile.gettempdir() if self.RATE_LIMIT_SHARED else None)
+
+    def get_cache_ttl(self, url):
+        """
+        Get the number of seconds responses of this URL can be kept in the
+        HTTP cache, or None to follow headers sent by the server.
+        """
+        return None
+
     def location(self, url, **kwargs):
         """
         Like :meth:`open` but also changes the current URL and response.
@@ -236,6 +321,9 @@ class Browser(object):
         result() method. If any exception is raised while processing request,
         it is catched and re-raised when calling result().
 
+        Requests wait for the limits given by :attr:`RATE_LIMIT` and
+        :attr:`MAX_INFLIGHT`; asynchronous ones wait in their worker thread.
+
         For example:
 
         >>> Browser().open('http://google.com', async=True).result().text # doctest: +SKIP
@@ -538,6 +626,8 @@ class _PagesBrowserMeta(type):
         else:
             new_class._urls = deepcopy(new_class._urls)
         new_class._urls.update(urls)
+        # Dispatch table of responses to URLs, built for each BASEURL.
+        new_class._urls_dispatch = {}
         return new_class
 
 
@@ -587,6 +677,35 @@ class PagesBrowser(DomainBrowser):
         for url in self._urls.itervalues():
             url.browser = self
 
+    def get_urls_dispatch(self):
+        """
+        Get the list of URL names with literal prefixes of urls they match.
+
+        It is built once for each browser class and BASEURL, and used to skip
+        URL objects which can't match a response without trying their
+        regexps.
+
+        :rtype: list[(:class:`str`, tuple[:class:`str`])]
+        """
+        try:
+            return self._urls_dispatch[self.BASEURL]
+        except KeyError:
+            dispatch = [(name, url.get_prefixes(self.BASEURL)) for name, url in self._urls.iteritems()]
+            self._urls_dispatch[self.BASEURL] = dispatch
+            return dispatch
+
+    def get_cache_ttl(self, url):
+        """
+        Use the ``ttl`` of the :class:`URL` object matching this URL, if any.
+        """
+        for name, prefixes in self.get_urls_dispatch():
+            if not url.startswith(prefixes):
+                continue
+            url_obj = self._urls[name]
+            if url_obj.ttl is not None and url_obj.match(url):
+                return url_obj.ttl
+        return super(PagesBrowser, self).get_cache_ttl(url)
+
     def open(self, *args, **kwargs):
         """
         Same method than
@@ -603,8 +722,10 @@ class PagesBrowser(DomainBrowser):
         def internal_callback(response):
             # Try to handle the response page with an URL instance.
             response.page = None
-            for url in self._urls.itervalues():
-                page = url.handle(response)
+            for name, prefixes in self.get_urls_dispatch():
+                if not response.url.startswith(prefixes):
+                    continue
+                page = self._urls[name].handle(response)
                 if page is not None:
                     self.logger.debug('Handle %s with %s' % (response.url, page.__class__.__name__))
                     response.page = page
@@ -684,7 +805,9 @@ def need_login(func):
     """
     def inner(browser, *args, **kwargs):
         if browser.page is None or not browser.page.logged:
-            browser.do_login()
+            if not browser.restore_session():
+                browser.do_login()
+                browser.logged_at = time.time()
         return func(browser, *args, **kwargs)
 
     return inner
@@ -693,12 +816,92 @@ def need_login(func):
 class LoginBrowser(PagesBrowser):
     """
     A browser which supports login.
+
+    When :attr:`SESSION_DURATION` is set, the module saves the session of
+    the browser when it is unloaded, and restores it in the browser it
+    creates at the next run. The restored session is checked the first
+    time a login is needed, by going back to the last visited page: if it
+    is a :class:`weboob.browser.pages.LoggedPage`, there is no need to login.
     """
 
+    # Number of seconds during which a saved session is restored. If None,
+    # the session is not saved.
+    SESSION_DURATION = None
+
+    # Attributes saved with the session.
+    __states__ = ()
+
     def __init__(self, username, password, *args, **kwargs):
         super(LoginBrowser, self).__init__(*args, **kwargs)
         self.username = username
         self.password = password
+        self.logged_at = None
+        self.restored_url = None
+
+    def dump_state(self):
+        """
+        Get the state of the session, to restore it with :func:`load_state`.
+
+        :returns: the state, or None if the browser is not logged, or if the
+                  time of the login is unknown
+        :rtype: :class:`dict`
+        """
+        if self.page is None or not self.page.logged or self.logged_at is None:
+            return None
+
+        state = {'username': self.username,
+                 'logged_at': self.logged_at,
+                 'url': self.page.url,
+                 'cookies': list(self.session.cookies),
+                }
+        for attr in self.__states__:
+            if hasattr(self, attr):
+                state[attr] = getattr(self, attr)
+        return state
+
+    def load_state(self, state):
+        """
+        Restore a session saved with :func:`dump_state`, unless it is too old
+        or belongs to an other user.
+        """
+        if state.get('username') != self.username:
+            return
+        if not self.SESSION_DURATION or time.time() - state['logged_at'] > self.SESSION_DURATION:
+            self.logger.debug('saved session has expired')
+            return
+
+        for cookie in state['cookies']:
+            self.session.cookies.set_cookie(cookie)
+        for attr in self.__states__:
+            if attr in state:
+                setattr(self, attr, state[attr])
+        self.logged_at = state['logged_at']
+        self.restored_url = state['url']
+
+    def restore_session(self):
+        """
+        Check if a session restored by :func:`load_state` is still active, by
+        going back to its last page. It is only done once.
+
+        :returns: True if the browser is logged
+        :rtype: :class:`bool`
+        """
+        url, self.restored_url = self.restored_url, None
+        if url is None:
+            return False
+
+        try:
+            self.location(url)
+        except requests.exceptions.RequestException as e:
+            self.logger.debug('unable to restore the session: %s', e)
+        else:
+            if self.page is not None and self.page.logged:
+                self.logger.debug('saved session is still active')
+                return True
+
+        self.session.cookies.clear()
+        self.logged_at = None
+        return False
 
     def do_login(self):
         """
@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2017 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import errno
+import os
+import tempfile
+from email.utils import parsedate_tz, mktime_tz
+from hashlib import sha1
+from io import BytesIO
+from threading import Lock
+from time import time
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from requests.packages.urllib3.response import HTTPResponse
+from requests.structures import CaseInsensitiveDict
+
+from weboob.tools.compat import unicode
+from weboob.tools.ordereddict import OrderedDict
+
+from .limits import RateLimitedAdapter
+
+
+__all__ = ['HTTPCache', 'CacheAdapter', 'CacheStats', 'build_response']
+
+
+CACHEABLE_METHODS = ('GET', 'HEAD')
+CACHEABLE_STATUSES = (200, 203)
+
+# These headers describe the transfer, not the stored body, which is
+# decoded.
+TRANSFER_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+
+
+def parse_cache_control(value):
+    """
+    Parse a Cache-Control header.
+
+    >>> sorted(parse_cache_control('no-cache, max-age=60').items())
+    [('max-age', '60'), ('no-cache', None)]
+
+    :rtype: :class:`dict`
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, arg = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else None
+    return directives
+
+
+def parse_http_date(value):
+    """
+    Parse a HTTP date into a timestamp, or None if it is invalid.
+
+    >>> parse_http_date('Sun, 06 Nov 1994 08:49:37 GMT')
+    784111777
+    """
+    if not value:
+        return None
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    try:
+        return mktime_tz(date)
+    except (OverflowError, ValueError):
+        return None
+
+
+class CacheStats(object):
+    """
+    Counters of a HTTP cache.
+
+    * hits: responses given by the cache;
+    * revalidated: stale responses the server said are still valid;
+    * misses: responses downloaded;
+    * stored: downloaded responses stored in the cache;
+    * evicted: responses removed because the cache was full.
+    """
+
+    KEYS = ('hits', 'revalidated', 'misses', 'stored', 'evicted')
+
+    def __init__(self):
+        self._lock = Lock()
+        self.counters = dict.fromkeys(self.KEYS, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def __getitem__(self, key):
+        return self.counters[key]
+
+    def __str__(self):
+        return ', '.join('%d %s' % (self.counters[key], key) for key in self.KEYS)
+
+
+class HTTPCache(object):
+    """
+    On-disk store of HTTP responses, limited in size.
+
+    Each response is stored in its own file. When the size of the files is
+    greater than *max_size*, the least recently used responses are removed.
+
+    :param dirname: directory to store responses in
+    :type dirname: :class:`str`
+    :param max_size: maximum size of stored responses, in bytes
+    :type max_size: :class:`int`
+    :param stats: counters to update (default is a new instance)
+    :type stats: :class:`CacheStats`
+    """
+
+    SUFFIX = '.cache'
+
+    def __init__(self, dirname, max_size=50 * 1024 * 1024, stats=None):
+        self.dirname = dirname
+        self.max_size = max_size
+        self.stats = stats or CacheStats()
+        self._lock = Lock()
+        self._index = None
+        self._size = 0
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+
+        if not os.path.isdir(self.dirname):
+            os.makedirs(self.dirname)
+
+        files = []
+        for filename in os.listdir(self.dirname):
+            if not filename.endswith(self.SUFFIX):
+                continue
+            try:
+                st = os.stat(os.path.join(self.dirname, filename))
+            except OSError:
+                continue
+            files.append((st.st_mtime, filename, st.st_size))
+
+        # least recently used first
+        self._index = OrderedDict()
+        self._size = 0
+        for _, filename, size in sorted(files):
+            self._index[filename] = size
+            self._size += size
+
+    def _filename(self, key):
+        return sha1(key.encode('utf-8') if isinstance(key, unicode) else key).hexdigest() + self.SUFFIX
+
+    def get(self, key):
+        """
+        Get the entry stored with this key, or None.
+
+        :rtype: :class:`dict`
+        """
+        filename = self._filename(key)
+        path = os.path.join(self.dirname, filename)
+        with self._lock:
+            self._load_index()
+            try:
+                with open(path, 'rb') as f:
+                    entry = pickle.load(f)
+                # the modification time is used to find unused entries
+                os.utime(path, None)
+            except (IOError, OSError, EOFError, pickle.UnpicklingError):
+                self._forget(filename)
+                return None
+
+            if filename in self._index:
+                self._index[filename] = self._index.pop(filename)
+            return entry
+
+    def set(self, key, entry):
+        """
+        Store an entry.
+
+        :type entry: :class:`dict`
+        """
+        data = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_size:
+            return
+
+        filename = self._filename(key)
+        with self._lock:
+            self._load_index()
+            fd, tmppath = tempfile.mkstemp(dir=self.dirname, prefix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.rename(tmppath, os.path.join(self.dirname, filename))
+            except (IOError, OSError):
+                try:
+                    os.remove(tmppath)
+                except OSError:
+                    pass
+                return
+
+            self._size -= self._index.pop(filename, 0)
+            self._index[filename] = len(data)
+            self._size += len(data)
+            self.stats.incr('stored')
+
+            while self._size > self.max_size and self._index:
+                self._remove(next(iter(self._index)))
+                self.stats.incr('evicted')
+
+    def delete(self, key):
+        with self._lock:
+            self._load_index()
+            self._remove(self._filename(key))
+
+    def clear(self):
+        with self._lock:
+            self._load_index()
+            for filename in list(self._index):
+                self._remove(filename)
+
+    def _remove(self, filename):
+        self._forget(filename)
+        try:
+            os.remove(os.path.join(self.dirname, filename))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def _forget(self, filename):
+        if self._index is not None:
+            self._size -= self._index.pop(filename, 0)
+
+    def __len__(self):
+        with self._lock:
+            self._load_index()
+            return len(self._index)
+
+
+class CacheAdapter(RateLimitedAdapter):
+    """
+    Transport adapter which stores responses in a :class:`HTTPCache`, and
+    gives them back while they are fresh.
+
+    Freshness is computed from Cache-Control (max-age, no-cache, no-store)
+    and Expires headers. Stale responses with an ETag or a Last-Modified
+    header are revalidated with a conditional request.
+
+    :param cache: where to store responses
+    :type cache: :class:`HTTPCache`
+    :param get_ttl: function called with an URL, which can return a number
+                    of seconds responses of this URL are fresh, overriding
+                    headers sent by the server
+    :type get_ttl: callable
+    """
+
+    def __init__(self, cache, get_ttl=None, *args, **kwargs):
+        super(CacheAdapter, self).__init__(*args, **kwargs)
+        self.cache = cache
+        self.get_ttl = get_ttl
+
+    def send(self, request, stream=False, **kwargs):
+        request_cc = parse_cache_control(request.headers.get('Cache-Control'))
+        if request.method not in CACHEABLE_METHODS or stream or 'no-store' in request_cc:
+            return super(CacheAdapter, self).send(request, stream=stream, **kwargs)
+
+        key = '%s %s' % (request.method, request.url)
+        entry = self.cache.get(key)
+        if entry is not None and not self._vary_matches(entry, request):
+            entry = None
+
+        if entry is not None:
+            if 'no-cache' not in request_cc and entry['expires'] > time():
+                self.cache.stats.incr('hits')
+                return self._build_cached_response(request, entry)
+
+            # ask the server if the stored response is still valid
+            if entry['etag']:
+                request.headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request.headers['If-Modified-Since'] = entry['last_modified']
+
+        response = super(CacheAdapter, self).send(request, stream=stream, **kwargs)
+
+        if entry is not None and response.status_code == 304:
+            self.cache.stats.incr('revalidated')
+            entry['expires'] = self._get_expires(request.url, response.headers)
+            self.cache.set(key, entry)
+            return self._build_cached_response(request, entry)
+
+        self.cache.stats.incr('misses')
+        self._store(key, request, response)
+        return response
+
+    def _vary_matches(self, entry, request):
+        for header, value in entry['vary'].iteritems():
+            if request.headers.get(header) != value:
+                return False
+        return True
+
+    def _get_expires(self, url, headers, now=None):
+        if now is None:
+            now = time()
+
+        ttl = self.get_ttl(url) if self.get_ttl else None
+        if ttl is not None:
+            return now + ttl
+
+        cc = parse_cache_control(headers.get('Cache-Control'))
+        if 'no-cache' in cc:
+            return 0
+        if 'max-age' in cc:
+            try:
+                return now + int(cc['max-age']) - int(headers.get('Age') or 0)
+            except ValueError:
+                return 0
+
+        expires = parse_http_date(headers.get('Expires'))
+        if expires is not None:
+            # the clock of the server may differ from ours
+            date = parse_http_date(headers.get('Date'))
+            return now + expires - (date if date is not None else now)
+        return 0
+
+    def _store(self, key, request, response):
+        if response.status_code not in CACHEABLE_STATUSES:
+            return
+
+        cc = parse_cache_control(response.headers.get('Cache-Control'))
+        vary = [header.strip() for header in response.headers.get('Vary', '').split(',') if header.strip()]
+        if 'no-store' in cc or '*' in vary:
+            return
+
+        expires = self._get_expires(request.url, response.headers)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if expires <= time() and not etag and not last_modified:
+            # it could neither be used nor revalidated
+            return
+
+        headers = dict((name, value) for name, value in response.headers.iteritems()
+                       if name.lower() not in TRANSFER_HEADERS)
+        body = response.content
+        headers['Content-Length'] = str(len(body))
+
+        self.cache.set(key, {'url': response.url,
+                             'status': response.status_code,
+                             'reason': response.reason,
+                             'headers': headers,
+                             'body': body,
+                             'expires': expires,
+                             'etag': etag,
+                             'last_modified': last_modified,
+                             'vary': dict((header, request.headers.get(header)) for header in vary),
+                            })
+
+    def _build_cached_response(self, request, entry):
+        response = build_response(self, request, entry['status'], entry['reason'],
+                                  entry['headers'], entry['body'])
+        response.from_cache = True
+        return response
+
+
+def build_response(adapter, request, status, reason, headers, body):
+    """
+    Build a :class:`requests.Response` from stored data, like *adapter*
+    does from a response of the server.
+
+    :param headers: headers of the response, without transfer headers
+    :type headers: :class:`dict`
+    :param body: decoded content
+    :type body: :class:`bytes`
+    """
+    raw = HTTPResponse(body=BytesIO(body),
+                       headers=headers,
+                       status=status,
+                       reason=reason,
+                       preload_content=False,
+                       decode_content=False)
+    response = adapter.build_response(request, raw)
+    response.headers = CaseInsensitiveDict(headers)
+    return response
+
+
+def test():
+    import shutil
+
+    dirname = tempfile.mkdtemp(prefix='weboob_test_cache_')
+    try:
+        cache = HTTPCache(dirname, max_size=1000)
+        cache.set('a', {'body': 'a' * 400})
+        cache.set('b', {'body': 'b' * 400})
+        assert cache.get('a')['body'] == 'a' * 400
+        # b is the least recently used entry
+        cache.set('c', {'body': 'c' * 400})
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.stats['evicted'] == 1
+
+        # the index is rebuilt from files
+        cache = HTTPCache(dirname, max_size=1000)
+        assert len(cache) == 2
+        cache.clear()
+        assert len(cache) == 0
+        assert os.listdir(dirname) == []
+    finally:
+        shutil.rmtree(dirname)
+
+    adapter = CacheAdapter(None, get_ttl=lambda url: 3600 if url.endswith('.css') else None)
+    headers = CaseInsensitiveDict({'Cache-Control': 'public, max-age=60'})
+    assert adapter._get_expires('http://example.org/', headers, now=1000) == 1060
+    assert adapter._get_expires('http://example.org/style.css', headers, now=1000) == 4600
+    headers = CaseInsensitiveDict({'Date': 'Sun, 06 Nov 1994 08:49:37 GMT',
+                                   'Expires': 'Sun, 06 Nov 1994 08:59:37 GMT'})
+    assert adapter._get_expires('http://example.org/', headers, now=1000) == 1600
+    headers = CaseInsensitiveDict({'Cache-Control': 'no-cache', 'Expires': 'Sun, 06 Nov 1994 08:59:37 GMT'})
+    assert adapter._get_expires('http://example.org/', headers, now=1000) == 0
+
@@ -20,12 +20,14 @@
 import re
 import sys
 from copy import deepcopy
+from types import FunctionType, MethodType
 
 from weboob.tools.log import getLogger, DEBUG_FILTERS
 from weboob.tools.ordereddict import OrderedDict
 from weboob.browser.pages import NextPage
 
-from .filters.standard import _Filter, CleanText
+from .filters.standard import _Filter, CleanText, filters_logger, set_filter_context
+from .selectors import compile_xpath, compile_css, css_translator
 from .filters.html import AttributeNotFound, XPathNotFound
 
 
@@ -74,9 +76,11 @@ class AbstractElement(object):
 
     def use_selector(self, func, key=None):
         if isinstance(func, _Filter):
-            func._obj = self
-            func._key = key
-            value = func(self)
+            previous = set_filter_context(self, key)
+            try:
+                value = func(self)
+            finally:
+                set_filter_context(*previous)
         elif isinstance(func, type) and issubclass(func, ItemElement):
             value = func(self.page, self, self.el)()
         elif callable(func):
@@ -89,18 +93,35 @@ class AbstractElement(object):
     def parse(self, obj):
         pass
 
-    def cssselect(self, *args, **kwargs):
-        return self.el.cssselect(*args, **kwargs)
+    def cssselect(self, expr, translator=None):
+        if translator is None:
+            translator = css_translator(self.el)
+        return compile_css(expr, translator)(self.el)
 
-    def xpath(self, *args, **kwargs):
-        return self.el.xpath(*args, **kwargs)
+    def xpath(self, _path, namespaces=None, extensions=None, smart_strings=True, **variables):
+        if extensions is not None or not smart_strings:
+            return self.el.xpath(_path, namespaces=namespaces, extensions=extensions,
+                                 smart_strings=smart_strings, **variables)
+        return compile_xpath(_path, namespaces)(self.el, **variables)
+
+    @classmethod
+    def get_loaders_names(cls):
+        """
+        Get names of load_* attributes, looked for once per class.
+
+        :rtype: list[(:class:`str`, :class:`str`)]
+        """
+        if '_loaders_names' not in cls.__dict__:
+            names = []
+            for attrname in dir(cls):
+                m = re.match('load_(.*)', attrname)
+                if m:
+                    names.append((m.group(1), attrname))
+            cls._loaders_names = names
+        return cls._loaders_names
 
     def handle_loaders(self):
-        for attrname in dir(self):
-            m = re.match('load_(.*)', attrname)
-            if not m:
-                continue
-            name = m.group(1)
+        for name, attrname in self.get_loaders_names():
             if name in self.loaders:
                 continue
             loader = getattr(self, attrname)
@@ -130,22 +151,37 @@ class ListElement(AbstractElement):
         sufficient.
         """
         if self.item_xpath is not None:
-            for el in self.el.xpath(self.item_xpath):
+            for el in compile_xpath(self.item_xpath)(self.el):
                 yield el
         else:
             yield self.el
 
+    @classmethod
+    def get_items_classes(cls):
+        """
+        Get the element classes to instanciate for each node.
+
+        They are looked for once per class.
+        """
+        if '_items_classes' not in cls.__dict__:
+            items_classes = []
+            for attrname in dir(cls):
+                attr = getattr(cls, attrname)
+                if isinstance(attr, type) and issubclass(attr, AbstractElement) and attr is not cls:
+                    items_classes.append(attr)
+            cls._items_classes = items_classes
+        return cls._items_classes
+
     def __iter__(self):
         self.parse(self.el)
 
         items = []
+        items_classes = self.get_items_classes()
         for el in self.find_elements():
-            for attrname in dir(self):
-                attr = getattr(self, attrname)
-                if isinstance(attr, type) and issubclass(attr, AbstractElement) and attr != type(self):
-                    item = attr(self.page, self, el)
-                    item.handle_loaders()
-                    items.append(item)
+            for klass in items_classes:
+                item = klass(self.page, self, el)
+                item.handle_loaders()
+                items.append(item)
 
         for item in items:
             for obj in item:
@@ -254,16 +290,51 @@ class ItemElement(AbstractElement):
                 self.obj = self.build_object()
             self.parse(self.el)
             self.handle_loaders()
-            for attr in self._attrs:
-                self.handle_attr(attr, getattr(self, 'obj_%s' % attr))
+            for attr, func in self.get_attrs_plan():
+                if func is None:
+                    # Defined after class creation, or on the instance
+                    func = getattr(self, 'obj_%s' % attr)
+                elif isinstance(func, FunctionType):
+                    func = MethodType(func, self)
+                self.handle_attr(attr, func)
         except SkipItem:
             return
 
+        if getattr(self.obj, 'DEFERRED_VALIDATION', False):
+            self.obj.validate()
+
         if self.validate is not None and not self.validate(self.obj):
             return
 
         yield self.obj
 
+    @classmethod
+    def get_attrs_plan(cls):
+        """
+        Get the list of attributes to compute, with their filter, element
+        class, constant or method. It is built once per class, so objects
+        are built without looking for attributes by name.
+
+        :rtype: list[(:class:`str`, object)]
+        """
+        if '_attrs_plan' not in cls.__dict__:
+            plan = []
+            for attr in cls._attrs:
+                name = 'obj_%s' % attr
+                for klass in cls.__mro__:
+                    if name in klass.__dict__:
+                        func = klass.__dict__[name]
+                        if not isinstance(func, FunctionType) and hasattr(func, '__get__') \
+                           and not isinstance(func, (type, _Filter)):
+                            # Other descriptors (properties, staticmethods...)
+                            func = None
+                        break
+                else:
+                    func = None
+                plan.append((attr, func))
+            cls._attrs_plan = plan
+        return cls._attrs_plan
+
     def handle_attr(self, key, func):
         try:
             value = self.use_selector(func, key=key)
@@ -271,8 +342,10 @@ class ItemElement(AbstractElement):
             # Help debugging as tracebacks do not give us the key
             self.logger.warning('Attribute %s raises %s' % (key, repr(e)))
             raise
-        logger = getLogger('b2filters')
-        logger.log(DEBUG_FILTERS, "%s.%s = %r" % (self._random_id, key, value))
+        logger = filters_logger(self)
+        if logger.isEnabledFor(DEBUG_FILTERS):
+            logger.log(DEBUG_FILTERS, "%s.%s = %r", self._random_id, key, value,
+                       extra={'element': self, 'key': key, 'result': value})
         setattr(self.obj, key, value)
 
 
@@ -294,7 +367,7 @@ class TableElement(ListElement):
                     cols = [cols]
                 columns[m.group(1)] = [s.lower() for s in cols]
 
-        for colnum, el in enumerate(self.el.xpath(self.head_xpath)):
+        for colnum, el in enumerate(compile_xpath(self.head_xpath)(self.el)):
             title = self.cleaner.clean(el).lower()
             for name, titles in columns.iteritems():
                 if title in titles:
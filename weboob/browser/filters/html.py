@@ -20,6 +20,7 @@
 
 import lxml.html as html
 from .standard import _Selector, _NO_DEFAULT, Filter, FilterError
+from weboob.browser.selectors import compile_css, css_translator
 from weboob.tools.html import html2text
 
 
@@ -38,7 +39,8 @@ class AttributeNotFound(FilterError):
 class CSS(_Selector):
     @classmethod
     def select(cls, selector, item, obj=None, key=None):
-        return item.cssselect(selector)
+        el = getattr(item, 'el', item)
+        return compile_css(selector, css_translator(el))(el)
 
 
 class XPath(_Selector):
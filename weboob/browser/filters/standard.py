@@ -25,6 +25,7 @@ import unicodedata
 from decimal import Decimal, InvalidOperation
 from itertools import islice
 from collections import Iterator
+from threading import local
 
 from dateutil.parser import parse as parse_date
 
@@ -32,6 +33,7 @@ from weboob.capabilities.base import empty
 from weboob.tools.compat import basestring
 from weboob.exceptions import ParseError
 from weboob.browser.url import URL
+from weboob.browser.selectors import compile_xpath
 from weboob.tools.log import getLogger, DEBUG_FILTERS
 
 
@@ -66,12 +68,29 @@ class ItemNotFound(FilterError):
     pass
 
 
+# Element and key being computed by filters, per thread. It is not stored
+# on filters themselves, as they are shared by every instances of element
+# classes.
+_context = local()
+
+
+def set_filter_context(obj, key):
+    """
+    Set the element and the key of the attribute being computed by filters
+    in the current thread.
+
+    :returns: the previous context, to give back to this function after use
+    """
+    previous = (getattr(_context, 'obj', None), getattr(_context, 'key', None))
+    _context.obj = obj
+    _context.key = key
+    return previous
+
+
 class _Filter(object):
     _creation_counter = 0
 
     def __init__(self, default=_NO_DEFAULT):
-        self._key = None
-        self._obj = None
         self.default = default
         self._creation_counter = _Filter._creation_counter
         _Filter._creation_counter += 1
@@ -95,45 +114,99 @@ class _Filter(object):
     def __str__(self):
         return self.__class__.__name__
 
+    @property
+    def _obj(self):
+        return getattr(_context, 'obj', None)
+
+    @property
+    def _key(self):
+        return getattr(_context, 'key', None)
+
+
+_filters_loggers = {}
+
+
+def filters_logger(element=None):
+    """
+    Get the logger used to trace filters of an element.
+
+    Its name is "b2filters.<module>", so traces can be enabled for only one
+    module by setting the level of its logger to DEBUG_FILTERS.
+
+    Records have `element`, `key`, `filter`, `value` and `result` attributes
+    (when known) for handlers which want structured traces.
+    """
+    module = type(element).__module__.split('.')[0] if element is not None else None
+    try:
+        return _filters_loggers[module]
+    except KeyError:
+        name = 'b2filters' if module is None else 'b2filters.%s' % module
+        logger = _filters_loggers[module] = getLogger(name)
+        return logger
+
+
+class FilterCall(object):
+    """
+    Lazy representation of a filter call, only formatted when a trace is
+    really emitted.
+    """
+
+    def __init__(self, filter, value):
+        self.filter = filter
+        self.value = value
+        self.obj = filter._obj
+        self.key = filter._key
+
+    def __str__(self):
+        filter = self.filter
+        value = self.value
+        result = ''
+        outputvalue = value
+        if isinstance(value, list):
+            from lxml import etree
+            outputvalue = ''
+            first = True
+            for element in value:
+                if first:
+                    first = False
+                else:
+                    outputvalue += ', '
+                if isinstance(element, etree.ElementBase):
+                    outputvalue += "%s" % etree.tostring(element, encoding=unicode)
+                else:
+                    outputvalue += "%r" % element
+        if self.obj is not None:
+            result += "%s" % self.obj._random_id
+        if self.key is not None:
+            result += ".%s" % self.key
+        name = str(filter)
+        result += " %s(%r" % (name, outputvalue)
+        for arg in filter.__dict__:
+            if arg.startswith('_') or arg == u"selector":
+                continue
+            if arg == u'default' and getattr(filter, arg) == _NO_DEFAULT:
+                continue
+            result += ", %s=%r" % (arg, getattr(filter, arg))
+        result += u')'
+        return result
+
 
 def debug(*args):
     """
     A decorator function to provide some debug information
     in Filters.
     It prints by default the name of the Filter and the input value.
+
+    Nothing is formatted when the DEBUG_FILTERS level is disabled.
     """
     def wraper(function):
         def print_debug(self, value):
-            logger = getLogger('b2filters')
-            result = ''
-            outputvalue = value
-            if isinstance(value, list):
-                from lxml import etree
-                outputvalue = ''
-                first = True
-                for element in value:
-                    if first:
-                        first = False
-                    else:
-                        outputvalue += ', '
-                    if isinstance(element, etree.ElementBase):
-                        outputvalue += "%s" % etree.tostring(element, encoding=unicode)
-                    else:
-                        outputvalue += "%r" % element
-            if self._obj is not None:
-                result += "%s" % self._obj._random_id
-            if self._key is not None:
-                result += ".%s" % self._key
-            name = str(self)
-            result += " %s(%r" % (name, outputvalue)
-            for arg in self.__dict__:
-                if arg.startswith('_') or arg == u"selector":
-                    continue
-                if arg == u'default' and getattr(self, arg) == _NO_DEFAULT:
-                    continue
-                result += ", %s=%r" % (arg, getattr(self, arg))
-            result += u')'
-            logger.log(DEBUG_FILTERS, result)
+            logger = filters_logger(self._obj)
+            if not logger.isEnabledFor(DEBUG_FILTERS):
+                return function(self, value)
+
+            logger.log(DEBUG_FILTERS, '%s', FilterCall(self, value),
+                       extra={'element': self._obj, 'key': self._key, 'filter': self, 'value': value})
             res = function(self, value)
             return res
         return print_debug
@@ -161,10 +234,11 @@ class Filter(_Filter):
     @classmethod
     def select(cls, selector, item, obj=None, key=None):
         if isinstance(selector, basestring):
+            el = getattr(item, 'el', item)
+            if hasattr(el, 'xpath'):
+                return compile_xpath(selector)(el)
             return item.xpath(selector)
         elif isinstance(selector, _Filter):
-            selector._key = key
-            selector._obj = obj
             return selector(item)
         elif callable(selector):
             return selector(item)
@@ -277,7 +351,7 @@ class TableCell(_Filter):
         for name in self.names:
             idx = item.parent.get_colnum(name)
             if idx is not None:
-                return item.xpath('./td[%s]' % (idx + 1))
+                return compile_xpath('./td[$index]')(getattr(item, 'el', item), index=idx + 1)
 
         return self.default_or_raise(ColumnNotFound('Unable to find column %s' % ' or '.join(self.names)))
 
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2017 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import os
+import re
+from contextlib import contextmanager
+from threading import Lock, BoundedSemaphore
+from time import time, sleep
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from requests.adapters import HTTPAdapter
+
+
+__all__ = ['TokenBucket', 'FileTokenBucket', 'RateLimiter', 'RateLimitedAdapter']
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket.
+
+    It is refilled with *rate* tokens per second, up to *burst* tokens, and
+    each request takes a token. When the bucket is empty, tokens are
+    reserved in advance, so waiting threads are served in order and don't
+    hold the lock while they sleep.
+
+    :param rate: tokens added per second
+    :type rate: :class:`float`
+    :param burst: capacity of the bucket
+    :type burst: :class:`int`
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(burst, 1)
+        self.lock = Lock()
+        self.tokens = self.burst
+        self.updated = time()
+
+    def load(self, now):
+        return self.tokens, self.updated
+
+    def store(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+
+    def reserve(self, now=None):
+        """
+        Take a token.
+
+        :returns: seconds to wait before the token is available
+        :rtype: :class:`float`
+        """
+        if now is None:
+            now = time()
+
+        with self.lock:
+            tokens, updated = self.load(now)
+            tokens = min(self.burst, tokens + max(now - updated, 0) * self.rate) - 1
+            self.store(tokens, now)
+
+        if tokens >= 0:
+            return 0
+        return -tokens / self.rate
+
+    def take(self):
+        """
+        Take a token, waiting until it is available.
+        """
+        delay = self.reserve()
+        if delay > 0:
+            sleep(delay)
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket shared by processes, stored in a file locked while it is
+    updated.
+
+    :param path: path of the file, created if needed
+    :type path: :class:`str`
+    """
+
+    def __init__(self, path, rate, burst=1):
+        if fcntl is None:
+            raise ImportError('Sharing rate limits between processes is not supported on this system')
+
+        super(FileTokenBucket, self).__init__(rate, burst)
+        self.path = path
+        self.fd = None
+
+    def load(self, now):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            tokens, updated = map(float, os.read(self.fd, 64).split())
+        except ValueError:
+            # new or corrupted file
+            tokens, updated = self.burst, now
+        return tokens, updated
+
+    def store(self, tokens, now):
+        try:
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            os.ftruncate(self.fd, 0)
+            os.write(self.fd, ('%r %r' % (tokens, now)).encode('ascii'))
+        finally:
+            # closing the file releases the lock
+            os.close(self.fd)
+            self.fd = None
+
+
+class RateLimiter(object):
+    """
+    Limit requests sent to each host.
+
+    Every host gets its own token bucket, which limits the number of
+    requests per second, and its own budget of requests sent at the same
+    time.
+
+    :param rate: maximum of requests per second to each host, or None
+    :type rate: :class:`float`
+    :param burst: number of requests which can be sent at once before the
+                  rate applies
+    :type burst: :class:`int`
+    :param max_inflight: maximum of requests to each host which are being
+                         sent at the same time by this process, or None
+    :type max_inflight: :class:`int`
+    :param shared_dirname: if set, token buckets are stored in files of this
+                           directory, to share rates with other processes
+                           using a limiter with the same name
+    :type shared_dirname: :class:`str`
+    :param name: name of the limiter, used in names of shared files
+    :type name: :class:`str`
+    """
+
+    _limiters = {}
+    _limiters_lock = Lock()
+
+    @classmethod
+    def get(cls, name, *args, **kwargs):
+        """
+        Get the limiter with this name and these parameters, so requests of
+        every browser using it are limited together.
+
+        :rtype: :class:`RateLimiter`
+        """
+        key = (name, args, tuple(sorted(kwargs.items())))
+        with cls._limiters_lock:
+            if key not in cls._limiters:
+                cls._limiters[key] = cls(name=name, *args, **kwargs)
+            return cls._limiters[key]
+
+    def __init__(self, rate=None, burst=1, max_inflight=None, shared_dirname=None, name='default'):
+        self.rate = rate
+        self.burst = burst
+        self.max_inflight = max_inflight
+        self.shared_dirname = shared_dirname
+        self.name = name
+        self.hosts = {}
+        self.lock = Lock()
+
+    def get_host(self, url):
+        return urlparse(url).netloc.lower()
+
+    def get_limits(self, host):
+        """
+        Get the token bucket and the semaphore of a host. Both can be None.
+        """
+        with self.lock:
+            if host not in self.hosts:
+                bucket = None
+                if self.rate:
+                    if self.shared_dirname:
+                        filename = re.sub(r'[^\w.-]', '_', 'weboob_ratelimit.%s.%s' % (self.name, host))
+                        bucket = FileTokenBucket(os.path.join(self.shared_dirname, filename), self.rate, self.burst)
+                    else:
+                        bucket = TokenBucket(self.rate, self.burst)
+                semaphore = None
+                if self.max_inflight:
+                    semaphore = BoundedSemaphore(self.max_inflight)
+                self.hosts[host] = bucket, semaphore
+            return self.hosts[host]
+
+    @contextmanager
+    def limit(self, url):
+        """
+        Context manager which waits until a request can be sent to this URL,
+        and counts it as being sent until it exits.
+        """
+        bucket, semaphore = self.get_limits(self.get_host(url))
+
+        # a slot is taken first, so threads waiting for one don't spend tokens
+        if semaphore is not None:
+            semaphore.acquire()
+        try:
+            if bucket is not None:
+                bucket.take()
+            yield
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    Transport adapter which sends requests within the limits of a
+    :class:`RateLimiter`.
+
+    Each request of redirections is limited, as it is sent by the adapter.
+    A request counts against the in-flight budget until its headers are
+    received: when it is sent with ``stream=True``, the download of the body
+    is not counted.
+
+    :param limiter: limiter, or None to not limit requests
+    :type limiter: :class:`RateLimiter`
+    """
+
+    def __init__(self, limiter=None, *args, **kwargs):
+        super(RateLimitedAdapter, self).__init__(*args, **kwargs)
+        self.limiter = limiter
+
+    def send(self, request, **kwargs):
+        if self.limiter is None:
+            return super(RateLimitedAdapter, self).send(request, **kwargs)
+
+        with self.limiter.limit(request.url):
+            return super(RateLimitedAdapter, self).send(request, **kwargs)
+
+
+def test():
+    import shutil
+    import tempfile
+    from threading import Thread
+
+    bucket = TokenBucket(10, burst=2)
+    now = bucket.updated
+    assert bucket.reserve(now) == 0
+    assert bucket.reserve(now) == 0
+    assert abs(bucket.reserve(now) - 0.1) < 1e-9
+    assert abs(bucket.reserve(now) - 0.2) < 1e-9
+    # the bucket is refilled with time, up to its capacity
+    assert bucket.reserve(now + 10) == 0
+    assert bucket.reserve(now + 10) == 0
+    assert bucket.reserve(now + 10) > 0
+
+    limiter = RateLimiter(max_inflight=2)
+    assert limiter.get_host('https://WWW.Example.org:8443/path?a=1') == 'www.example.org:8443'
+    state = {'inflight': 0, 'max': 0}
+    state_lock = Lock()
+
+    def request(url):
+        with limiter.limit(url):
+            with state_lock:
+                state['inflight'] += 1
+                state['max'] = max(state['max'], state['inflight'])
+            sleep(0.01)
+            with state_lock:
+                state['inflight'] -= 1
+
+    threads = [Thread(target=request, args=('http://example.org/%d' % i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert state['max'] == 2
+    # other hosts have their own budget
+    assert limiter.get_limits('example.org') is not limiter.get_limits('example.com')
+
+    assert RateLimiter.get('test', rate=2) is RateLimiter.get('test', rate=2)
+    assert RateLimiter.get('test', rate=2) is not RateLimiter.get('test', rate=3)
+
+    if fcntl is not None:
+        dirname = tempfile.mkdtemp(prefix='weboob_test_limits_')
+        try:
+            path = os.path.join(dirname, 'bucket')
+            first = FileTokenBucket(path, 10)
+            second = FileTokenBucket(path, 10)
+            now = time()
+            assert first.reserve(now) == 0
+            # the token taken by the other bucket is seen
+            assert abs(second.reserve(now) - 0.1) < 1e-9
+
+            limiter = RateLimiter(rate=10, shared_dirname=dirname, name='test')
+            bucket, semaphore = limiter.get_limits('example.org:80')
+            assert semaphore is None
+            assert os.path.dirname(bucket.path) == dirname
+            assert os.path.basename(bucket.path) == 'weboob_ratelimit.test.example.org_80'
+        finally:
+            shutil.rmtree(dirname)
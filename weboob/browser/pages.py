@@ -22,6 +22,7 @@ from __future__ import absolute_import
 import warnings
 from io import BytesIO
 import codecs
+import re
 from cgi import parse_header
 
 import requests
@@ -31,6 +32,8 @@ from weboob.tools.compat import basestring
 
 from weboob.tools.log import getLogger
 
+from .selectors import compile_xpath
+
 
 def pagination(func):
     r"""
@@ -116,6 +119,16 @@ class Page(object):
     It is recommended to use None for autodetection.
     """
 
+    SHARE_DOC = False
+    """
+    If True, the document is shared with pages of other classes built on
+    the same response, when they have the same :meth:`build_doc` and
+    :attr:`data`. Only set it when :meth:`build_doc` depends on nothing else
+    than the content and the encoding, and when the page never modifies its
+    document, as other candidates of :meth:`URL.handle` would see the
+    changes.
+    """
+
     logged = False
     """
     If True, the page is in a restrected area of the wesite. Useful with
@@ -133,7 +146,13 @@ class Page(object):
         self.forced_encoding = encoding or self.ENCODING
         if self.forced_encoding:
             self.response.encoding = self.forced_encoding
-        self.doc = self.build_doc(self.data)
+        else:
+            # Look for the document-level encoding in raw data, to avoid
+            # parsing the document twice.
+            encoding = self.sniff_encoding()
+            if encoding:
+                self.response.encoding = encoding
+        self.doc = self.get_doc()
 
         # Last chance to change encoding, according to :meth:`detect_encoding`,
         # which can be used to detect a document-level encoding declaration
@@ -141,7 +160,7 @@ class Page(object):
             encoding = self.detect_encoding()
             if encoding and encoding != self.encoding:
                 self.response.encoding = encoding
-                self.doc = self.build_doc(self.data)
+                self.doc = self.get_doc()
 
     # Encoding issues are delegated to Response instance, implemented by
     # requests module.
@@ -186,6 +205,33 @@ class Page(object):
         Event called when browser leaves this page.
         """
 
+    def get_doc(self):
+        """
+        Get the document built by :meth:`build_doc` with the current encoding.
+
+        Documents are cached on the response, so when several Page classes
+        are tried on the same response (see :meth:`URL.handle`), the
+        document is built only once. Pages of classes with
+        :attr:`SHARE_DOC` and the same :meth:`build_doc` and :attr:`data`
+        implementations share it, so :meth:`build_doc` must not modify the
+        page.
+        """
+        klass = type(self)
+        key = (getattr(klass.build_doc, '__func__', klass.build_doc),
+               getattr(klass, 'data', None),
+               self.encoding,
+               None if klass.SHARE_DOC else klass)
+        try:
+            docs = self.response._weboob_docs
+        except AttributeError:
+            docs = self.response._weboob_docs = {}
+
+        try:
+            return docs[key]
+        except KeyError:
+            doc = docs[key] = self.build_doc(self.data)
+            return doc
+
     def build_doc(self, content):
         """
         Abstract method to be implemented by subclasses to build structured
@@ -195,6 +241,16 @@ class Page(object):
         """
         raise NotImplemented
 
+    def sniff_encoding(self):
+        """
+        Override this method to detect the document-level encoding from
+        :attr:`content`, before the document is built.
+
+        :meth:`detect_encoding` is still called on the built document, and
+        the document is only built again if they disagree.
+        """
+        return None
+
     def detect_encoding(self):
         """
         Override this method to implement detection of document-level encoding
@@ -245,7 +301,7 @@ class Form(OrderedDict):
         submits = 0
 
         # Find all elements of the form that will be useful to create the request
-        for inp in el.xpath('.//input | .//select | .//textarea'):
+        for inp in compile_xpath('.//input | .//select | .//textarea')(el):
             # Step 1: Ignore some elements
             try:
                 name = inp.attrib['name']
@@ -276,9 +332,9 @@ class Form(OrderedDict):
 
             # Step 2: Extract the key-value pair from the remaining elements
             if inp.tag == 'select':
-                options = inp.xpath('.//option[@selected]')
+                options = compile_xpath('.//option[@selected]')(inp)
                 if len(options) == 0:
-                    options = inp.xpath('.//option')
+                    options = compile_xpath('.//option')(inp)
                 if len(options) == 0:
                     value = u''
                 else:
@@ -416,11 +472,12 @@ class XMLPage(Page):
     """
 
     def detect_encoding(self):
-        import re
         m = re.search('<\?xml version="1.0" encoding="(.*)"\?>', self.data)
         if m:
             return m.group(1)
 
+    sniff_encoding = detect_encoding
+
     def build_doc(self, content):
         import lxml.etree as etree
         parser = etree.XMLParser(encoding=self.encoding)
@@ -499,7 +556,7 @@ class HTMLPage(Page):
             """
             expressions = ' and '.join(["contains(concat(' ', normalize-space(@class), ' '), ' {0} ')".format(c) for c in classes])
             xpath = 'self::*[@class and {0}]'.format(expressions)
-            return bool(context.context_node.xpath(xpath))
+            return bool(compile_xpath(xpath)(context.context_node))
         ns['has-class'] = has_class
 
     def build_doc(self, content):
@@ -510,21 +567,59 @@ class HTMLPage(Page):
         parser = html.HTMLParser(encoding=self.encoding)
         return html.parse(BytesIO(content), parser)
 
+    SNIFF_SIZE = 4096
+    """
+    Number of bytes in which :meth:`sniff_encoding` looks for meta nodes.
+    """
+
+    META_RE = re.compile(r'<meta\s[^>]*>', re.IGNORECASE)
+    META_CHARSET_RE = re.compile(r'\scharset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+    META_HTTP_EQUIV_RE = re.compile(r'\bhttp-equiv\s*=\s*["\']?content-type', re.IGNORECASE)
+    META_CONTENT_RE = re.compile(r'\bcontent\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE)
+
+    def sniff_encoding(self):
+        """
+        Look for encoding in "http-equiv" and "charset" meta nodes of the
+        beginning of the raw content, like :meth:`detect_encoding` does on
+        the document.
+        """
+        http_equiv = charset = None
+        for meta in self.META_RE.findall(self.content[:self.SNIFF_SIZE]):
+            if self.META_HTTP_EQUIV_RE.search(meta):
+                m = self.META_CONTENT_RE.search(meta)
+                if m:
+                    _, params = parse_header(m.group(1) or m.group(2) or m.group(3))
+                    if 'charset' in params:
+                        http_equiv = params['charset'].strip("'\"")
+            else:
+                # Ignore "charset=" in the content attribute of other metas
+                m = self.META_CHARSET_RE.search(self.META_CONTENT_RE.sub('', meta))
+                if m:
+                    charset = m.group(1).lower()
+
+        return self.normalize_encoding(charset or http_equiv or self.encoding)
+
     def detect_encoding(self):
         """
         Look for encoding in the document "http-equiv" and "charset" meta nodes.
         """
         encoding = self.encoding
-        for content in self.doc.xpath('//head/meta[lower-case(@http-equiv)="content-type"]/@content'):
+        for content in compile_xpath('//head/meta[lower-case(@http-equiv)="content-type"]/@content')(self.doc):
             # meta http-equiv=content-type content=...
             _, params = parse_header(content)
             if 'charset' in params:
                 encoding = params['charset'].strip("'\"")
 
-        for charset in self.doc.xpath('//head/meta[@charset]/@charset'):
+        for charset in compile_xpath('//head/meta[@charset]/@charset')(self.doc):
             # meta charset=...
             encoding = charset.lower()
 
+        return self.normalize_encoding(encoding)
+
+    def normalize_encoding(self, encoding):
+        """
+        Get the encoding to really use for a declared one.
+        """
         if encoding == 'iso-8859-1' or not encoding:
             encoding = 'windows-1252'
         try:
@@ -554,7 +649,7 @@ class HTMLPage(Page):
         :raises: :class:`FormNotFound` if no form is found
         """
         i = 0
-        for el in self.doc.xpath(xpath):
+        for el in compile_xpath(xpath)(self.doc):
             if name is not None and el.attrib.get('name', '') != name:
                 continue
             if nr is not None and i != nr:
@@ -562,7 +657,7 @@ class HTMLPage(Page):
                 continue
 
             if isinstance(submit, basestring):
-                submit_el = el.xpath(submit)[0]
+                submit_el = compile_xpath(submit)(el)[0]
             else:
                 submit_el = submit
 
@@ -584,13 +679,17 @@ class LoggedPage(object):
 
 class ChecksumPage(object):
     """
-    Compute a checksum of raw content before parsing it.
+    Compute a checksum of raw content.
     """
     import hashlib
 
     hashfunc = hashlib.md5
-    checksum = None
+    _checksum = None
 
-    def build_doc(self, content):
-        self.checksum = self.hashfunc(content).hexdigest()
-        return super(ChecksumPage, self).build_doc(content)
+    @property
+    def checksum(self):
+        # Computed lazily rather than in build_doc(), as documents are
+        # shared between pages (see Page.get_doc).
+        if self._checksum is None:
+            self._checksum = self.hashfunc(self.data).hexdigest()
+        return self._checksum
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2017 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import os
+import re
+from threading import Lock
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError
+
+from .cache import TRANSFER_HEADERS, build_response
+
+
+__all__ = ['RecordedSession', 'ReplayAdapter', 'ReplayError']
+
+
+class ReplayError(ConnectionError):
+    """
+    Raised when no recorded response matches a request.
+    """
+
+
+class RecordedResponse(object):
+    def __init__(self, method, url, body, status, reason, headers, content):
+        self.method = method
+        self.url = url
+        self.body = body
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.used = False
+
+
+class RecordedSession(object):
+    """
+    Responses saved by :func:`weboob.browser.browsers.Browser._save` in a
+    directory (with the ``-a`` option of applications).
+
+    A request is matched with recorded ones on its method, URL and body,
+    or only on its method and URL if its body differs (for example when a
+    password has been given). When the same request has been recorded
+    several times, responses are given in the order they were recorded,
+    and the last one is given again once they have all been used.
+
+    :param dirname: directory of the recorded session
+    :type dirname: :class:`str`
+    """
+
+    REQUEST_SUFFIX = '-request.txt'
+    RESPONSE_SUFFIX = '-response.txt'
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self._lock = Lock()
+        self.by_body = {}
+        self.by_url = {}
+        for response in self.iter_recorded():
+            self.by_body.setdefault((response.method, response.url, response.body), []).append(response)
+            self.by_url.setdefault((response.method, response.url), []).append(response)
+
+    def iter_recorded(self):
+        filenames = []
+        for filename in os.listdir(self.dirname):
+            if not filename.endswith(self.REQUEST_SUFFIX):
+                continue
+            m = re.match(r'(\d+)-', filename)
+            if m:
+                filenames.append((int(m.group(1)), filename[:-len(self.REQUEST_SUFFIX)]))
+
+        for _, filename in sorted(filenames):
+            path = os.path.join(self.dirname, filename)
+            with open(path + self.REQUEST_SUFFIX, 'rb') as f:
+                method, url, body = self.parse_request(f.read())
+            with open(path + self.RESPONSE_SUFFIX, 'rb') as f:
+                status, reason, headers = self.parse_response(f.read())
+            with open(path, 'rb') as f:
+                content = f.read()
+            yield RecordedResponse(method, url, body, status, reason, headers, content)
+
+    @staticmethod
+    def parse_request(data):
+        first, _, rest = data.partition('\n\n\n')
+        method, _, url = first.partition(' ')
+        _, sep, body = rest.partition('\n\n\n\n')
+        return method, url, body if sep else None
+
+    @staticmethod
+    def parse_response(data):
+        lines = data.split('\n')
+        if lines[0].startswith('Time:'):
+            lines.pop(0)
+        status, _, reason = lines[0].partition(' ')
+        headers = {}
+        for line in lines[3:]:
+            name, sep, value = line.partition(': ')
+            if sep and name.lower() not in TRANSFER_HEADERS:
+                headers[name] = value
+        return int(status), reason, headers
+
+    def find(self, method, url, body):
+        """
+        Get the recorded response of a request, or None.
+
+        :rtype: :class:`RecordedResponse`
+        """
+        if body is not None and not isinstance(body, bytes):
+            body = body.encode('utf-8')
+
+        with self._lock:
+            responses = self.by_body.get((method, url, body)) or self.by_url.get((method, url))
+            if not responses:
+                return None
+            for response in responses:
+                if not response.used:
+                    response.used = True
+                    return response
+            return responses[-1]
+
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    Transport adapter giving responses of a :class:`RecordedSession`
+    instead of sending requests.
+
+    Cookies set by recorded responses are not stored in the cookie jar.
+
+    :param session: recorded session, or its directory
+    :type session: :class:`RecordedSession` or :class:`str`
+    """
+
+    def __init__(self, session):
+        super(ReplayAdapter, self).__init__()
+        if not isinstance(session, RecordedSession):
+            session = RecordedSession(session)
+        self.recorded = session
+
+    def send(self, request, **kwargs):
+        recorded = self.recorded.find(request.method, request.url, request.body)
+        if recorded is None:
+            raise ReplayError('No recorded response for %s %s' % (request.method, request.url), request=request)
+
+        headers = dict(recorded.headers)
+        headers['Content-Length'] = str(len(recorded.content))
+        return build_response(self, request, recorded.status, recorded.reason, headers, recorded.content)
+
+
+def test():
+    import shutil
+    import tempfile
+    from datetime import timedelta
+
+    from requests import Request, Response
+    from requests.structures import CaseInsensitiveDict
+
+    from .browsers import Browser
+    from .exceptions import HTTPNotFound
+
+    def make_response(method, url, content, data=None, status=200, reason='OK'):
+        response = Response()
+        response.request = Request(method, url, data=data).prepare()
+        response.url = url
+        response.status_code = status
+        response.reason = reason
+        response.headers = CaseInsensitiveDict({'Content-Type': 'text/html; charset=utf-8',
+                                                'Set-Cookie': 'session=42'})
+        response._content = content
+        response.elapsed = timedelta(seconds=0.1)
+        return response
+
+    dirname = tempfile.mkdtemp(prefix='weboob_test_replay_')
+    try:
+        recorder = Browser(responses_dirname=dirname)
+        for response in [make_response('GET', 'http://example.org/', b'home'),
+                         make_response('POST', 'http://example.org/login', b'welcome',
+                                       data={'login': 'me', 'password': 'secret'}),
+                         make_response('GET', 'http://example.org/list?page=1', b'first'),
+                         make_response('GET', 'http://example.org/list?page=1', b'second'),
+                         make_response('GET', 'http://example.org/missing', b'not found', status=404,
+                                       reason='Not Found'),
+                        ]:
+            recorder._save(response)
+
+        browser = Browser(replay_dirname=dirname)
+        response = browser.open('http://example.org/')
+        assert response.content == b'home'
+        assert response.headers['Content-Type'] == 'text/html; charset=utf-8'
+        assert response.encoding == 'utf-8'
+
+        # the body differs, so the request is only matched on its URL
+        assert browser.open('http://example.org/login', data={'login': 'me', 'password': 'other'}).content == b'welcome'
+
+        # responses of a request recorded several times are given in order
+        assert browser.open('http://example.org/list?page=1').content == b'first'
+        assert browser.open('http://example.org/list?page=1').content == b'second'
+        assert browser.open('http://example.org/list?page=1').content == b'second'
+
+        try:
+            browser.open('http://example.org/missing')
+        except HTTPNotFound as error:
+            assert error.response.content == b'not found'
+            assert error.response.reason == 'Not Found'
+        else:
+            assert False, 'recorded status is not replayed'
+
+        for method, url in [('GET', 'http://example.org/other'),
+                            ('POST', 'http://example.org/')]:
+            try:
+                browser.open(url, method=method)
+            except ReplayError:
+                pass
+            else:
+                assert False, 'no error for %s %s' % (method, url)
+    finally:
+        shutil.rmtree(dirname)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2017 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+from threading import Lock
+
+from lxml import etree
+
+from weboob.tools.ordereddict import OrderedDict
+
+
+__all__ = ['SelectorsCache', 'compile_xpath', 'compile_css', 'cache_stats']
+
+
+class SelectorsCache(object):
+    """
+    Thread-safe LRU cache of compiled selectors.
+
+    Compiling an XPath expression (or translating a CSS selector into one)
+    is far more expensive than evaluating it on a small tree, and modules
+    keep evaluating the same few expressions for each scraped element.
+
+    Extension functions (like ``has-class``) are looked up in the global
+    lxml function namespace when the expression is evaluated, so a compiled
+    expression can be shared by every page and every thread.
+
+    :param maxsize: maximum number of compiled selectors to keep
+    :type maxsize: :class:`int`
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._selectors = OrderedDict()
+
+    def get(self, key, factory):
+        """
+        Get the compiled selector stored for this key, or build it with
+        ``factory()`` and store it, evicting the least recently used one
+        when the cache is full.
+        """
+        with self._lock:
+            try:
+                selector = self._selectors.pop(key)
+            except KeyError:
+                pass
+            else:
+                self._selectors[key] = selector
+                self.hits += 1
+                return selector
+
+        # Compile outside of the lock; compilation errors are not cached.
+        selector = factory()
+
+        with self._lock:
+            self.misses += 1
+            self._selectors[key] = selector
+            while len(self._selectors) > self.maxsize:
+                self._selectors.popitem(last=False)
+        return selector
+
+    def clear(self):
+        with self._lock:
+            self._selectors.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        :rtype: :class:`dict`
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'size': len(self._selectors),
+                    'maxsize': self.maxsize,
+                   }
+
+    def __len__(self):
+        return len(self._selectors)
+
+
+CACHE = SelectorsCache()
+
+
+def _namespaces_key(namespaces):
+    if not namespaces:
+        return None
+    return tuple(sorted(namespaces.items(), key=lambda item: (item[0] or '', item[1])))
+
+
+def compile_xpath(expr, namespaces=None):
+    """
+    Get the compiled version of a XPath expression.
+
+    :param expr: XPath expression
+    :type expr: :class:`str`
+    :param namespaces: prefixes to namespaces mapping used by the expression
+    :type namespaces: :class:`dict`
+    :rtype: :class:`lxml.etree.XPath`
+    """
+    return CACHE.get(('xpath', expr, _namespaces_key(namespaces)),
+                     lambda: etree.XPath(expr, namespaces=namespaces))
+
+
+def compile_css(selector, translator='html', namespaces=None):
+    """
+    Get the compiled version of a CSS selector.
+
+    :param selector: CSS selector
+    :type selector: :class:`str`
+    :param translator: 'html' or 'xml', see :class:`lxml.cssselect.CSSSelector`
+    :type translator: :class:`str`
+    :param namespaces: prefixes to namespaces mapping used by the selector
+    :type namespaces: :class:`dict`
+    :rtype: :class:`lxml.cssselect.CSSSelector`
+    """
+    def factory():
+        from lxml.cssselect import CSSSelector
+        return CSSSelector(selector, namespaces=namespaces, translator=translator)
+
+    return CACHE.get(('css', selector, translator, _namespaces_key(namespaces)), factory)
+
+
+def css_translator(el):
+    """
+    Get the translator lxml would use for ``el.cssselect()``.
+    """
+    from lxml.html import HtmlMixin
+    return 'html' if isinstance(el, HtmlMixin) else 'xml'
+
+
+def cache_stats():
+    """
+    Get hits and misses counters of the compiled selectors cache.
+
+    :rtype: :class:`dict`
+    """
+    return CACHE.stats()
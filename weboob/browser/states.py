@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2017 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import
+
+import base64
+import hashlib
+import os
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+
+from weboob.tools.compat import unicode
+
+
+__all__ = ['StateError', 'encrypt_state', 'decrypt_state']
+
+
+# Iterations of PBKDF2 to derive keys from passwords.
+KDF_ITERATIONS = 100000
+
+
+class StateError(Exception):
+    """
+    Raised when a state of browser can't be encrypted or decrypted.
+    """
+
+
+def get_key(password, salt):
+    if isinstance(password, unicode):
+        password = password.encode('utf-8')
+    return base64.urlsafe_b64encode(hashlib.pbkdf2_hmac('sha256', password, salt, KDF_ITERATIONS))
+
+
+def encrypt_state(state, password):
+    """
+    Serialize and encrypt a state of browser with a password.
+
+    :param state: state returned by :func:`LoginBrowser.dump_state`
+    :type state: :class:`dict`
+    :param password: password of the backend
+    :rtype: :class:`str`
+    :raises: :class:`StateError` if python-cryptography is not installed
+    """
+    if Fernet is None:
+        raise StateError('Please install python-cryptography')
+    if not password:
+        raise StateError('No password to encrypt the state')
+
+    salt = os.urandom(16)
+    token = Fernet(get_key(password, salt)).encrypt(pickle.dumps(state, 2))
+    return '%s$%s' % (base64.b64encode(salt).decode('ascii'), token.decode('ascii'))
+
+
+def decrypt_state(data, password):
+    """
+    Decrypt a state encrypted by :func:`encrypt_state`.
+
+    The state is authenticated before being deserialized, so it can't have
+    been modified without the password.
+
+    :rtype: :class:`dict`
+    :raises: :class:`StateError` if the state can't be decrypted
+    """
+    if Fernet is None:
+        raise StateError('Please install python-cryptography')
+    if not password:
+        raise StateError('No password to decrypt the state')
+
+    try:
+        salt, token = data.split('$', 1)
+        salt = base64.b64decode(salt)
+        return pickle.loads(Fernet(get_key(password, salt)).decrypt(token.encode('ascii')))
+    except (ValueError, TypeError, InvalidToken):
+        raise StateError('Unable to decrypt the state')
+
+
+def test():
+    if Fernet is None:
+        return
+
+    state = {'url': 'https://www.example.org/accounts', 'cookies': [], 'logged_at': 1234567890.}
+    data = encrypt_state(state, u'pässword')
+    assert decrypt_state(data, u'pässword') == state
+    try:
+        decrypt_state(data, u'other password')
+    except StateError:
+        pass
+    else:
+        assert False, 'state decrypted with a wrong password'
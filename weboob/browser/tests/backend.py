@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2017 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Event, Lock, Thread
+from time import sleep
+from unittest import TestCase
+
+from weboob.capabilities.base import BaseObject, StringField, IntField, NotLoaded
+from weboob.tools.backend import Module
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+
+class MockSession(object):
+    def __init__(self):
+        self.cookies = {}
+        self.executor = ThreadPoolExecutor(max_workers=2) if ThreadPoolExecutor else None
+
+
+class MockBrowser(object):
+    def __init__(self, number):
+        self.number = number
+        self.session = MockSession()
+
+
+class MyPooledModule(Module):
+    NAME = 'pooled'
+    BROWSERS_POOL_SIZE = 2
+
+    def __init__(self, *args, **kwargs):
+        super(MyPooledModule, self).__init__(*args, **kwargs)
+        self.created = 0
+        self.created_lock = Lock()
+        self.fail = False
+
+    def create_default_browser(self):
+        if self.fail:
+            raise ValueError('unable to create the browser')
+        with self.created_lock:
+            self.created += 1
+            return MockBrowser(self.created)
+
+
+class MySharedModule(MyPooledModule):
+    BROWSERS_SHARE_SESSION = True
+
+
+class BrowsersPoolTest(TestCase):
+    def setUp(self):
+        self.backend = MyPooledModule(None, 'pooled')
+
+    def hold_browser(self, checked_out, release, browsers):
+        # check out a browser in another thread until release is set
+        def run():
+            with self.backend:
+                browsers.append(self.backend.browser)
+                checked_out.set()
+                release.wait(5)
+
+        thread = Thread(target=run)
+        thread.start()
+        return thread
+
+    def test_reentrant(self):
+        with self.backend:
+            browser = self.backend.browser
+            with self.backend:
+                self.assertIs(self.backend.browser, browser)
+            # the inner exit doesn't give the browser back
+            self.assertIs(self.backend._browsers_pool.current(), browser)
+        self.assertIsNone(self.backend._browsers_pool.current())
+        self.assertEqual(self.backend._browsers_pool.available, [browser])
+
+    def test_checkout_checkin(self):
+        release = Event()
+        browsers = []
+        holders = []
+        for i in range(2):
+            checked_out = Event()
+            holders.append(self.hold_browser(checked_out, release, browsers))
+            self.assertTrue(checked_out.wait(5))
+        # each thread has its own browser
+        self.assertEqual(len(set(browsers)), 2)
+
+        # a third thread waits for a browser given back to the pool
+        checked_out = Event()
+        waiting = self.hold_browser(checked_out, release, browsers)
+        self.assertFalse(checked_out.wait(0.1))
+        release.set()
+        self.assertTrue(checked_out.wait(5))
+        for thread in holders + [waiting]:
+            thread.join(5)
+
+        self.assertIn(browsers[2], browsers[:2])
+        self.assertEqual(self.backend.created, 2)
+        self.assertEqual(len(self.backend._browsers_pool.available), 2)
+
+    def test_creation_error(self):
+        self.backend.fail = True
+        for i in range(3):
+            with self.assertRaises(ValueError):
+                with self.backend:
+                    pass
+        # failed creations don't take the place of browsers
+        self.backend.fail = False
+        with self.backend:
+            self.assertEqual(self.backend.browser.number, 1)
+        self.assertEqual(self.backend._browsers_pool.created, 1)
+
+    def browsers_of_threads(self, backend):
+        # browsers checked out at the same time by two threads
+        self.backend = backend
+        release = Event()
+        browsers = []
+        threads = []
+        for i in range(2):
+            checked_out = Event()
+            threads.append(self.hold_browser(checked_out, release, browsers))
+            self.assertTrue(checked_out.wait(5))
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertIsNot(browsers[0], browsers[1])
+        return browsers
+
+    def test_share_session(self):
+        browsers = self.browsers_of_threads(MySharedModule(None, 'shared'))
+        self.assertIs(browsers[0].session.cookies, browsers[1].session.cookies)
+
+        # without sharing, each browser has its own cookies
+        browsers = self.browsers_of_threads(MyPooledModule(None, 'pooled'))
+        self.assertIsNot(browsers[0].session.cookies, browsers[1].session.cookies)
+
+
+class MyObject(BaseObject):
+    title = StringField('Title')
+    size = IntField('Size')
+
+
+class MyFillingModule(MyPooledModule):
+    NAME = 'filling'
+    BROWSERS_POOL_SIZE = 3
+
+    def fill_object(self, obj, fields):
+        # give time to other threads to fill objects at the same time
+        sleep(0.01)
+        self.browsers.add(self.browser)
+        if 'title' in fields:
+            obj.title = u'Object %s' % obj.id
+        if 'size' in fields:
+            obj.size = int(obj.id) * 10
+        return obj
+
+    def fill_objects(self, objs, fields):
+        self.batches.append((len(objs), fields))
+        for obj in objs:
+            self.fill_object(obj, fields)
+
+    OBJECTS = {MyObject: fill_object}
+
+
+class MyBatchModule(MyFillingModule):
+    BATCH_OBJECTS = {MyObject: MyFillingModule.fill_objects}
+
+
+class FillObjsTest(TestCase):
+    def create_objects(self):
+        objs = [MyObject(u'%d' % i) for i in range(8)]
+        # some fields are already filled
+        objs[1].title = u'Already filled'
+        objs[2].title = u'Already filled'
+        objs[2].size = 42
+        return objs
+
+    def fill(self, klass, fields=None):
+        backend = klass(None, klass.NAME)
+        backend.browsers = set()
+        backend.batches = []
+
+        expected = self.create_objects()
+        for obj in expected:
+            backend.fillobj(obj, fields)
+
+        objs = self.create_objects()
+        filled = backend.fillobjs(objs, fields)
+        self.assertEqual([obj.to_dict() for obj in filled], [obj.to_dict() for obj in expected])
+        return backend, filled
+
+    def test_fillobjs(self):
+        backend, objs = self.fill(MyFillingModule)
+        self.assertEqual(objs[1].title, u'Already filled')
+        self.assertEqual(objs[1].size, 10)
+        self.assertEqual(objs[3].title, u'Object 3')
+        if ThreadPoolExecutor is not None:
+            # objects are filled with several browsers of the pool
+            self.assertGreater(len(backend.browsers), 1)
+
+        backend, objs = self.fill(MyFillingModule, ['size'])
+        self.assertIs(objs[3].title, NotLoaded)
+        self.assertEqual(objs[3].size, 30)
+
+    def test_batch(self):
+        backend, objs = self.fill(MyBatchModule)
+        # objects missing the same fields are given together
+        self.assertEqual(sorted(backend.batches), [(1, ['size']), (6, ['title', 'size'])])
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright(C) 2016 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+from decimal import Decimal
+from threading import Thread
+from unittest import TestCase
+
+import lxml.html
+
+from weboob.browser.elements import ListElement, ItemElement, TableElement
+from weboob.browser.filters.standard import CleanText, CleanDecimal, Env, TableCell
+from weboob.browser.selectors import cache_stats
+from weboob.capabilities.bank import Transaction
+
+
+# Mock that allows to represent a Page
+class MyMockPage(object):
+    params = {}
+
+    def __init__(self, rows):
+        self.doc = lxml.html.fromstring(
+            '<table>%s</table>' % ''.join('<tr><td>label %d</td><td>%d,50</td></tr>' % (i, i)
+                                          for i in xrange(rows)))
+
+
+class MyListElement(ListElement):
+    item_xpath = '//tr'
+
+    class item(ItemElement):
+        klass = Transaction
+
+        obj_id = Env('id', default=u'')
+        obj_label = CleanText('./td[1]')
+        obj_amount = CleanDecimal('./td[2]', replace_dots=True)
+        obj_raw = u'constant'
+
+        def obj_category(self):
+            return self.obj.label.upper()
+
+
+class MyTableElement(TableElement):
+    head_xpath = '//tr[1]/th'
+    item_xpath = '//tr[position() > 1]'
+
+    col_label = u'Label'
+    col_amount = u'Amount'
+
+    class item(ItemElement):
+        klass = Transaction
+
+        obj_label = CleanText(TableCell('label'))
+        obj_amount = CleanDecimal(TableCell('amount'), replace_dots=True)
+
+
+# Class that tests how ListElement and ItemElement build objects
+class ElementsTest(TestCase):
+
+    def test_build_objects(self):
+        objs = list(MyListElement(MyMockPage(3))())
+        self.assertEquals([obj.label for obj in objs], [u'label 0', u'label 1', u'label 2'])
+        self.assertEquals(objs[1].amount, Decimal('1.50'))
+        self.assertEquals(objs[1].raw, u'constant')
+        self.assertEquals(objs[2].category, u'LABEL 2')
+
+    # Check that filters shared by element classes can be used by several
+    # threads at the same time
+    def test_threads(self):
+        results = []
+
+        def run():
+            results.append([obj.amount for obj in MyListElement(MyMockPage(200))()])
+
+        threads = [Thread(target=run) for _ in xrange(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = [Decimal('%d.50' % i) for i in xrange(200)]
+        self.assertEquals(results, [expected] * 4)
+
+    def test_table_cells(self):
+        page = MyMockPage(3)
+        page.doc.insert(0, lxml.html.fromstring('<tr><th>Amount</th><th>Label</th></tr>'))
+        for row in page.doc.xpath('//tr[td]'):
+            row.insert(0, row[1])
+
+        objs = list(MyTableElement(page)())
+        self.assertEquals([obj.label for obj in objs], [u'label 0', u'label 1', u'label 2'])
+        self.assertEquals(objs[2].amount, Decimal('2.50'))
+
+        # Selectors are compiled on the first use only
+        misses = cache_stats()['misses']
+        list(MyTableElement(page)())
+        self.assertEquals(cache_stats()['misses'], misses)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# Copyright(C) 2016 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+from unittest import TestCase
+
+from requests import Response
+
+from weboob.browser import PagesBrowser
+from weboob.browser.pages import HTMLPage, CsvPage
+
+
+# Page counting how many times documents are built
+class MyCountingPage(HTMLPage):
+    SHARE_DOC = True
+    built = 0
+
+    def build_doc(self, content):
+        MyCountingPage.built += 1
+        return super(MyCountingPage, self).build_doc(content)
+
+
+# Another candidate for the same response
+class MyOtherCountingPage(MyCountingPage):
+    pass
+
+
+class MyHTMLPage(HTMLPage):
+    pass
+
+
+class MyOtherHTMLPage(HTMLPage):
+    pass
+
+
+class MyCsvPage(CsvPage):
+    pass
+
+
+class MyCsvHeaderPage(CsvPage):
+    HEADER = 1
+
+
+def make_response(content):
+    response = Response()
+    response._content = content
+    response.url = 'http://weboob.org/'
+    response.status_code = 200
+    response.headers['Content-Type'] = 'text/html'
+    return response
+
+
+# Class that tests how documents of pages are built
+class PageDocTest(TestCase):
+
+    def setUp(self):
+        self.browser = PagesBrowser()
+        MyCountingPage.built = 0
+
+    # Check that the meta charset is found before parsing
+    def test_sniff_meta_charset(self):
+        response = make_response('<html><head><meta charset="UTF-8"></head>'
+                                 '<body>\xc3\xa9</body></html>')
+        page = MyCountingPage(self.browser, response)
+        self.assertEquals(page.encoding, 'utf-8')
+        self.assertEquals(page.doc.xpath('//body')[0].text, u'\xe9')
+        self.assertEquals(MyCountingPage.built, 1)
+
+    # Check that the meta http-equiv is found before parsing
+    def test_sniff_meta_http_equiv(self):
+        response = make_response('<html><head><meta http-equiv="Content-Type" '
+                                 'content="text/html; charset=iso-8859-15"></head>'
+                                 '<body>\xa4</body></html>')
+        page = MyCountingPage(self.browser, response)
+        self.assertEquals(page.encoding, 'iso-8859-15')
+        self.assertEquals(page.doc.xpath('//body')[0].text, u'€')
+        self.assertEquals(MyCountingPage.built, 1)
+
+    # Check that the default encoding does not require a second parsing
+    def test_no_charset(self):
+        page = MyCountingPage(self.browser, make_response('<html><body>\xe9</body></html>'))
+        self.assertEquals(page.encoding, 'windows-1252')
+        self.assertEquals(MyCountingPage.built, 1)
+
+    # Check that several pages on the same response share the document
+    def test_shared_doc(self):
+        response = make_response('<html><body>a</body></html>')
+        page = MyCountingPage(self.browser, response)
+        other = MyOtherCountingPage(self.browser, response)
+        self.assertIs(page.doc, other.doc)
+        self.assertEquals(MyCountingPage.built, 1)
+
+    # Check that documents are not shared unless pages ask for it
+    def test_shared_doc_opt_in(self):
+        response = make_response('<html><body>a</body></html>')
+        page = MyHTMLPage(self.browser, response)
+        page.doc.getroot().set('class', 'changed')
+        other = MyOtherHTMLPage(self.browser, response)
+        self.assertIsNot(other.doc, page.doc)
+        self.assertIsNone(other.doc.getroot().get('class'))
+
+    # Check that pages which build documents differently don't share them
+    def test_not_shared_doc(self):
+        response = make_response('a,b\r\n1,2\r\n')
+        self.assertEquals(MyCsvPage(self.browser, response).doc, [[u'a', u'b'], [u'1', u'2']])
+        self.assertEquals(MyCsvHeaderPage(self.browser, response).doc, [{u'a': u'1', u'b': u'2'}])
@@ -19,7 +19,7 @@ from unittest import TestCase
 
 from weboob.browser import PagesBrowser, URL
 from weboob.browser.pages import Page
-from weboob.browser.url import UrlNotResolvable
+from weboob.browser.url import UrlNotResolvable, literal_prefix
 
 
 class MyMockBrowserWithoutBrowser():
@@ -127,3 +127,25 @@ class URLTest(TestCase):
         self.assertRaisesRegexp(AssertionError, "You can use this method" +
                                 " only if there is a Page class handler.",
                                 self.myBrowser.urlRegex.is_here, id=2)
+
+    # Check that literal prefixes stop at the first special character
+    def test_literal_prefix(self):
+        self.assertEquals(literal_prefix(r"http://test\.com\?id=(?P<id>\d+)"),
+                          "http://test.com?id=")
+        self.assertEquals(literal_prefix(r"http://test\.com/pages?"),
+                          "http://test.com/page")
+        self.assertEquals(literal_prefix(r"http://test\.com/\d+"),
+                          "http://test.com/")
+        self.assertEquals(literal_prefix(r"(?i)http://test\.com"), "")
+        self.assertEquals(literal_prefix(r"http://test\.com/a|/b"), "")
+        self.assertEquals(literal_prefix(r"http://test\.com/(a|b)"), "http://test.com/")
+
+    # Check that relative urls are prefixed by the BASEURL in the
+    # dispatch table
+    def test_urls_dispatch(self):
+        dispatch = dict(self.myBrowser.get_urls_dispatch())
+        self.assertEquals(dispatch['urlRegWithoutHttp'], ("http://weboob.org/news",))
+        # unescaped dots are wildcards
+        self.assertEquals(dispatch['urlNotRegex'], ("http://test", "http://test2"))
+        self.assertIs(self.myBrowser.get_urls_dispatch(),
+                      MyMockBrowser().get_urls_dispatch())
@@ -27,6 +27,89 @@ import requests
 from weboob.tools.regex_helper import normalize
 
 
+REGEX_SPECIAL_CHARS = '.^$*+?{}[]|()'
+REGEX_QUANTIFIERS = '*+?{'
+REGEX_INLINE_FLAGS = re.compile(r'\(\?[iLmsux]+\)')
+
+
+def has_top_level_alternation(regex):
+    r"""
+    Check if a regexp has a ``|`` outside of groups and character classes.
+
+    >>> has_top_level_alternation(r'/a|/b')
+    True
+    >>> has_top_level_alternation(r'/(a|b)/[|]\|')
+    False
+    """
+    depth = 0
+    i = 0
+    while i < len(regex):
+        c = regex[i]
+        if c == '\\':
+            i += 1
+        elif c == '[':
+            # skip the character class, where ']' is literal at first
+            i += 1
+            if i < len(regex) and regex[i] == '^':
+                i += 1
+            if i < len(regex) and regex[i] == ']':
+                i += 1
+            while i < len(regex) and regex[i] != ']':
+                if regex[i] == '\\':
+                    i += 1
+                i += 1
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == '|' and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def literal_prefix(regex):
+    r"""
+    Get the literal string every string matched by a regexp starts with.
+
+    >>> literal_prefix(r'http://example\.org/account/(?P<id>\d+)')
+    'http://example.org/account/'
+    >>> literal_prefix(r'http://example\.org/pages?/')
+    'http://example.org/page'
+    >>> literal_prefix(r'(?i)http://example\.org/')
+    ''
+    >>> literal_prefix(r'http://example\.org/a|http://example\.org/b')
+    ''
+    """
+    if REGEX_INLINE_FLAGS.search(regex):
+        # Flags apply on the whole regexp, the prefix would be misleading.
+        return ''
+    if has_top_level_alternation(regex):
+        # The prefix of the first alternative is not shared by the others.
+        return ''
+
+    prefix = []
+    i = 0
+    while i < len(regex):
+        c = regex[i]
+        if c == '\\':
+            if i + 1 >= len(regex) or regex[i+1].isalnum():
+                # End of string, or special sequence like \d or \1
+                break
+            c = regex[i+1]
+            i += 2
+        elif c in REGEX_SPECIAL_CHARS:
+            break
+        else:
+            i += 1
+
+        if i < len(regex) and regex[i] in REGEX_QUANTIFIERS:
+            # This character may be absent or repeated.
+            break
+        prefix.append(c)
+    return ''.join(prefix)
+
+
 class UrlNotResolvable(Exception):
     """
     Raised when trying to locate on an URL instance which url pattern is not resolvable as a real url.
@@ -39,10 +122,22 @@ class URL(object):
 
     It takes one or several regexps to match urls, and an optional Page
     class which is instancied by PagesBrowser.open if the page matches a regex.
+
+    The ``ttl`` keyword argument is the number of seconds responses of this
+    URL are kept in the HTTP cache of the browser (see
+    :attr:`weboob.browser.browsers.Browser.HTTP_CACHE`), whatever headers
+    the server sends.
     """
     _creation_counter = 0
 
-    def __init__(self, *args):
+    # Compiled regexps and literal prefixes of patterns, shared by every
+    # instances, as URL objects are copied for each browser.
+    _regexes_cache = {}
+
+    def __init__(self, *args, **kwargs):
+        self.ttl = kwargs.pop('ttl', None)
+        if kwargs:
+            raise TypeError('Unexpected arguments: %s' % ', '.join(kwargs))
         self.urls = []
         self.klass = None
         self.browser = None
@@ -156,16 +251,47 @@ class URL(object):
         """
         Check if the given url match this object.
         """
+        for regex, prefix in self.get_regexes(base):
+            if not url.startswith(prefix):
+                continue
+            m = regex.match(url)
+            if m:
+                return m
+
+    def get_regexes(self, base=None):
+        """
+        Get compiled regexps of this object, with the literal prefix of
+        each of them.
+
+        Results are cached, so patterns are compiled only once per process.
+
+        :rtype: list[(regexp, :class:`str`)]
+        """
         if base is None:
             assert self.browser is not None
             base = self.browser.BASEURL
 
-        for regex in self.urls:
-            if not re.match(r'^\w+://.*', regex):
-                regex = re.escape(base).rstrip('/') + '/' + regex.lstrip('/')
-            m = re.match(regex, url)
-            if m:
-                return m
+        regexes = []
+        for pattern in self.urls:
+            key = (pattern, base)
+            try:
+                regexes.append(self._regexes_cache[key])
+            except KeyError:
+                regex = pattern
+                if not re.match(r'^\w+://.*', regex):
+                    regex = re.escape(base).rstrip('/') + '/' + regex.lstrip('/')
+                item = (re.compile(regex), literal_prefix(regex))
+                self._regexes_cache[key] = item
+                regexes.append(item)
+        return regexes
+
+    def get_prefixes(self, base=None):
+        """
+        Get literal prefixes of every url matched by this object.
+
+        :rtype: tuple[:class:`str`]
+        """
+        return tuple(prefix for _, prefix in self.get_regexes(base))
 
     def handle(self, response):
         """
@@ -20,10 +20,11 @@
 
 import warnings
 import re
+import datetime
 from decimal import Decimal
 from copy import deepcopy, copy
 
-from weboob.tools.compat import unicode, long
+from weboob.tools.compat import unicode, long, basestring, izip
 from weboob.tools.misc import to_unicode
 from weboob.tools.ordereddict import OrderedDict
 
@@ -31,7 +32,7 @@ from weboob.tools.ordereddict import OrderedDict
 __all__ = ['UserError', 'FieldNotFound', 'NotAvailable',
            'NotLoaded', 'Capability', 'Field', 'IntField', 'DecimalField',
            'FloatField', 'StringField', 'BytesField',
-           'empty', 'BaseObject']
+           'empty', 'BaseObject', 'FieldsProjection', 'FieldsRow']
 
 
 def empty(value):
@@ -115,6 +116,10 @@ class NotAvailableType(object):
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        # unpickled as the constant
+        return 'NotAvailable'
+
     def __repr__(self):
         return 'NotAvailable'
 
@@ -144,6 +149,10 @@ class NotLoadedType(object):
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        # unpickled as the constant
+        return 'NotLoaded'
+
     def __repr__(self):
         return u'NotLoaded'
 
@@ -198,6 +207,41 @@ class Field(object):
         """
         return value
 
+    def normalize(self, value):
+        """
+        Get the value to store, once it has been checked.
+        """
+        return value
+
+    def validate(self, name, value, stacklevel=2):
+        """
+        Convert and check a value set on the field *name* of an object.
+
+        :returns: the value to store
+        :raises: :class:`ValueError` if the value has not an accepted type
+        """
+        if not empty(value):
+            try:
+                # Try to convert value to the wanted one.
+                nvalue = self.convert(value)
+                # If the value was converted
+                if nvalue is not value:
+                    warnings.warn('Value %s was converted from %s to %s' %
+                                  (name, type(value), type(nvalue)),
+                                  ConversionWarning, stacklevel=stacklevel + 1)
+                value = nvalue
+            except Exception:
+                # error during conversion, it will probably not
+                # match the wanted following types, so we'll
+                # raise ValueError.
+                pass
+
+            if not isinstance(value, self.types):
+                raise ValueError(
+                    'Value for "%s" needs to be of type %r, not %r' % (
+                        name, self.types, type(value)))
+        return self.normalize(value)
+
 
 class IntField(Field):
     """
@@ -263,18 +307,76 @@ class BytesField(Field):
         return str(value)
 
 
+class _FieldSlot(object):
+    """
+    Descriptor giving access to the value of a field, stored in the
+    ``_values`` list of objects at the index of the field.
+    """
+
+    __slots__ = ('name', 'field', 'index')
+
+    def __init__(self, name, field, index):
+        self.name = name
+        self.field = field
+        self.index = index
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj._values[self.index]
+        if value is _DELETED:
+            raise AttributeError("'%s' object has no attribute '%s'" % (
+                obj.__class__.__name__, self.name))
+        return value
+
+    def __set__(self, obj, value):
+        if not obj.DEFERRED_VALIDATION:
+            value = self.field.validate(self.name, value, stacklevel=3)
+        obj._values[self.index] = value
+
+    def __delete__(self, obj):
+        if obj._values[self.index] is _DELETED:
+            raise AttributeError(self.name)
+        obj._values[self.index] = _DELETED
+
+
+# Marker of fields removed from an object with delattr().
+_DELETED = object()
+
+# Types of default values which can be shared by all objects.
+_IMMUTABLE_TYPES = (NotAvailableType, NotLoadedType, type(None), bool, int, long,
+                    float, Decimal, basestring, tuple, frozenset,
+                    datetime.date, datetime.time, datetime.timedelta)
+
+
 class _BaseObjectMeta(type):
     def __new__(cls, name, bases, attrs):
         fields = [(field_name, attrs.pop(field_name)) for field_name, obj in attrs.items() if isinstance(obj, Field)]
         fields.sort(key=lambda x: x[1]._creation_counter)
 
+        # Values are stored in the _values list of objects, so instances
+        # do not need a __dict__ unless a non-field attribute is set.
+        attrs.setdefault('__slots__', ())
+
         new_class = super(_BaseObjectMeta, cls).__new__(cls, name, bases, attrs)
         if new_class._fields is None:
             new_class._fields = OrderedDict()
         else:
-            new_class._fields = deepcopy(new_class._fields)
+            new_class._fields = copy(new_class._fields)
         new_class._fields.update(fields)
 
+        # Field metadata is shared by all objects of the class.
+        defaults = []
+        mutable_defaults = []
+        for index, (field_name, field) in enumerate(new_class._fields.iteritems()):
+            if field_name not in attrs:
+                setattr(new_class, field_name, _FieldSlot(field_name, field, index))
+            defaults.append(field.value)
+            if not isinstance(field.value, _IMMUTABLE_TYPES):
+                mutable_defaults.append((index, field.value))
+        new_class._defaults = tuple(defaults)
+        new_class._mutable_defaults = tuple(mutable_defaults)
+
         if new_class.__doc__ is None:
             new_class.__doc__ = ''
         for name, field in fields:
@@ -307,18 +409,37 @@ class BaseObject(object):
             recipient = Field('Recipient', int, long, basestring)
 
     The docstring is mandatory.
+
+    Fields are described once on the class, and values of an object are
+    stored in a list laid out like the fields of its class.
+
+    When :attr:`DEFERRED_VALIDATION` is set on a class, values are stored
+    as they are given, and are only converted and checked when
+    :func:`validate` is called.
     """
 
     __metaclass__ = _BaseObjectMeta
+    __slots__ = ('id', 'backend', '_values', '__dict__', '__weakref__')
+
+    DEFERRED_VALIDATION = False
 
-    id = None
-    backend = None
     _fields = None
+    _defaults = ()
+    _mutable_defaults = ()
+
+    def __new__(cls, *args, **kwargs):
+        obj = super(BaseObject, cls).__new__(cls)
+        values = list(cls._defaults)
+        for index, value in cls._mutable_defaults:
+            values[index] = deepcopy(value)
+        object.__setattr__(obj, '_values', values)
+        object.__setattr__(obj, 'id', None)
+        object.__setattr__(obj, 'backend', None)
+        return obj
 
     def __init__(self, id=u'', backend=None):
         self.id = to_unicode(id)
         self.backend = backend
-        self._fields = deepcopy(self._fields)
 
     @property
     def fullid(self):
@@ -344,12 +465,35 @@ class BaseObject(object):
 
     def copy(self):
         obj = copy(self)
-        obj._fields = copy(self._fields)
+        object.__setattr__(obj, '_values', list(self._values))
         return obj
 
     def __deepcopy__(self, memo):
         return self.copy()
 
+    def __getstate__(self):
+        # Slots are not pickled by default, and the marker of deleted
+        # fields would not be the same object once unpickled.
+        values = list(self._values)
+        deleted = [index for index, value in enumerate(values) if value is _DELETED]
+        for index in deleted:
+            values[index] = None
+        return {'id': self.id,
+                'backend': self.backend,
+                '_values': values,
+                '_deleted': deleted,
+                '__dict__': self.__dict__,
+               }
+
+    def __setstate__(self, state):
+        values = list(state['_values'])
+        for index in state['_deleted']:
+            values[index] = _DELETED
+        object.__setattr__(self, '_values', values)
+        object.__setattr__(self, 'id', state['id'])
+        object.__setattr__(self, 'backend', state['backend'])
+        self.__dict__.update(state['__dict__'])
+
     def set_empty_fields(self, value, excepts=()):
         """
         Set the same value on all empty fields.
@@ -372,8 +516,21 @@ class BaseObject(object):
 
         if hasattr(self, 'id') and self.id is not None:
             yield 'id', self.id
-        for name, field in self._fields.iteritems():
-            yield name, field.value
+        for name, value in izip(self._fields, self._values):
+            if value is not _DELETED:
+                yield name, value
+
+    def validate(self):
+        """
+        Convert and check values of all fields, for classes which defer the
+        validation.
+
+        :raises: :class:`ValueError` if a value has not a type accepted by its field
+        """
+        for index, (name, field) in enumerate(self._fields.iteritems()):
+            value = self._values[index]
+            if value is not _DELETED:
+                self._values[index] = field.validate(name, value)
 
     def __eq__(self, obj):
         if isinstance(obj, BaseObject):
@@ -381,49 +538,12 @@ class BaseObject(object):
         else:
             return False
 
-    def __getattr__(self, name):
-        if self._fields is not None and name in self._fields:
-            return self._fields[name].value
-        else:
-            raise AttributeError("'%s' object has no attribute '%s'" % (
-                self.__class__.__name__, name))
-
     def __setattr__(self, name, value):
-        try:
-            attr = (self._fields or {})[name]
-        except KeyError:
-            if name not in dir(self) and not name.startswith('_'):
-                warnings.warn('Creating a non-field attribute %s. Please prefix it with _' % name,
-                              AttributeCreationWarning, stacklevel=2)
-            object.__setattr__(self, name, value)
-        else:
-            if not empty(value):
-                try:
-                    # Try to convert value to the wanted one.
-                    nvalue = attr.convert(value)
-                    # If the value was converted
-                    if nvalue is not value:
-                        warnings.warn('Value %s was converted from %s to %s' %
-                                      (name, type(value), type(nvalue)),
-                                      ConversionWarning, stacklevel=2)
-                    value = nvalue
-                except Exception:
-                    # error during conversion, it will probably not
-                    # match the wanted following types, so we'll
-                    # raise ValueError.
-                    pass
-
-            if not isinstance(value, attr.types) and not empty(value):
-                raise ValueError(
-                    'Value for "%s" needs to be of type %r, not %r' % (
-                        name, attr.types, type(value)))
-            attr.value = value
-
-    def __delattr__(self, name):
-        try:
-            self._fields.pop(name)
-        except KeyError:
-            object.__delattr__(self, name)
+        if name not in self._fields and not name.startswith('_') and not hasattr(self.__class__, name) \
+           and name not in self.__dict__:
+            warnings.warn('Creating a non-field attribute %s. Please prefix it with _' % name,
+                          AttributeCreationWarning, stacklevel=2)
+        object.__setattr__(self, name, value)
 
     def to_dict(self):
         def iter_decorate(d):
@@ -436,6 +556,130 @@ class BaseObject(object):
         return OrderedDict(iter_decorate(fields_iterator))
 
 
+
+class FieldsRow(object):
+    """
+    Read-only view on values of fields of an object, given by a
+    :class:`FieldsProjection`.
+
+    It can be used like the dict returned by :func:`BaseObject.to_dict`.
+    """
+
+    __slots__ = ('_keys', '_values')
+
+    def __init__(self, keys, values):
+        self._keys = keys
+        self._values = values
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self._keys)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return zip(self._keys, self._values)
+
+    iterkeys = __iter__
+
+    def itervalues(self):
+        return iter(self._values)
+
+    def iteritems(self):
+        return izip(self._keys, self._values)
+
+    def to_dict(self):
+        return OrderedDict(izip(self._keys, self._values))
+
+    def __repr__(self):
+        return '<FieldsRow %r>' % self.items()
+
+
+class FieldsProjection(object):
+    """
+    Selection of fields of a class of objects, compiled once.
+
+    Calling it on an object gives a :class:`FieldsRow` of the values
+    :func:`BaseObject.to_dict` would give if unselected fields were removed
+    from a copy of the object, without copying it.
+
+    Use :func:`get` to get the projection of a class.
+
+    :param klass: class of objects
+    :type klass: :class:`BaseObject`
+    :param fields: names of selected fields, or None to select all of them
+    :type fields: tuple
+    """
+
+    _projections = {}
+
+    def __init__(self, klass, fields=None):
+        self.klass = klass
+        self.fields = fields
+        # Objects which decorate their fields differently are projected
+        # from the result of to_dict().
+        self.generic = klass.to_dict != BaseObject.to_dict or klass.iter_fields != BaseObject.iter_fields
+        self.with_id = fields is None or 'id' in fields
+        self.indexes = tuple((name, index) for index, name in enumerate(klass._fields)
+                             if fields is None or name in fields)
+
+    @classmethod
+    def get(cls, klass, fields=None):
+        """
+        Get the projection of a class, built at the first call.
+
+        :rtype: :class:`FieldsProjection`
+        """
+        if fields is not None:
+            fields = tuple(fields)
+        key = (klass, fields)
+        try:
+            return cls._projections[key]
+        except KeyError:
+            return cls._projections.setdefault(key, cls(klass, fields))
+
+    def __call__(self, obj):
+        keys = []
+        values = []
+        if self.generic:
+            for key, value in obj.to_dict().iteritems():
+                if self.fields is None or key in self.fields:
+                    keys.append(key)
+                    values.append(value)
+            return FieldsRow(keys, values)
+
+        if self.with_id and getattr(obj, 'id', None) is not None:
+            keys.append('id')
+            values.append(obj.fullid if obj.backend is not None else obj.id)
+        obj_values = obj._values
+        for name, index in self.indexes:
+            value = obj_values[index]
+            if value is not _DELETED:
+                keys.append(name)
+                values.append(value)
+        return FieldsRow(keys, values)
+
 class Currency(object):
     CURRENCIES = {u'EUR': u'€',
                   u'CHF': u'CHF',
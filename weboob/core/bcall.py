@@ -18,19 +18,26 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+from collections import deque
 from copy import copy
-from threading import Thread
+import sys
+from threading import Thread, Event, Lock, local
 try:
     import Queue
 except ImportError:
     import queue as Queue
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
 
 from weboob.capabilities.base import BaseObject
+from weboob.tools.compat import basestring
 from weboob.tools.misc import get_backtrace
 from weboob.tools.log import getLogger
 
 
-__all__ = ['BackendsCall', 'CallErrors']
+__all__ = ['BackendsCall', 'CallErrors', 'create_executor']
 
 
 class CallErrors(Exception):
@@ -46,23 +53,165 @@ class CallErrors(Exception):
         return self.errors.__iter__()
 
 
+class ThreadsExecutor(object):
+    """
+    Minimal executor used when concurrent.futures is not installed: it
+    starts a new thread for each submitted task.
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        Thread(target=fn, args=args, kwargs=kwargs).start()
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def create_executor(max_workers):
+    """
+    Create the executor used to run backends calls.
+
+    :param max_workers: maximum number of threads of the pool
+    :type max_workers: :class:`int`
+    """
+    if ThreadPoolExecutor is None:
+        return ThreadsExecutor()
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
 class BackendsCall(object):
+    # Marker put in the responses queue once every backend has finished.
+    FINISHED = object()
+    # Only there to keep blocking waits interruptible by KeyboardInterrupt
+    # on Python 2. Completion itself is signaled, not polled.
+    WAIT_TIMEOUT = 1
+
+    # Calls whose results are being consumed by each thread.
+    _consumed = local()
+
+    @classmethod
+    def _consumed_calls(cls):
+        try:
+            return cls._consumed.calls
+        except AttributeError:
+            calls = cls._consumed.calls = []
+            return calls
+
     def __init__(self, backends, function, *args, **kwargs):
         """
         :param backends: List of backends to call
         :type backends: list[:class:`Module`]
         :param function: backends' method name, or callable object.
         :type function: :class:`str` or :class:`callable`
+        :param executor: executor on which backends calls are submitted; if
+                         not given, one thread is started for each backend.
+        :param max_concurrency: maximum number of backends called at the
+                                same time for this call
+        :type max_concurrency: :class:`int`
+        :param buffer_size: maximum number of results waiting to be consumed;
+                            when it is reached, backends are paused until the
+                            consumer catches up. Default is unlimited. The
+                            limit is dropped if another call is made by the
+                            consumer while it iterates on results.
+        :type buffer_size: :class:`int`
+        :param condition: if given, only objects for which its ``is_valid()``
+                          method returns True are kept; they are filtered
+                          in backends threads.
+        :type condition: :class:`weboob.tools.application.results.IResultsCondition`
         """
         self.logger = getLogger('bcall')
 
-        self.responses = Queue.Queue()
+        self.executor = kwargs.pop('executor', None) or ThreadsExecutor()
+        self.max_concurrency = kwargs.pop('max_concurrency', None)
+        buffer_size = kwargs.pop('buffer_size', None) or 0
+        self.condition = kwargs.pop('condition', None)
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+        self.responses = Queue.Queue(buffer_size)
         self.errors = []
-        self.tasks = Queue.Queue()
+        self.finished = Event()
+
+        # A call made while results of other calls are consumed by this
+        # thread is consumed first, and its backends may wait for workers of
+        # the shared executor which are paused by a full buffer of the other
+        # calls. Stop pausing them, so they can finish.
+        for bcall in self._consumed_calls():
+            bcall._unbound_responses()
+
+        self.mutex = Lock()
+        self.pending = list(backends)
+        self.running = 0
+        self.cancelled = set()
+        self.all_cancelled = False
+
+        if not self.pending:
+            self._finish()
+            return
 
+        with self.mutex:
+            to_start = len(self.pending)
+            if self.max_concurrency:
+                to_start = min(to_start, self.max_concurrency)
+            backends = [self._pop_pending() for _ in range(to_start)]
         for backend in backends:
-            Thread(target=self.backend_process, args=(function, args, kwargs)).start()
-            self.tasks.put(backend)
+            self.executor.submit(self.backend_process, backend)
+
+    def _pop_pending(self):
+        self.running += 1
+        return self.pending.pop(0)
+
+    def _finish(self):
+        self.finished.set()
+        self._unbound_responses()
+        self.responses.put(self.FINISHED)
+
+    def _unbound_responses(self):
+        # Used when backpressure is not wanted anymore (call finished or
+        # canceled, or nobody consumes results), to wake up paused backends.
+        # On Python 3, a paused put() waits while the queue holds at least
+        # maxsize items, so setting it to 0 would not wake it up.
+        with self.responses.mutex:
+            self.responses.maxsize = sys.maxsize
+            self.responses.not_full.notify_all()
+
+    def _task_done(self):
+        with self.mutex:
+            self.running -= 1
+            backend = self._pop_pending() if self.pending else None
+            done = self.running == 0
+
+        if backend is not None:
+            self.executor.submit(self.backend_process, backend)
+        elif done:
+            self._finish()
+
+    def cancel(self, backends=None):
+        """
+        Stop calling some backends.
+
+        Backends which are not started yet are skipped, and running ones stop
+        to be iterated at the next result they yield.
+
+        :param backends: backends (or names of backends) to cancel; if None,
+                         the whole call is canceled
+        :type backends: list[:class:`Module`]
+        """
+        with self.mutex:
+            if backends is None:
+                self.all_cancelled = True
+                self.pending = []
+                self._unbound_responses()
+                return
+
+            if isinstance(backends, basestring) or not hasattr(backends, '__iter__'):
+                backends = [backends]
+            for backend in backends:
+                self.cancelled.add(backend if isinstance(backend, basestring) else backend.name)
+            self.pending = [backend for backend in self.pending if not self.is_cancelled(backend)]
+
+    def is_cancelled(self, backend):
+        return self.all_cancelled or backend.name in self.cancelled
 
     def store_result(self, backend, result):
         if result is None:
@@ -70,45 +219,77 @@ class BackendsCall(object):
 
         if isinstance(result, BaseObject):
             result.backend = backend.name
+            if self.condition is not None and not self.condition.is_valid(result):
+                return
         self.responses.put(result)
 
-    def backend_process(self, function, args, kwargs):
-        backend = self.tasks.get()
-        with backend:
+    def backend_process(self, backend):
+        try:
+            # Entering a lazy backend loads it, which can fail.
+            with backend:
+                self._call_backend(backend)
+        except Exception as error:
+            self.logger.debug('%s: Unable to load backend: %r', backend, error)
+            self.errors.append((backend, error, get_backtrace(error)))
+        finally:
+            self._task_done()
+
+    def _call_backend(self, backend):
+        function = self.function
+        # Call method on backend
+        try:
+            self.logger.debug('%s: Calling function %s', backend, function)
+            if callable(function):
+                result = function(backend, *self.args, **self.kwargs)
+            else:
+                result = getattr(backend, function)(*self.args, **self.kwargs)
+        except Exception as error:
+            self.logger.debug('%s: Called function %s raised an error: %r', backend, function, error)
+            self.errors.append((backend, error, get_backtrace(error)))
+            return
+
+        self.logger.debug('%s: Called function %s returned: %r', backend, function, result)
+
+        if hasattr(result, '__iter__') and not isinstance(result, basestring):
+            # Loop on iterator
+            try:
+                for subresult in result:
+                    if self.is_cancelled(backend):
+                        self.logger.debug('%s: Call to function %s is canceled', backend, function)
+                        if hasattr(result, 'close'):
+                            result.close()
+                        break
+                    self.store_result(backend, subresult)
+            except Exception as error:
+                self.errors.append((backend, error, get_backtrace(error)))
+        else:
             try:
-                # Call method on backend
+                self.store_result(backend, result)
+            except Exception as error:
+                self.errors.append((backend, error, get_backtrace(error)))
+
+    def _iter_responses(self):
+        consumed = self._consumed_calls()
+        consumed.append(self)
+        try:
+            while True:
                 try:
-                    self.logger.debug('%s: Calling function %s', backend, function)
-                    if callable(function):
-                        result = function(backend, *args, **kwargs)
-                    else:
-                        result = getattr(backend, function)(*args, **kwargs)
-                except Exception as error:
-                    self.logger.debug('%s: Called function %s raised an error: %r', backend, function, error)
-                    self.errors.append((backend, error, get_backtrace(error)))
-                else:
-                    self.logger.debug('%s: Called function %s returned: %r', backend, function, result)
-
-                    if hasattr(result, '__iter__') and not isinstance(result, basestring):
-                        # Loop on iterator
-                        try:
-                            for subresult in result:
-                                self.store_result(backend, subresult)
-                        except Exception as error:
-                            self.errors.append((backend, error, get_backtrace(error)))
-                    else:
-                        self.store_result(backend, result)
-            finally:
-                self.tasks.task_done()
+                    response = self.responses.get(timeout=self.WAIT_TIMEOUT)
+                except Queue.Empty:
+                    continue
+
+                if response is self.FINISHED:
+                    # Put the marker back for any other consumer.
+                    self.responses.put(response)
+                    return
+                yield response
+        finally:
+            consumed.remove(self)
 
     def _callback_thread_run(self, callback, errback, finishback):
-        while self.tasks.unfinished_tasks or not self.responses.empty():
-            try:
-                response = self.responses.get(timeout=0.1)
-                if callback:
-                    callback(response)
-            except Queue.Empty:
-                continue
+        for response in self._iter_responses():
+            if callback:
+                callback(response)
 
         # Raise errors
         while errback and self.errors:
@@ -136,17 +317,225 @@ class BackendsCall(object):
         return thread
 
     def wait(self):
-        self.tasks.join()
+        # Results are not consumed here, so do not pause backends.
+        self._unbound_responses()
+        while not self.finished.isSet():
+            self.finished.wait(self.WAIT_TIMEOUT)
 
         if self.errors:
             raise CallErrors(self.errors)
 
     def __iter__(self):
-        while self.tasks.unfinished_tasks or not self.responses.empty():
-            try:
-                yield self.responses.get(timeout=0.1)
-            except Queue.Empty:
-                continue
+        complete = False
+        try:
+            for response in self._iter_responses():
+                yield response
+            complete = True
+        finally:
+            if not complete:
+                # The consumer stopped before the end, there is no need to
+                # keep fetching results.
+                self.cancel()
 
         if self.errors:
             raise CallErrors(self.errors)
+
+    def __aiter__(self):
+        return AsyncBackendsCallIterator(self)
+
+
+class AsyncBackendsCallIterator(object):
+    """
+    Asynchronous iterator on results of a :class:`BackendsCall`, to be used
+    from an asyncio event loop::
+
+        async for result in weboob.ado('iter_accounts'):
+            print(result)
+
+    Results are forwarded to the event loop by the thread created by
+    :func:`BackendsCall.callback_thread`, so the loop is never blocked.
+    Errors are raised at the end of the iteration as a :class:`CallErrors`,
+    and cancelling the awaiting task cancels the backends call.
+
+    :param bcall: backends call to iterate on
+    :type bcall: :class:`BackendsCall`
+    :param loop: event loop to use; default is the current one
+    """
+
+    def __init__(self, bcall, loop=None):
+        import asyncio
+
+        self.bcall = bcall
+        self.loop = loop or asyncio.get_event_loop()
+        self.results = deque()
+        self.waiter = None
+        self.finished = False
+        self.raised = False
+
+        self.bcall.callback_thread(self._threadsafe(self._on_result), None,
+                                   self._threadsafe(self._on_finish))
+
+    def _threadsafe(self, function):
+        def caller(*args):
+            try:
+                self.loop.call_soon_threadsafe(function, *args)
+            except RuntimeError:
+                # The loop is closed, so nobody waits for results anymore
+                # (for example if the iteration has been cancelled).
+                pass
+        return caller
+
+    def _on_result(self, result):
+        self.results.append(result)
+        self._wakeup()
+
+    def _on_finish(self):
+        self.finished = True
+        self._wakeup()
+
+    def _wakeup(self):
+        if self.waiter is not None and not self.waiter.done():
+            self._resolve(self.waiter)
+
+    def _resolve(self, future):
+        if self.results:
+            future.set_result(self.results.popleft())
+        elif self.finished:
+            if self.bcall.errors and not self.raised:
+                self.raised = True
+                future.set_exception(CallErrors(self.bcall.errors))
+            else:
+                future.set_exception(StopAsyncIteration())
+
+    def _on_waiter_done(self, future):
+        if future.cancelled():
+            self.bcall.cancel()
+
+    def cancel(self, backends=None):
+        """
+        Cancel the whole call, or only some backends.
+
+        See :func:`BackendsCall.cancel`.
+        """
+        self.bcall.cancel(backends)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        import asyncio
+
+        future = asyncio.Future(loop=self.loop)
+        future.add_done_callback(self._on_waiter_done)
+        self._resolve(future)
+        if not future.done():
+            self.waiter = future
+        return future
+
+    def aclose(self):
+        """
+        Stop the iteration before its end and cancel running backends.
+        """
+        import asyncio
+
+        self.bcall.cancel()
+        future = asyncio.Future(loop=self.loop)
+        future.set_result(None)
+        return future
+
+
+def test():
+    class FakeBackend(object):
+        def __init__(self, name, error=None):
+            self.name = name
+            self.error = error
+
+        def __enter__(self):
+            if self.error is not None:
+                raise self.error
+            return self
+
+        def __exit__(self, t, v, tb):
+            pass
+
+        def iter_numbers(self):
+            return iter([1, 2, 3])
+
+    broken = FakeBackend('broken', ValueError('unable to load module'))
+    bcall = BackendsCall([FakeBackend('a'), broken, FakeBackend('b')], 'iter_numbers')
+    results = []
+    try:
+        for result in bcall:
+            results.append(result)
+    except CallErrors as errors:
+        assert [(backend, error) for backend, error, backtrace in errors] == [(broken, broken.error)]
+    else:
+        assert False, 'load error of the backend is not raised'
+    assert sorted(results) == [1, 1, 2, 2, 3, 3]
+    assert bcall.finished.is_set()
+
+
+def test_buffer():
+    import itertools
+    import time
+
+    class FakeBackend(object):
+        def __init__(self, name, count=None):
+            self.name = name
+            self.count = count
+            self.produced = 0
+            self.closed = Event()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, t, v, tb):
+            pass
+
+        def iter_numbers(self):
+            try:
+                for i in itertools.count() if self.count is None else range(self.count):
+                    self.produced += 1
+                    yield i
+            finally:
+                self.closed.set()
+
+    executor = create_executor(2)
+    try:
+        # backpressure: the backend is paused while results are not consumed
+        backend = FakeBackend('a', 100)
+        bcall = BackendsCall([backend], 'iter_numbers', executor=executor, buffer_size=5)
+        results = iter(bcall)
+        assert next(results) == 0
+        time.sleep(0.1)
+        # a result is consumed, 5 are buffered and 1 is being stored
+        assert backend.produced <= 7, backend.produced
+        assert list(results) == list(range(1, 100))
+
+        # early exit: the backend is stopped even if it is paused
+        backend = FakeBackend('a')
+        bcall = BackendsCall([backend], 'iter_numbers', executor=executor, buffer_size=5)
+        for result in bcall:
+            if result == 3:
+                break
+        assert backend.closed.wait(5)
+        assert bcall.finished.wait(5)
+
+        # nested calls: a call made while results of another one are
+        # consumed must not wait for workers paused by the first one
+        outer = [FakeBackend('a', 20), FakeBackend('b', 20)]
+        results = []
+
+        def consume():
+            for number in BackendsCall(outer, 'iter_numbers', executor=executor, buffer_size=10):
+                inner = BackendsCall([FakeBackend('c', 3)], 'iter_numbers', executor=executor, buffer_size=10)
+                results.append((number, sum(inner)))
+
+        thread = Thread(target=consume)
+        thread.daemon = True
+        thread.start()
+        thread.join(10)
+        assert not thread.is_alive(), 'nested calls are deadlocked'
+        assert sorted(results) == sorted([(number, 3) for number in range(20)] * 2)
+    finally:
+        executor.shutdown(wait=False)
@@ -20,12 +20,13 @@
 import os
 import imp
 import logging
+from threading import Lock
 
 from weboob.tools.backend import Module
 from weboob.tools.log import getLogger
 
 
-__all__ = ['LoadedModule', 'ModulesLoader', 'RepositoryModulesLoader', 'ModuleLoadError']
+__all__ = ['LoadedModule', 'LazyBackend', 'ModulesLoader', 'RepositoryModulesLoader', 'ModuleLoadError']
 
 
 class ModuleLoadError(Exception):
@@ -99,6 +100,83 @@ class LoadedModule(object):
         return backend_instance
 
 
+class LazyBackend(object):
+    """
+    Backend registered from the information about its module found in the
+    repositories index.
+
+    The module is imported and the real backend is created on first use,
+    so backends which are loaded but not called cost nothing. Attributes
+    and methods of the real backend are available on this object.
+
+    :param weboob: weboob instance
+    :type weboob: :class:`weboob.core.ouiboube.Weboob`
+    :param minfo: information about the module
+    :type minfo: :class:`weboob.core.repositories.ModuleInfo`
+    :param name: name of the backend
+    :param params: configuration of the backend
+    :param storage: storage of the backend
+    """
+
+    def __init__(self, weboob, minfo, name, params, storage):
+        d = self.__dict__
+        d['name'] = name
+        d['NAME'] = minfo.name
+        d['DESCRIPTION'] = minfo.description
+        d['_minfo'] = minfo
+        d['_weboob'] = weboob
+        d['_params'] = params
+        d['_storage'] = storage
+        d['_backend'] = None
+        d['_lock'] = Lock()
+
+    def load(self):
+        """
+        Get the real backend, creating it if needed.
+
+        :raises: :class:`ModuleLoadError` if the module can't be loaded
+        :raises: :class:`weboob.tools.backend.Module.ConfigError` if the backend is misconfigured
+        :rtype: :class:`weboob.tools.backend.Module`
+        """
+        with self._lock:
+            if self._backend is None:
+                module = self._weboob.modules_loader.get_or_load_module(self.NAME)
+                self.__dict__['_backend'] = module.create_instance(self._weboob, self.name,
+                                                                   self._params, self._storage)
+            return self._backend
+
+    def is_loaded(self):
+        return self._backend is not None
+
+    def has_caps(self, *caps):
+        for c in caps:
+            if isinstance(c, (tuple, list)):
+                if self.has_caps(*c):
+                    return True
+            elif (c if isinstance(c, basestring) else c.__name__) in self._minfo.capabilities:
+                return True
+        return False
+
+    def deinit(self):
+        if self._backend is not None:
+            self._backend.deinit()
+
+    def __enter__(self):
+        return self.load().__enter__()
+
+    def __exit__(self, t, v, tb):
+        return self._backend.__exit__(t, v, tb)
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.load(), name, value)
+
+    def __repr__(self):
+        return u"<Backend %r>" % self.name
+
+
 class ModulesLoader(object):
     """
     Load modules.
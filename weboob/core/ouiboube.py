@@ -20,13 +20,14 @@
 
 import os
 
-from weboob.core.bcall import BackendsCall
-from weboob.core.modules import ModulesLoader, RepositoryModulesLoader, ModuleLoadError
+from weboob.core.bcall import BackendsCall, create_executor
+from weboob.core.modules import ModulesLoader, RepositoryModulesLoader, ModuleLoadError, LazyBackend
 from weboob.core.backendscfg import BackendsConfig
 from weboob.core.repositories import Repositories, PrintProgress
 from weboob.core.scheduler import Scheduler
 from weboob.tools.backend import Module
 from weboob.tools.config.iconfig import ConfigError
+from weboob.tools.compat import basestring, unicode
 from weboob.tools.log import getLogger
 
 
@@ -50,11 +51,17 @@ class WebNip(object):
     :type storage: :class:`weboob.tools.storage.IStorage`
     :param scheduler: what scheduler to use; default is :class:`weboob.core.scheduler.Scheduler`
     :type scheduler: :class:`weboob.core.scheduler.IScheduler`
+    :param max_workers: size of the threads pool shared by backends calls;
+                        default is :attr:`MAX_WORKERS`
+    :type max_workers: :class:`int`
     """
     VERSION = '1.1'
+    # Maximum number of backends calls running at the same time
+    MAX_WORKERS = 20
 
-    def __init__(self, modules_path=None, storage=None, scheduler=None):
+    def __init__(self, modules_path=None, storage=None, scheduler=None, max_workers=None):
         self.logger = getLogger('weboob')
+        self.executor = create_executor(max_workers or self.MAX_WORKERS)
         self.backend_instances = {}
         self.callbacks = {'login':   lambda backend_name, value: None,
                           'captcha': lambda backend_name, image: None,
@@ -82,6 +89,7 @@ class WebNip(object):
         properly unload all correctly.
         """
         self.unload_backends()
+        self.executor.shutdown(wait=False)
 
     def build_backend(self, module_name, params=None, storage=None, name=None):
         """
@@ -155,7 +163,11 @@ class WebNip(object):
 
         for name in names:
             backend = self.backend_instances.pop(name)
+            if isinstance(backend, LazyBackend) and not backend.is_loaded():
+                unloaded[backend.name] = backend
+                continue
             with backend:
+                backend.dump_browser_state()
                 backend.deinit()
             unloaded[backend.name] = backend
 
@@ -195,7 +207,8 @@ class WebNip(object):
         """
         Iter on each backends.
 
-        Note: each backend is locked when it is returned.
+        Note: each backend is locked when it is returned (or, for modules
+        with a pool of browsers, a browser is checked out for the caller).
 
         :param caps: optional list of capabilities to select backends
         :type caps: tuple[:class:`weboob.capabilities.base.Capability`]
@@ -203,9 +216,15 @@ class WebNip(object):
         :type module: :class:`basestring`
         :rtype: iter[:class:`weboob.tools.backend.Module`]
         """
-        for _, backend in sorted(self.backend_instances.iteritems()):
+        for _, backend in sorted(self.backend_instances.items()):
             if (caps is None or backend.has_caps(caps)) and \
                (module is None or backend.NAME == module):
+                if isinstance(backend, LazyBackend) and not backend.is_loaded():
+                    try:
+                        backend.load()
+                    except ModuleLoadError as e:
+                        self.logger.error(u'Unable to load module "%s": %s', backend.NAME, e)
+                        continue
                 with backend:
                     yield backend
 
@@ -233,12 +252,18 @@ class WebNip(object):
         :type backends: list[:class:`str`]
         :param caps: iterate on backends which implement this caps
         :type caps: list[:class:`weboob.capabilities.base.Capability`]
+        :param max_concurrency: maximum number of backends called at the same
+                                time for this call; they all share the pool
+                                of :attr:`MAX_WORKERS` threads anyway
+        :type max_concurrency: :class:`int`
+        :param condition: keep only objects matching this condition, for
+                          example a :class:`weboob.tools.application.results.ResultsCondition`
         :rtype: A :class:`weboob.core.bcall.BackendsCall` object (iterable)
         """
         backends = self.backend_instances.values()
         _backends = kwargs.pop('backends', None)
         if _backends is not None:
-            if isinstance(_backends, Module):
+            if isinstance(_backends, (Module, LazyBackend)):
                 backends = [_backends]
             elif isinstance(_backends, basestring):
                 if len(_backends) > 0:
@@ -267,8 +292,22 @@ class WebNip(object):
         # here on this object, because caller might want to use other methods, like
         # wait() on callback_thread().
         # Thanks a lot.
+        kwargs['executor'] = self.executor
         return BackendsCall(backends, function, *args, **kwargs)
 
+    def ado(self, function, *args, **kwargs):
+        """
+        Asynchronous version of :func:`do`, to be used from an asyncio event
+        loop.
+
+        It takes the same arguments, and returns an asynchronous iterator
+        which yields results as soon as backends return them. At the end,
+        errors are raised in a :class:`weboob.core.bcall.CallErrors`.
+
+        :rtype: :class:`weboob.core.bcall.AsyncBackendsCallIterator`
+        """
+        return self.do(function, *args, **kwargs).__aiter__()
+
     def schedule(self, interval, function, *args):
         """
         Schedule an event.
@@ -282,7 +321,7 @@ class WebNip(object):
         """
         return self.scheduler.schedule(interval, function, *args)
 
-    def repeat(self, interval, function, *args):
+    def repeat(self, interval, function, *args, **kwargs):
         """
         Repeat a call to a function
 
@@ -291,9 +330,10 @@ class WebNip(object):
         :param function: function to call
         :type function: callable
         :param args: arguments to give to function
+        :param kwargs: options of the scheduler, see :func:`weboob.core.scheduler.Scheduler.repeat`
         :returns: an event identificator
         """
-        return self.scheduler.repeat(interval, function, *args)
+        return self.scheduler.repeat(interval, function, *args, **kwargs)
 
     def cancel(self, ev):
         """
@@ -328,11 +368,14 @@ class Weboob(WebNip):
     :type backends_filename: str
     :param storage: provide a storage where backends can save data
     :type storage: :class:`weboob.tools.storage.IStorage`
+    :param max_workers: size of the threads pool shared by backends calls
+    :type max_workers: :class:`int`
     """
     BACKENDS_FILENAME = 'backends'
 
-    def __init__(self, workdir=None, backends_filename=None, scheduler=None, storage=None):
-        super(Weboob, self).__init__(modules_path=False, scheduler=scheduler, storage=storage)
+    def __init__(self, workdir=None, backends_filename=None, scheduler=None, storage=None, max_workers=None):
+        super(Weboob, self).__init__(modules_path=False, scheduler=scheduler, storage=storage,
+                                     max_workers=max_workers)
 
         # Create WORKDIR
         if workdir is not None:
@@ -344,6 +387,7 @@ class Weboob(WebNip):
             datadir = os.path.join(os.environ.get('XDG_DATA_HOME', os.path.join(os.path.expanduser('~'), '.local', 'share')), 'weboob')
 
         self.workdir = os.path.realpath(workdir)
+        self.datadir = os.path.realpath(datadir)
         self._create_dir(workdir)
 
         # Modules management
@@ -397,10 +441,15 @@ class Weboob(WebNip):
 
         return super(Weboob, self).build_backend(module_name, params, storage, name)
 
-    def load_backends(self, caps=None, names=None, modules=None, exclude=None, storage=None, errors=None):
+    def load_backends(self, caps=None, names=None, modules=None, exclude=None, storage=None, errors=None, lazy=False):
         """
         Load backends listed in config file.
 
+        With *lazy*, backends are selected with the information of the
+        repositories index, and modules are only imported when a backend is
+        used (see :class:`weboob.core.modules.LazyBackend`). Errors of
+        modules and of backends configuration are then raised at that time.
+
         :param caps: load backends which implement all of specified caps
         :type caps: tuple[:class:`weboob.capabilities.base.Capability`]
         :param names: load backends with instance name in list
@@ -413,6 +462,8 @@ class Weboob(WebNip):
         :type storage: :class:`weboob.tools.storage.IStorage`
         :param errors: if specified, store every errors in this list
         :type errors: list[:class:`LoadError`]
+        :param lazy: do not import modules before backends are used
+        :type lazy: :class:`bool`
         :returns: loaded backends
         :rtype: dict[:class:`str`, :class:`weboob.tools.backend.Module`]
         """
@@ -443,6 +494,13 @@ class Weboob(WebNip):
             if not minfo.is_installed():
                 self.repositories.install(minfo)
 
+            if lazy:
+                if instance_name in self.backend_instances:
+                    self.unload_backends(instance_name)
+                self.backend_instances[instance_name] = loaded[instance_name] = \
+                    LazyBackend(self, minfo, instance_name, params, storage)
+                continue
+
             module = None
             try:
                 module = self.modules_loader.get_or_load_module(module_name)
@@ -462,3 +520,127 @@ class Weboob(WebNip):
             else:
                 self.backend_instances[instance_name] = loaded[instance_name] = backend_instance
         return loaded
+
+
+def _test_backends(count, release=None):
+    from threading import Event, Lock
+    from time import sleep
+
+    state = {'running': 0, 'max': 0, 'done': 0, 'closed': 0}
+    lock = Lock()
+    started = Event()
+
+    class FakeBackend(object):
+        def __init__(self, name):
+            self.name = name
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, t, v, tb):
+            pass
+
+        def iter_numbers(self):
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            started.set()
+            try:
+                if release is not None:
+                    release.wait(10)
+                else:
+                    sleep(0.05)
+                yield 1
+                yield 2
+                with lock:
+                    state['done'] += 1
+            finally:
+                with lock:
+                    state['running'] -= 1
+                    state['closed'] += 1
+
+    return [FakeBackend('backend%d' % i) for i in range(count)], state, started
+
+
+def test():
+    from threading import Event, Thread
+
+    weboob = WebNip(modules_path='', max_workers=3)
+    try:
+        # max_concurrency limits backends called at once for a call
+        backends, state, started = _test_backends(6)
+        assert sorted(weboob.do('iter_numbers', backends=backends, max_concurrency=2)) == [1] * 6 + [2] * 6
+        assert state['max'] == 2
+
+        # calls share the pool of workers
+        backends, state, started = _test_backends(8)
+        results = []
+        threads = [Thread(target=lambda bcall: results.extend(bcall),
+                          args=(weboob.do('iter_numbers', backends=backends[i::2]),))
+                   for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 16
+        assert state['max'] <= 3
+        assert state['done'] == 8
+    finally:
+        weboob.deinit()
+
+    # deinit() doesn't wait for running calls, which end anyway
+    weboob = WebNip(modules_path='', max_workers=2)
+    release = Event()
+    backends, state, started = _test_backends(2, release)
+    bcall = weboob.do('iter_numbers', backends=backends)
+    assert started.wait(5)
+    weboob.deinit()
+    assert state['done'] == 0
+    release.set()
+    assert sorted(bcall) == [1, 1, 2, 2]
+    assert state['done'] == 2
+
+
+def test_ado():
+    try:
+        import asyncio
+    except ImportError:
+        return
+    from threading import Event
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    weboob = WebNip(modules_path='', max_workers=2)
+    try:
+        backends, state, started = _test_backends(2)
+        iterator = weboob.ado('iter_numbers', backends=backends)
+        results = []
+        while True:
+            try:
+                results.append(loop.run_until_complete(iterator.__anext__()))
+            except StopAsyncIteration:
+                break
+        assert sorted(results) == [1, 1, 2, 2]
+
+        # cancelling the wait of a result cancels the call
+        release = Event()
+        backends, state, started = _test_backends(2, release)
+        iterator = weboob.ado('iter_numbers', backends=backends)
+        future = iterator.__anext__()
+        loop.call_later(0.05, future.cancel)
+        try:
+            loop.run_until_complete(future)
+        except asyncio.CancelledError:
+            pass
+        else:
+            assert False, 'the wait is not cancelled'
+        assert iterator.bcall.all_cancelled
+        release.set()
+        assert iterator.bcall.finished.wait(5)
+        # backends are stopped at their first result
+        assert state['closed'] == 2
+        assert state['done'] == 0
+    finally:
+        weboob.deinit()
+        asyncio.set_event_loop(None)
+        loop.close()
@@ -19,7 +19,9 @@
 
 
 from __future__ import print_function
+import ast
 import imp
+import json
 import posixpath
 import shutil
 import re
@@ -27,6 +29,7 @@ import sys
 import os
 import subprocess
 from datetime import datetime
+from hashlib import md5
 from contextlib import closing
 from compileall import compile_dir
 from io import BytesIO
@@ -109,6 +112,7 @@ class Repository(object):
     Represents a repository.
     """
     INDEX = 'modules.list'
+    INDEX_CACHE = 'modules.cache'
     KEYDIR = '.keys'
     KEYRING = 'trusted.gpg'
 
@@ -155,6 +159,7 @@ class Repository(object):
         :param repo_path: path to save the downloaded index file.
         :type repo_path: str
         """
+        built = False
         if self.local:
             # Repository is local, open the file.
             filename = os.path.join(self.localurl2path(), self.INDEX)
@@ -164,6 +169,7 @@ class Repository(object):
                 # This local repository doesn't contain a built modules.list index.
                 self.name = Repositories.url2filename(self.url)
                 self.build_index(self.localurl2path(), filename)
+                built = True
                 fp = open(filename, 'r')
         else:
             # This is a remote repository, download file
@@ -174,7 +180,7 @@ class Repository(object):
 
         self.parse_index(fp)
 
-        if self.local:
+        if self.local and not built:
             # Always rebuild index of a local repository.
             self.build_index(self.localurl2path(), filename)
 
@@ -256,6 +262,10 @@ class Repository(object):
         """
         Rebuild index of modules of repository.
 
+        Information about modules is kept in a cache next to the index,
+        and a module is inspected again only if one of its files has
+        changed.
+
         :param path: path of the repository
         :type path: str
         :param filename: file to save index
@@ -271,47 +281,98 @@ class Repository(object):
             self.signed = False
             self.key_update = 0
 
+        cache = ModulesInfoCache(os.path.join(os.path.dirname(filename), self.INDEX_CACHE))
         for name in sorted(os.listdir(path)):
             module_path = os.path.join(path, name)
             if not os.path.isdir(module_path) or '.' in name or name == self.KEYDIR:
                 continue
 
-            try:
-                fp, pathname, description = imp.find_module(name, [path])
-                try:
-                    module = LoadedModule(imp.load_module(name, fp, pathname, description))
-                finally:
-                    if fp:
-                        fp.close()
-            except Exception as e:
-                print('Unable to build module %s: [%s] %s' % (name, type(e).__name__, e), file=sys.stderr)
-                self.logger.debug(get_backtrace(e))
-            else:
-                m = ModuleInfo(module.name)
-                m.version = self.get_tree_mtime(module_path)
-                m.capabilities = list(set([c.__name__ for c in module.iter_caps()]))
-                m.description = module.description
-                m.maintainer = module.maintainer
-                m.license = module.license
-                m.icon = module.icon or ''
-                self.modules[module.name] = m
+            version, fingerprint, dirs = self.get_tree_info(module_path, dirs=cache.get_dirs(name))
+            m = cache.get(name, fingerprint)
+            if m is None:
+                m = self.inspect_module(path, name)
+                if m is None:
+                    continue
+            cache.set(name, fingerprint, m, dirs)
+            m.version = version
+            self.modules[m.name] = m
+
+        cache.save()
 
         self.update = int(datetime.now().strftime('%Y%m%d%H%M'))
         self.save(filename)
 
+    def inspect_module(self, path, name):
+        """
+        Get information about a module of a repository.
+
+        It is read from the sources of the module when possible, and the
+        module is imported otherwise.
+
+        :rtype: :class:`ModuleInfo` or None
+        """
+        try:
+            m = read_module_info(os.path.join(path, name))
+            if m is not None:
+                return m
+        except Exception as e:
+            self.logger.debug('Unable to read module %s: %s' % (name, get_backtrace(e)))
+
+        try:
+            return import_module_info(path, name)
+        except Exception as e:
+            print('Unable to build module %s: [%s] %s' % (name, type(e).__name__, e), file=sys.stderr)
+            self.logger.debug(get_backtrace(e))
+            return None
+
     @staticmethod
     def get_tree_mtime(path, include_root=False):
+        return Repository.get_tree_info(path, include_root)[0]
+
+    @staticmethod
+    def get_tree_info(path, include_root=False, dirs=None):
+        """
+        Get the version of a tree, which is the most recent modification
+        time of its files, and a fingerprint of the name, size and
+        modification time of its files.
+
+        :param dirs: listings of the directories of the tree returned by a
+                     previous call; a directory is only listed again if its
+                     modification time has changed
+        :type dirs: dict
+        :returns: version, fingerprint and listings of the directories
+        :rtype: tuple[int, str, dict]
+        """
         mtime = 0
         if include_root:
             mtime = int(datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y%m%d%H%M'))
-        for root, dirs, files in os.walk(path):
+        fingerprint = md5()
+        listings = {}
+
+        reldirs = ['']
+        while reldirs:
+            reldir = reldirs.pop(0)
+            dirpath = os.path.join(path, reldir)
+            dir_mtime = os.stat(dirpath).st_mtime
+            if dirs and reldir in dirs and dirs[reldir][0] == dir_mtime:
+                subdirs, files = dirs[reldir][1], dirs[reldir][2]
+            else:
+                subdirs, files = [], []
+                for name in sorted(os.listdir(dirpath)):
+                    if os.path.isdir(os.path.join(dirpath, name)):
+                        subdirs.append(name)
+                    elif not name.endswith('.pyc'):
+                        files.append(name)
+            listings[reldir] = (dir_mtime, subdirs, files)
+            reldirs.extend(os.path.join(reldir, subdir) for subdir in subdirs)
+
             for f in files:
-                if f.endswith('.pyc'):
-                    continue
-                m = int(datetime.fromtimestamp(os.path.getmtime(os.path.join(root, f))).strftime('%Y%m%d%H%M'))
+                st = os.stat(os.path.join(dirpath, f))
+                fingerprint.update(('%s %d %r\n' % (os.path.join(reldir, f), st.st_size, st.st_mtime)).encode('utf-8'))
+                m = int(datetime.fromtimestamp(st.st_mtime).strftime('%Y%m%d%H%M'))
                 mtime = max(mtime, m)
 
-        return mtime
+        return mtime, fingerprint.hexdigest(), listings
 
     def save(self, filename, private=False):
         """
@@ -340,6 +401,198 @@ class Repository(object):
             config.write(f)
 
 
+class ModulesInfoCache(object):
+    """
+    Information about modules of a local repository, with a fingerprint of
+    the files of each module and listings of its directories, used to
+    rebuild the index incrementally.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.modules = {}
+        self.used = set()
+        self.changed = False
+
+        config = RawConfigParser()
+        try:
+            config.read(path)
+        except Exception:
+            # broken cache, rebuild it
+            self.changed = True
+            return
+
+        for section in config.sections():
+            items = dict(config.items(section))
+            try:
+                m = ModuleInfo(items['name'])
+                m.load(items)
+                dirs = json.loads(items.get('dirs', '{}'))
+            except (KeyError, ValueError):
+                self.changed = True
+                continue
+            self.modules[section] = (items['fingerprint'], m, dirs)
+
+    def get(self, dirname, fingerprint):
+        """
+        Get information about a module, if its files have not changed.
+
+        :rtype: :class:`ModuleInfo` or None
+        """
+        self.used.add(dirname)
+        try:
+            cached_fingerprint, m, dirs = self.modules[dirname]
+        except KeyError:
+            return None
+        if cached_fingerprint != fingerprint:
+            return None
+        return m
+
+    def get_dirs(self, dirname):
+        """
+        Get listings of the directories of a module, to give to
+        :func:`Repository.get_tree_info`.
+
+        :rtype: :class:`dict` or None
+        """
+        try:
+            return self.modules[dirname][2]
+        except KeyError:
+            return None
+
+    def set(self, dirname, fingerprint, m, dirs):
+        self.used.add(dirname)
+        # listings are compared once serialized, as tuples are read as lists
+        dirs = json.loads(json.dumps(dirs))
+        if self.modules.get(dirname) != (fingerprint, m, dirs):
+            self.modules[dirname] = (fingerprint, m, dirs)
+            self.changed = True
+
+    def save(self):
+        for dirname in set(self.modules) - self.used:
+            del self.modules[dirname]
+            self.changed = True
+
+        if not self.changed:
+            return
+
+        config = RawConfigParser()
+        for dirname, (fingerprint, m, dirs) in sorted(self.modules.items()):
+            config.add_section(dirname)
+            config.set(dirname, 'name', m.name)
+            config.set(dirname, 'fingerprint', fingerprint)
+            config.set(dirname, 'dirs', json.dumps(dirs, sort_keys=True))
+            for key, value in m.dump():
+                config.set(dirname, key, to_unicode(value).encode('utf-8'))
+
+        with open(self.path, 'wb') as f:
+            config.write(f)
+        self.changed = False
+
+
+def import_module_info(path, name):
+    """
+    Get information about a module by importing it.
+
+    :param path: path of the directory containing the module
+    :type path: str
+    :param name: name of the module directory
+    :type name: str
+    :rtype: :class:`ModuleInfo`
+    """
+    fp, pathname, description = imp.find_module(name, [path])
+    try:
+        module = LoadedModule(imp.load_module(name, fp, pathname, description))
+    finally:
+        if fp:
+            fp.close()
+
+    m = ModuleInfo(module.name)
+    m.capabilities = list(set([c.__name__ for c in module.iter_caps()]))
+    m.description = module.description
+    m.maintainer = module.maintainer
+    m.license = module.license
+    m.icon = module.icon or ''
+    return m
+
+
+def read_module_info(path):
+    """
+    Read information about a module from its sources, without importing it.
+
+    The module class has to be defined at the top level of the package,
+    with literal values for its attributes, and its base classes have to
+    be imported from weboob.
+
+    :param path: path of the module directory
+    :type path: str
+    :rtype: :class:`ModuleInfo` or None if sources can't be read statically
+    """
+    from weboob.capabilities.base import Capability
+    from weboob.tools.backend import Module
+
+    filenames = sorted([f for f in os.listdir(path) if f.endswith('.py')],
+                       key=lambda f: (f != 'module.py', f))
+    for filename in filenames:
+        with open(os.path.join(path, filename), 'rb') as f:
+            tree = ast.parse(f.read(), filename)
+
+        imports = {}
+        for node in tree.body:
+            if isinstance(node, ast.ImportFrom):
+                for alias in node.names:
+                    imports[alias.asname or alias.name] = (node.level, node.module, alias.name)
+
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+
+            attrs = {}
+            for stmt in node.body:
+                if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and \
+                   isinstance(stmt.targets[0], ast.Name) and stmt.targets[0].id.isupper():
+                    attrs[stmt.targets[0].id] = stmt.value
+            if 'NAME' not in attrs:
+                continue
+
+            bases = []
+            for base in node.bases:
+                if not isinstance(base, ast.Name) or base.id not in imports:
+                    return None
+                level, modname, attrname = imports[base.id]
+                if level or not modname or not modname.startswith('weboob.'):
+                    return None
+                bases.append(getattr(__import__(modname, fromlist=[attrname]), attrname))
+
+            if not any(issubclass(base, Module) for base in bases):
+                continue
+
+            def value(name):
+                if name in attrs:
+                    return ast.literal_eval(attrs[name])
+                for base in bases:
+                    if hasattr(base, name):
+                        return getattr(base, name)
+
+            caps = set()
+            for base in bases:
+                if issubclass(base, Module):
+                    caps.update(base.iter_caps())
+                elif issubclass(base, Capability):
+                    caps.add(base)
+                    caps.update(Module.iter_caps.__func__(base))
+
+            m = ModuleInfo(value('NAME'))
+            m.capabilities = list(set([c.__name__ for c in caps]))
+            m.description = to_unicode(value('DESCRIPTION'))
+            m.maintainer = u'%s <%s>' % (to_unicode(value('MAINTAINER')), to_unicode(value('EMAIL')))
+            m.license = to_unicode(value('LICENSE'))
+            m.icon = value('ICON') or ''
+            return m
+
+    return None
+
+
 class Versions(object):
     VERSIONS_LIST = 'versions.list'
 
@@ -803,3 +1056,72 @@ class Keyring(object):
                 h = hashlib.sha1(f.read()).hexdigest()
             return 'Keyring version %s, checksum %s' % (self.version, h)
         return 'NO KEYRING'
+
+
+def test():
+    import tempfile
+    from time import time
+
+    def info(m):
+        return (m.name, sorted(m.capabilities), m.description, m.maintainer, m.license, m.icon)
+
+    dirname = tempfile.mkdtemp(prefix='weboob_test_repositories_')
+    try:
+        module_path = os.path.join(dirname, 'weboob_test_module')
+        os.mkdir(module_path)
+        with open(os.path.join(module_path, '__init__.py'), 'w') as f:
+            f.write('from .module import TestModule\n\n__all__ = [\'TestModule\']\n')
+        with open(os.path.join(module_path, 'module.py'), 'w') as f:
+            f.write('from weboob.capabilities.bank import CapBank\n'
+                    'from weboob.capabilities.contact import CapContact\n'
+                    'from weboob.tools.backend import Module\n\n\n'
+                    'class TestModule(Module, CapBank, CapContact):\n'
+                    '    NAME = \'weboob_test_module\'\n'
+                    '    MAINTAINER = u\'John Doe\'\n'
+                    '    EMAIL = \'john@example.org\'\n'
+                    '    VERSION = \'1.3\'\n'
+                    '    DESCRIPTION = u\'Test module \\xe9\'\n'
+                    '    LICENSE = \'AGPLv3+\'\n')
+
+        # metadata read from sources are the same than metadata of the module
+        assert info(read_module_info(module_path)) == info(import_module_info(dirname, 'weboob_test_module'))
+        assert 'CapBank' in read_module_info(module_path).capabilities
+        assert 'CapContact' in read_module_info(module_path).capabilities
+
+        modules_path = os.path.join(os.path.dirname(__file__), '..', '..', 'modules')
+        m = read_module_info(os.path.join(modules_path, 'seloger')) if os.path.isdir(modules_path) else None
+        if m is not None:
+            try:
+                imported = import_module_info(modules_path, 'seloger')
+            except ImportError:
+                # dependencies of the module are not installed
+                pass
+            else:
+                assert info(m) == info(imported)
+
+        version, fingerprint, dirs = Repository.get_tree_info(module_path)
+        assert dirs[''][1:] == ([], ['__init__.py', 'module.py'])
+        # listings of directories which didn't change are used
+        assert Repository.get_tree_info(module_path, dirs=dirs) == (version, fingerprint, dirs)
+        cached = {'': (dirs[''][0], [], ['module.py'])}
+        assert Repository.get_tree_info(module_path, dirs=cached)[1] != fingerprint
+
+        # a file changed in place changes the fingerprint
+        filename = os.path.join(module_path, 'module.py')
+        os.utime(filename, (time(), os.path.getmtime(filename) + 60))
+        version, new_fingerprint, new_dirs = Repository.get_tree_info(module_path, dirs=dirs)
+        assert new_fingerprint != fingerprint
+        assert new_dirs == dirs
+
+        # a new file changes the directory, which is listed again
+        os.utime(module_path, (time(), os.path.getmtime(module_path) - 60))
+        dirs = Repository.get_tree_info(module_path)[2]
+        with open(os.path.join(module_path, 'browser.py'), 'w') as f:
+            f.write('\n')
+        mtime, fingerprint, dirs = Repository.get_tree_info(module_path, dirs=dirs)
+        assert dirs[''][2] == ['__init__.py', 'browser.py', 'module.py']
+        assert fingerprint == Repository.get_tree_info(module_path)[1]
+    finally:
+        sys.modules.pop('weboob_test_module', None)
+        sys.modules.pop('weboob_test_module.module', None)
+        shutil.rmtree(dirname)
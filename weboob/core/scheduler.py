@@ -20,17 +20,19 @@
 
 from __future__ import print_function
 
-from threading import Event, RLock
-try:
-    from threading import _Timer as Timer
-except ImportError:
-    from threading import Timer
+import heapq
+import random
+from datetime import datetime, timedelta
+from threading import Condition, Event, RLock, Thread
+from time import time
 
+from weboob.core.bcall import create_executor
+from weboob.tools.compat import basestring
 from weboob.tools.log import getLogger
 from weboob.tools.misc import get_backtrace
 
 
-__all__ = ['Scheduler']
+__all__ = ['Scheduler', 'CronInterval']
 
 
 class IScheduler(object):
@@ -50,81 +52,299 @@ class IScheduler(object):
         raise NotImplementedError()
 
 
-class RepeatedTimer(Timer):
-    def run(self):
-        while not self.finished.isSet():
-            try:
-                self.function(*self.args, **self.kwargs)
-            except Exception:
-                # do not stop timer because of an exception
-                print(get_backtrace())
-            self.finished.wait(self.interval)
-        self.finished.set()
+class CronInterval(object):
+    """
+    Cron-like interval, to give to :func:`Scheduler.repeat` instead of a
+    number of seconds.
+
+    >>> CronInterval('*/15 8-18 * * 1-5').next_time(datetime(2017, 1, 6, 18, 50))
+    datetime.datetime(2017, 1, 9, 8, 0)
+
+    :param spec: minute, hour, day of month, month and day of week fields
+                 (0 is sunday), which accept ``*``, ``*/step``, ranges and
+                 lists
+    :type spec: :class:`str`
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, spec):
+        fields = spec.split()
+        if len(fields) != 5:
+            raise ValueError('Cron interval needs 5 fields: %r' % spec)
+        self.spec = spec
+        self.minutes, self.hours, self.days, self.months, self.weekdays = \
+            [self.parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELDS)]
+
+    @staticmethod
+    def parse_field(field, low, high):
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step = part.split('/', 1)
+                step = int(step)
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = [int(v) for v in part.split('-', 1)]
+            else:
+                start = end = int(part)
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError('Invalid cron field: %r' % field)
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def next_time(self, after):
+        """
+        Get the first matching time after a date.
+
+        :type after: :class:`datetime.datetime`
+        :rtype: :class:`datetime.datetime`
+        """
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # five years at most, for specifications like 'february the 31th'
+        limit = t + timedelta(days=5 * 366)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif t.day not in self.days or (t.weekday() + 1) % 7 not in self.weekdays:
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError('Cron interval %r never matches' % self.spec)
+
+    def delay(self, now=None):
+        """
+        Get the number of seconds until the next matching time.
+        """
+        if now is None:
+            now = datetime.now()
+        return (self.next_time(now) - now).total_seconds()
+
+    def __repr__(self):
+        return '<CronInterval %r>' % self.spec
+
+
+class Job(object):
+    """
+    Function planned by the :class:`Scheduler`.
+    """
+
+    # Default limit of the delay after failures, in seconds.
+    MAX_BACKOFF = 24 * 3600
+
+    def __init__(self, id, interval, function, args, repeat=False, jitter=0, max_backoff=None, coalesce=True):
+        self.id = id
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.repeat = repeat
+        self.jitter = jitter
+        self.max_backoff = max_backoff if max_backoff is not None else self.MAX_BACKOFF
+        self.coalesce = coalesce
+        self.failures = 0
+        self.running = False
+        self.cancelled = False
+        self.next_run = None
+
+    @property
+    def name(self):
+        return getattr(self.function, '__name__', repr(self.function))
+
+    def delay(self):
+        """
+        Get the delay before the next run, with backoff after failures.
+
+        >>> job = Job(1, 3600, None, ())
+        >>> job.failures = 3
+        >>> job.delay()
+        28800
+        >>> job.failures = 15
+        >>> job.delay()
+        86400
+        """
+        if isinstance(self.interval, CronInterval):
+            delay = self.interval.delay()
+        else:
+            delay = self.interval
+        if self.failures:
+            # the exponent is bounded so the delay stays a reasonable number
+            backoff = min(delay * 2 ** min(self.failures, 32), self.max_backoff)
+            delay = max(delay, backoff)
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        return delay
+
+    def plan(self, now):
+        """
+        Compute the time of the next run.
+        """
+        if self.next_run is None or self.coalesce or self.failures or isinstance(self.interval, CronInterval):
+            self.next_run = now + self.delay()
+        else:
+            # catch up missed runs one after the other
+            self.next_run += self.interval
+
+    def __lt__(self, other):
+        return (self.next_run, self.id) < (other.next_run, other.id)
 
 
 class Scheduler(IScheduler):
-    def __init__(self):
+    """
+    Scheduler running functions in a pool of threads.
+
+    Planned functions are kept in a heap, watched by one dispatcher thread
+    which gives due functions to the pool. A repeated function is never run
+    twice at the same time, and runs missed while it was running or while
+    the process was suspended are coalesced, unless asked otherwise.
+
+    :param max_workers: maximum number of functions running at the same time
+    :type max_workers: :class:`int`
+    """
+
+    MAX_WORKERS = 10
+
+    def __init__(self, max_workers=None):
         self.logger = getLogger('scheduler')
         self.mutex = RLock()
+        self.condition = Condition(self.mutex)
         self.stop_event = Event()
         self.count = 0
         self.queue = {}
+        self.heap = []
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self.executor = None
+        self.dispatcher = None
 
     def schedule(self, interval, function, *args):
-        return self._schedule(Timer, interval, self._schedule_callback, function, *args)
+        """
+        Call a function once, after *interval* seconds.
 
-    def repeat(self, interval, function, *args):
-        return self._schedule(RepeatedTimer, interval, self._repeat_callback, function, *args)
+        :returns: an event identificator
+        """
+        return self._schedule(interval, function, args, repeat=False)
 
-    def _schedule(self, klass, interval, meta_func, function, *args):
+    def repeat(self, interval, function, *args, **kwargs):
+        """
+        Call a function now, and then every *interval*.
+
+        :param interval: number of seconds between two runs, or cron-like interval
+        :type interval: :class:`int` or :class:`CronInterval`
+        :param jitter: maximum number of seconds randomly added to each delay
+        :type jitter: :class:`float`
+        :param max_backoff: after failures, the delay is doubled each time
+                            up to this number of seconds (default is one day)
+        :type max_backoff: :class:`float`
+        :param coalesce: if False, runs missed because the function was
+                         still running are done one after the other
+        :type coalesce: :class:`bool`
+        :returns: an event identificator
+        """
+        if isinstance(interval, basestring):
+            interval = CronInterval(interval)
+        return self._schedule(interval, function, args, repeat=True, **kwargs)
+
+    def _schedule(self, interval, function, args, **kwargs):
         if self.stop_event.isSet():
             return
 
         with self.mutex:
             self.count += 1
-            self.logger.debug('function "%s" will be called in %s seconds' % (function.__name__, interval))
-            timer = klass(interval, meta_func, (self.count, interval, function, args))
-            self.queue[self.count] = timer
-            timer.start()
-            return self.count
+            job = Job(self.count, interval, function, args, **kwargs)
+            now = time()
+            if job.repeat and not isinstance(interval, CronInterval):
+                # as the previous implementation, the first call is immediate
+                job.next_run = now
+            else:
+                job.plan(now)
+            self.logger.debug('function "%s" will be called in %s seconds' % (job.name, job.next_run - now))
+            self.queue[job.id] = job
+            self._push(job)
+            return job.id
 
-    def _schedule_callback(self, count, interval, function, args):
+    def _push(self, job):
+        heapq.heappush(self.heap, job)
+        if self.dispatcher is None:
+            self.executor = create_executor(self.max_workers)
+            self.dispatcher = Thread(target=self._dispatch, name='scheduler')
+            self.dispatcher.daemon = True
+            self.dispatcher.start()
+        elif self.heap[0] is job:
+            self.condition.notify()
+
+    def _dispatch(self):
         with self.mutex:
-            self.queue.pop(count)
-        return function(*args)
+            while not self.stop_event.isSet():
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+
+                job = self.heap[0]
+                if job.cancelled:
+                    heapq.heappop(self.heap)
+                    continue
+
+                delay = job.next_run - time()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+
+                heapq.heappop(self.heap)
+                if job.running:
+                    # the previous run is not finished; it will plan the
+                    # next one when it is done
+                    continue
+                job.running = True
+                self.executor.submit(self._run_job, job)
+
+    def _run_job(self, job):
+        try:
+            job.function(*job.args)
+        except Exception:
+            # do not stop repeating because of an exception
+            job.failures += 1
+            print(get_backtrace())
+        else:
+            job.failures = 0
 
-    def _repeat_callback(self, count, interval, function, args):
-        function(*args)
         with self.mutex:
-            try:
-                e = self.queue[count]
-            except KeyError:
+            job.running = False
+            if not job.repeat:
+                self.queue.pop(job.id, None)
                 return
-            else:
-                self.logger.debug('function "%s" will be called in %s seconds' % (function.__name__, e.interval))
+            if job.cancelled or self.stop_event.isSet():
+                return
+            now = time()
+            job.plan(now)
+            self.logger.debug('function "%s" will be called in %s seconds' % (job.name, job.next_run - now))
+            self._push(job)
 
     def cancel(self, ev):
         with self.mutex:
             try:
-                e = self.queue.pop(ev)
+                job = self.queue.pop(ev)
             except KeyError:
                 return False
-            e.cancel()
-            self.logger.debug('scheduled function "%s" is canceled' % e.function.__name__)
+            # the job is dropped when it reaches the top of the heap
+            job.cancelled = True
+            self.logger.debug('scheduled function "%s" is canceled' % job.name)
             return True
 
     def _wait_to_stop(self):
         self.want_stop()
-        with self.mutex:
-            for e in self.queue.itervalues():
-                e.cancel()
-                e.join()
-            self.queue = {}
+        if self.dispatcher is not None:
+            self.dispatcher.join()
+            self.executor.shutdown(wait=True)
 
     def run(self):
         try:
-            while True:
-                self.stop_event.wait(0.1)
+            while not self.stop_event.isSet():
+                self.stop_event.wait(1)
         except KeyboardInterrupt:
             self._wait_to_stop()
             raise
@@ -135,8 +355,10 @@ class Scheduler(IScheduler):
     def want_stop(self):
         self.stop_event.set()
         with self.mutex:
-            for t in self.queue.itervalues():
-                t.cancel()
-                # Contrary to _wait_to_stop(), don't call t.join
-                # because want_stop() have to be non-blocking.
+            for job in self.queue.itervalues():
+                job.cancelled = True
             self.queue = {}
+            self.heap = []
+            # Contrary to _wait_to_stop(), don't wait for running
+            # functions because want_stop() have to be non-blocking.
+            self.condition.notify()
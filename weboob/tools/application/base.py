@@ -24,6 +24,7 @@ import logging
 import optparse
 from optparse import OptionGroup, OptionParser
 from datetime import datetime
+from itertools import islice
 import locale
 import os
 import sys
@@ -33,6 +34,7 @@ from weboob.capabilities.base import ConversionWarning, BaseObject
 from weboob.core import Weboob, CallErrors
 from weboob.core.backendscfg import BackendsConfig
 from weboob.tools.config.iconfig import ConfigError
+from weboob.tools.importprofile import profile_imports, profile_imports_if_requested
 from weboob.exceptions import FormFieldConversionWarning
 from weboob.tools.log import createColoredFormatter, getLogger, DEBUG_FILTERS, settings as log_settings
 from weboob.tools.misc import to_unicode
@@ -102,6 +104,9 @@ class Application(object):
     COPYRIGHT = None
     # Verbosity of DEBUG
     DEBUG_FILTER = 2
+    # Number of results given at once to Module.fillobjs() when fields are
+    # selected
+    FILL_BATCH_SIZE = 10
 
     stdin = sys.stdin
     stdout = sys.stdout
@@ -149,6 +154,7 @@ class Application(object):
             self.CONFDIR = self.weboob.workdir
         self.config = None
         self.options = None
+        self.command_args = []
         self.condition = None
         self.storage = None
         if option_parser is None:
@@ -170,6 +176,8 @@ class Application(object):
         logging_options.add_option('-v', '--verbose', action='store_true', help='display info messages')
         logging_options.add_option('--logging-file', action='store', type='string', dest='logging_file', help='file to save logs')
         logging_options.add_option('-a', '--save-responses', action='store_true', help='save every response')
+        logging_options.add_option('--import-profile', action='store_true', help='report time spent to import each module')
+        logging_options.add_option('--no-http-cache', action='store_true', help='do not use the HTTP cache of modules')
         self._parser.add_option_group(logging_options)
         self._parser.add_option('--shell-completion', action='store_true', help=optparse.SUPPRESS_HELP)
         self._is_default_count = True
@@ -186,6 +194,8 @@ class Application(object):
     def deinit(self):
         self.weboob.want_stop()
         self.weboob.deinit()
+        if log_settings['http_cache_stats'] is not None:
+            self.logger.info(u'HTTP cache: %s' % log_settings['http_cache_stats'])
 
     def create_storage(self, path=None, klass=None, localonly=False):
         """
@@ -193,21 +203,29 @@ class Application(object):
 
         :param path: An optional specific path
         :type path: :class:`str`
-        :param klass: What class to instance
+        :param klass: What class to instance; by default, it is
+                      :class:`weboob.tools.storage.SQLiteStorage` for new
+                      files and databases, and
+                      :class:`weboob.tools.storage.StandardStorage` for
+                      YAML files which have not been converted with
+                      ``weboob-config migrate_storage``.
         :type klass: :class:`weboob.tools.storage.IStorage`
         :param localonly: If True, do not set it on the :class:`Weboob` object.
         :type localonly: :class:`bool`
         :rtype: :class:`weboob.tools.storage.IStorage`
         """
-        if klass is None:
-            from weboob.tools.storage import StandardStorage
-            klass = StandardStorage
-
         if path is None:
             path = os.path.join(self.CONFDIR, self.APPNAME + '.storage')
         elif os.path.sep not in path:
             path = os.path.join(self.CONFDIR, path)
 
+        if klass is None:
+            from weboob.tools.storage import StandardStorage, SQLiteStorage, is_sqlite, sqlite3
+            if sqlite3 is not None and (not os.path.exists(path) or is_sqlite(path)):
+                klass = SQLiteStorage
+            else:
+                klass = StandardStorage
+
         storage = klass(path)
         self.storage = ApplicationStorage(self.APPNAME, storage)
         self.storage.load(self.STORAGE)
@@ -278,24 +296,52 @@ class Application(object):
             backend.fillobj(obj, fields)
         return obj
 
+    def _do_complete_objs(self, backend, fields, objs):
+        if fields is None or len(fields) > 0:
+            to_fill = []
+            for obj in objs:
+                if isinstance(obj, BaseObject):
+                    obj.backend = backend.name
+                    to_fill.append(obj)
+            if len(to_fill) > 1 and hasattr(backend, 'fillobjs'):
+                backend.fillobjs(to_fill, fields)
+                return objs
+
+        return [self._do_complete_obj(backend, fields, obj) for obj in objs]
+
     def _do_complete_iter(self, backend, count, fields, res):
         modif = 0
+        i = 0
+        res = iter(res)
+
+        while True:
+            # Objects are filled by batches, only when fields are asked.
+            size = self.FILL_BATCH_SIZE if fields is None or len(fields) > 0 else 1
+            # Check the limit before filling objects, to avoid useless
+            # requests. Returning closes the backend's generator.
+            if self.condition and self.condition.limit:
+                size = min(size, self.condition.limit - i)
+            if count:
+                # one more valid object is needed to know if more results are available
+                size = min(size, count - (i - modif) + 1)
+            if size <= 0:
+                return
 
-        for i, sub in enumerate(res):
-            sub = self._do_complete_obj(backend, fields, sub)
-            if self.condition and self.condition.limit and \
-               self.condition.limit == i:
+            batch = list(islice(res, size))
+            if not batch:
                 return
 
-            if self.condition and not self.condition.is_valid(sub):
-                modif += 1
-            else:
-                if count and i - modif == count:
-                    if self._is_default_count:
-                        raise MoreResultsAvailable()
-                    else:
-                        return
-                yield sub
+            for sub in self._do_complete_objs(backend, fields, batch):
+                if self.condition and not self.condition.is_valid(sub):
+                    modif += 1
+                else:
+                    if count and i - modif == count:
+                        if self._is_default_count:
+                            raise MoreResultsAvailable()
+                        else:
+                            return
+                    yield sub
+                i += 1
 
     def _do_complete(self, backend, count, selected_fields, function, *args, **kwargs):
         assert count is None or count > 0
@@ -351,6 +397,9 @@ class Application(object):
 
     def parse_args(self, args):
         self.options, args = self._parser.parse_args(args)
+        # command given on the command line, which is empty when the
+        # application is run interactively
+        self.command_args = args[1:]
 
         if self.options.shell_completion:
             items = set()
@@ -374,6 +423,12 @@ class Application(object):
         if self.options.insecure:
             log_settings['ssl_insecure'] = True
 
+        if not self.options.no_http_cache and getattr(self.weboob, 'datadir', None):
+            log_settings['http_cache'] = os.path.join(self.weboob.datadir, 'http_cache')
+
+        if self.options.import_profile:
+            profile_imports(self.stderr)
+
         # this only matters to developers
         if not self.options.debug and not self.options.save_responses:
             warnings.simplefilter('ignore', category=ConversionWarning)
@@ -454,6 +509,9 @@ class Application(object):
         if args is None:
             args = [(cls.stdin.encoding and isinstance(arg, bytes) and arg.decode(cls.stdin.encoding) or to_unicode(arg)) for arg in sys.argv]
 
+        # started by launchers, unless the application is run from elsewhere
+        profile_imports_if_requested(args)
+
         try:
             app = cls()
         except BackendsConfig.WrongPermissions as e:
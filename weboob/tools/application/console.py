@@ -102,6 +102,10 @@ class ConsoleApplication(Application):
             errors = kwargs['errors']
         else:
             kwargs['errors'] = errors = []
+        # When a command is given, modules are imported when backends are
+        # used. Interactive sessions import them upfront, so users can fix
+        # errors of configuration when they start.
+        kwargs.setdefault('lazy', bool(self.command_args))
         ret = super(ConsoleApplication, self).load_backends(*args, **kwargs)
 
         for err in errors:
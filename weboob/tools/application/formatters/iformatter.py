@@ -21,8 +21,8 @@
 from __future__ import print_function
 
 import os
+import struct
 import sys
-import subprocess
 
 try:
     from termcolor import colored
@@ -34,6 +34,11 @@ except ImportError:
         else:
             return s
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 try:
     import tty
     import termios
@@ -58,7 +63,7 @@ else:
         finally:
             termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
 
-from weboob.capabilities.base import BaseObject
+from weboob.capabilities.base import BaseObject, FieldsProjection
 from weboob.tools.application.console import ConsoleApplication
 from weboob.tools.ordereddict import OrderedDict
 
@@ -66,6 +71,41 @@ from weboob.tools.ordereddict import OrderedDict
 __all__ = ['IFormatter', 'MandatoryFieldsNotFound']
 
 
+_TERM_ROWS = None
+
+
+def get_term_rows():
+    """
+    Get the number of rows of the terminal, or 0 if it can't be determined.
+
+    It is computed only once.
+    """
+    global _TERM_ROWS
+    if _TERM_ROWS is None:
+        _TERM_ROWS = 0
+        if sys.platform == 'win32':
+            from ctypes import windll, create_string_buffer
+
+            h = windll.kernel32.GetStdHandle(-12)
+            csbi = create_string_buffer(22)
+            res = windll.kernel32.GetConsoleScreenBufferInfo(h, csbi)
+
+            if res:
+                (bufx, bufy, curx, cury, wattr,
+                 left, top, right, bottom, maxx, maxy) = struct.unpack("hhhhHhhhhhh", csbi.raw)
+                _TERM_ROWS = right - left + 1
+            else:
+                _TERM_ROWS = 80  # can't determine actual size - return default values
+        elif fcntl is not None:
+            try:
+                size = fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, struct.pack('hhhh', 0, 0, 0, 0))
+            except (IOError, ValueError):
+                pass
+            else:
+                _TERM_ROWS = struct.unpack('hhhh', size)[0]
+    return _TERM_ROWS
+
+
 class MandatoryFieldsNotFound(Exception):
     def __init__(self, missing_fields):
         Exception.__init__(self, u'Mandatory fields not found: %s.' % ', '.join(missing_fields))
@@ -77,6 +117,9 @@ class IFormatter(object):
     # Tuple of displayed field. Set to None if all available fields are
     # displayed
     DISPLAYED_FIELDS = None
+    # If True, format_dict() gets objects as read-only FieldsRow mappings,
+    # which avoid to build a dict for each object. Otherwise it gets dicts.
+    FIELDS_ROW = False
 
     BOLD = ConsoleApplication.BOLD
     NC = ConsoleApplication.NC
@@ -94,54 +137,82 @@ class IFormatter(object):
         self.display_header = display_header
         self.interactive = False
         self.print_lines = 0
-        self.termrows = 0
+        # Set at the first output on stdout, see get_termrows().
+        self.termrows = None
+        self._outfile = None
+        self._output = None
         self.outfile = outfile
-        # XXX if stdin is not a tty, it seems that the command fails.
-
-        if sys.stdout.isatty() and sys.stdin.isatty():
-            if sys.platform == 'win32':
-                from ctypes import windll, create_string_buffer
-
-                h = windll.kernel32.GetStdHandle(-12)
-                csbi = create_string_buffer(22)
-                res = windll.kernel32.GetConsoleScreenBufferInfo(h, csbi)
-
-                if res:
-                    import struct
-                    (bufx, bufy, curx, cury, wattr,
-                     left, top, right, bottom, maxx, maxy) = struct.unpack("hhhhHhhhhhh", csbi.raw)
-                    self.termrows = right - left + 1
-                else:
-                    self.termrows = 80  # can't determine actual size - return default values
+
+    @property
+    def outfile(self):
+        return self._outfile
+
+    @outfile.setter
+    def outfile(self, outfile):
+        self.close_output()
+        self._outfile = outfile
+
+    def get_termrows(self):
+        """
+        Get the number of rows after which output is paused, or 0 if output
+        is not displayed on a terminal.
+        """
+        if self.termrows is None:
+            # XXX if stdin is not a tty, it seems that the command fails.
+            if sys.stdout.isatty() and sys.stdin.isatty():
+                self.termrows = get_term_rows()
             else:
-                self.termrows = int(
-                    subprocess.Popen('stty size', shell=True, stdout=subprocess.PIPE).communicate()[0].split()[0]
-                )
+                self.termrows = 0
+        return self.termrows
 
     def output(self, formatted):
+        if isinstance(formatted, unicode):
+            formatted = formatted.encode('utf-8')
+
         if self.outfile != sys.stdout:
-            with open(self.outfile, "a+") as outfile:
-                outfile.write(formatted.encode('utf-8') + os.linesep)
+            # The file is kept open (and buffered) until outfile is changed
+            # or close_output() is called.
+            if self._output is None:
+                self._output = open(self.outfile, 'ab')
+            self._output.write(formatted + os.linesep)
+
+        elif not self.get_termrows():
+            sys.stdout.write(formatted + '\n')
 
         else:
             for line in formatted.split('\n'):
-                if self.termrows and (self.print_lines + 1) >= self.termrows:
+                if (self.print_lines + 1) >= self.termrows:
                     self.outfile.write(PROMPT)
                     self.outfile.flush()
                     readch()
                     self.outfile.write('\b \b' * len(PROMPT))
                     self.print_lines = 0
 
-                if isinstance(line, unicode):
-                    line = line.encode('utf-8')
                 print(line)
                 self.print_lines += 1
 
+    def flush_output(self):
+        """
+        Write buffered output.
+        """
+        if self._output is not None:
+            self._output.flush()
+        elif self.outfile == sys.stdout:
+            sys.stdout.flush()
+
+    def close_output(self):
+        """
+        Write buffered output and close the output file.
+        """
+        if self._output is not None:
+            self._output.close()
+            self._output = None
+
     def start_format(self, **kwargs):
-        pass
+        self.flush_output()
 
     def flush(self):
-        pass
+        self.flush_output()
 
     def format(self, obj, selected_fields=None, alias=None):
         """
@@ -155,7 +226,18 @@ class IFormatter(object):
         :param alias: an alias to use instead of the object's ID
         :type alias: unicode
         """
-        if isinstance(obj, BaseObject):
+        if isinstance(obj, BaseObject) and type(self).format_obj == IFormatter.format_obj:
+            # Values of selected fields are given to format_dict() without
+            # copying the object.
+            row = FieldsProjection.get(type(obj), selected_fields or None)(obj)
+
+            if self.MANDATORY_FIELDS:
+                missing_fields = set(self.MANDATORY_FIELDS) - set(row)
+                if missing_fields:
+                    raise MandatoryFieldsNotFound(missing_fields)
+
+            formatted = self.format_dict(row if self.FIELDS_ROW else row.to_dict())
+        elif isinstance(obj, BaseObject):
             if selected_fields:  # can be an empty list (nothing to do), or None (return all fields)
                 obj = obj.copy()
                 for name, value in obj.iter_fields():
@@ -269,6 +351,7 @@ def formatter_test_output(Formatter, obj):
     fmt.outfile = name
     fmt.format(obj)
     fmt.flush()
+    fmt.close_output()
     with open(name) as f:
         res = f.read()
     remove(name)
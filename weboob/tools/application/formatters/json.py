@@ -18,7 +18,7 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
-from weboob.capabilities.base import NotAvailable, NotLoaded
+from weboob.capabilities.base import NotAvailable, NotLoaded, FieldsRow
 from weboob.tools.json import json
 
 from .iformatter import IFormatter
@@ -48,6 +48,8 @@ class JsonFormatter(IFormatter):
     Formats the whole list as a single JSON list object.
     """
 
+    FIELDS_ROW = True
+
     def __init__(self):
         IFormatter.__init__(self)
         self.queue = []
@@ -56,6 +58,8 @@ class JsonFormatter(IFormatter):
         self.output(json.dumps(self.queue, cls=Encoder))
 
     def format_dict(self, item):
+        if isinstance(item, FieldsRow):
+            item = item.to_dict()
         self.queue.append(item)
 
     def format_collection(self, collection, only):
@@ -68,7 +72,11 @@ class JsonLineFormatter(IFormatter):
     The advantage is that it can be streamed.
     """
 
+    FIELDS_ROW = True
+
     def format_dict(self, item):
+        if isinstance(item, FieldsRow):
+            item = item.to_dict()
         self.output(json.dumps(item, cls=Encoder))
 
 
@@ -76,3 +84,15 @@ def test():
     from .iformatter import formatter_test_output as fmt
     assert fmt(JsonFormatter, {'foo': 'bar'}) == '[{"foo": "bar"}]\n'
     assert fmt(JsonLineFormatter, {'foo': 'bar'}) == '{"foo": "bar"}\n'
+
+    from weboob.capabilities.base import BaseObject, StringField
+
+    class Obj(BaseObject):
+        foo = StringField('Foo')
+        bar = StringField('Bar')
+
+    obj = Obj(u'1', backend='backend')
+    obj.foo = u'foo'
+    del obj.bar
+    assert fmt(JsonFormatter, obj) == '[{"id": "1@backend", "foo": "foo"}]\n'
+    assert fmt(JsonLineFormatter, obj) == '{"id": "1@backend", "foo": "foo"}\n'
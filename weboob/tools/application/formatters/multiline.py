@@ -26,6 +26,8 @@ __all__ = ['MultilineFormatter']
 
 
 class MultilineFormatter(IFormatter):
+    FIELDS_ROW = True
+
     def __init__(self, key_value_separator=u': ', after_item=u'\n'):
         IFormatter.__init__(self)
         self.key_value_separator = key_value_separator
@@ -25,6 +25,8 @@ __all__ = ['SimpleFormatter']
 
 
 class SimpleFormatter(IFormatter):
+    FIELDS_ROW = True
+
     def __init__(self, field_separator=u'\t', key_value_separator=u'='):
         IFormatter.__init__(self)
         self.field_separator = field_separator
@@ -29,6 +29,8 @@ __all__ = ['TableFormatter', 'HTMLTableFormatter']
 
 
 class TableFormatter(IFormatter):
+    FIELDS_ROW = True
+
     HTML = False
 
     def __init__(self):
@@ -107,6 +107,9 @@ class ReplApplication(Cmd, ConsoleApplication):
     # Objects to allow in do_ls / do_cd
     COLLECTION_OBJECTS = tuple()
 
+    # Maximum number of results fetched by backends and not displayed yet
+    RESULTS_BUFFER_SIZE = 100
+
     weboob_commands = set(['backends', 'condition', 'count', 'formatter', 'logging', 'select', 'quit', 'ls', 'cd'])
     hidden_commands = set(['EOF'])
 
@@ -370,6 +373,7 @@ class ReplApplication(Cmd, ConsoleApplication):
                 print('Warning: some selected fields will not be displayed by the formatter. Fallback to another. Hint: use option -f', file=self.stderr)
                 self.formatter = self.formatters_loader.build_formatter(ReplApplication.DEFAULT_FORMATTER)
 
+        kwargs.setdefault('buffer_size', self.RESULTS_BUFFER_SIZE)
         return self.weboob.do(self._do_complete, self.options.count, fields, function, *args, **kwargs)
 
     # -- command tools ------------
@@ -1174,6 +1178,8 @@ class ReplApplication(Cmd, ConsoleApplication):
 
         It returns the name of the formatter which has been really set.
         """
+        if self.formatter is not None:
+            self.formatter.close_output()
         try:
             self.formatter = self.formatters_loader.build_formatter(name)
         except FormatterLoadError as e:
@@ -1198,6 +1204,7 @@ class ReplApplication(Cmd, ConsoleApplication):
 
     def start_format(self, **kwargs):
         self.formatter.start_format(**kwargs)
+        self.formatter.flush_output()
 
     def cached_format(self, obj):
         self.add_object(obj)
@@ -1224,3 +1231,4 @@ class ReplApplication(Cmd, ConsoleApplication):
 
     def flush(self):
         self.formatter.flush()
+        self.formatter.flush_output()
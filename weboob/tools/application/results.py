@@ -17,7 +17,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
+import re
+from datetime import date, datetime, timedelta
+
 from weboob.capabilities import UserError
+from weboob.capabilities.base import FieldsProjection
 
 
 __all__ = ['ResultsCondition', 'ResultsConditionError']
@@ -32,13 +36,6 @@ class ResultsConditionError(UserError):
     pass
 
 
-class Condition(object):
-    def __init__(self, left, op, right):
-        self.left = left  # Field of the object to test
-        self.op = op
-        self.right = right
-
-
 def is_egal(left, right):
     return left == right
 
@@ -60,6 +57,79 @@ def is_in(left, right):
 
 functions = {'!=': is_notegal, '=': is_egal, '>': is_sup, '<': is_inf, '|': is_in}
 
+TIMEDELTA_REGEXP = re.compile(r'^\s*((?P<hours>\d+)\s*h)?\s*((?P<minutes>\d+)\s*m)?\s*((?P<seconds>\d+)\s*s)?\s*$')
+
+# Marker of literals which can't be converted to the type of a field.
+INVALID = object()
+
+
+def convert_literal(string, value):
+    """
+    Convert a literal given by user to the type of a value.
+
+    :raises: :class:`ValueError`, :class:`TypeError` or
+             :class:`ArithmeticError` if it can't be converted
+    """
+    if isinstance(value, datetime):
+        day, hour = string.split(' ')
+        return datetime(*([int(x) for x in day.split('-')] + [int(x) for x in hour.split(':')]))
+    if isinstance(value, date):
+        return date(*[int(x) for x in string.split('-')])
+    if isinstance(value, timedelta):
+        m = TIMEDELTA_REGEXP.match(string)
+        if m is None:
+            raise ValueError('Invalid duration: %r' % string)
+        return timedelta(seconds=int(m.group('seconds') or '0'),
+                         minutes=int(m.group('minutes') or '0'),
+                         hours=int(m.group('hours') or '0'))
+    return type(value)(string)
+
+
+class Condition(object):
+    """
+    Comparison of a field with a literal.
+
+    The literal is converted once for each type of values of the field.
+    """
+
+    def __init__(self, left, op, right):
+        self.left = left  # Field of the object to test
+        self.op = op
+        self.right = right
+        self.function = functions[op]
+        self.literals = {}
+
+    def get_literal(self, value):
+        try:
+            return self.literals[type(value)]
+        except KeyError:
+            pass
+
+        try:
+            literal = convert_literal(self.right, value)
+        except (ValueError, TypeError, ArithmeticError):
+            literal = INVALID
+        self.literals[type(value)] = literal
+        return literal
+
+    def is_valid(self, value):
+        literal = self.get_literal(value)
+        if literal is INVALID:
+            return False
+        try:
+            return self.function(literal, value)
+        except TypeError:
+            return False
+
+
+class IdCondition(Condition):
+    """
+    Comparison of the id, which is tested in both forms id@backend and id.
+    """
+
+    def is_valid(self, fullid, id):
+        return self.function(self.right, fullid) or self.function(self.right, id)
+
 
 class ResultsCondition(IResultsCondition):
     condition_str = None
@@ -92,50 +162,53 @@ class ResultsCondition(IResultsCondition):
                     l, r = _and.split(operator)
                 except ValueError:
                     raise ResultsConditionError(u'Syntax error in the condition expression, please check documentation')
-                and_list.append(Condition(l, operator, r))
+                and_list.append(IdCondition(l, operator, r) if l == 'id' else Condition(l, operator, r))
             or_list.append(and_list)
         self.condition = or_list
         self.condition_str = condition_str
+        self.fields = tuple(set(condition.left for and_list in or_list for condition in and_list))
+        self.projections = {}
+
+    def get_projection(self, klass):
+        """
+        Get the projection of fields used by the condition on a class, and
+        check they exist, once for each class.
+        """
+        try:
+            return self.projections[klass]
+        except KeyError:
+            pass
+
+        for name in self.fields:
+            if name != 'id' and name not in klass._fields:
+                raise ResultsConditionError(u'Field "%s" is not valid.' % name)
+        return self.projections.setdefault(klass, FieldsProjection.get(klass, self.fields))
+
+    def get_value(self, obj, row, name):
+        try:
+            if row is not None:
+                return row[name]
+            if name == 'id':
+                return obj.fullid if obj.backend is not None else obj.id
+            return getattr(obj, name)
+        except (KeyError, AttributeError):
+            raise ResultsConditionError(u'Field "%s" is not valid.' % name)
 
     def is_valid(self, obj):
-        import weboob.tools.date as date_utils
-        import re
-        from datetime import date, datetime, timedelta
-        d = obj.to_dict()
+        projection = self.get_projection(type(obj))
+        # Objects which decorate their fields are read through to_dict(),
+        # other ones directly.
+        row = projection(obj) if projection.generic else None
+
         # We evaluate all member of a list at each iteration.
         for _or in self.condition:
             myeval = True
             for condition in _or:
-                if condition.left in d:
-                    # in the case of id, test id@backend and id
-                    if condition.left == 'id':
-                        tocompare = condition.right
-                        evalfullid = functions[condition.op](tocompare, d['id'])
-                        evalid = functions[condition.op](tocompare, obj.id)
-                        myeval = evalfullid or evalid
-                    else:
-                        # We have to change the type of v, always gived as string by application
-                        typed = type(d[condition.left])
-                        try:
-                            if isinstance(d[condition.left], date_utils.date):
-                                tocompare = date(*[int(x) for x in condition.right.split('-')])
-                            elif isinstance(d[condition.left], date_utils.datetime):
-                                splitted_datetime = condition.right.split(' ')
-                                tocompare = datetime(*([int(x) for x in splitted_datetime[0].split('-')] +
-                                                       [int(x) for x in splitted_datetime[1].split(':')]))
-                            elif isinstance(d[condition.left], timedelta):
-                                time_dict = re.match('^\s*((?P<hours>\d+)\s*h)?\s*((?P<minutes>\d+)\s*m)?\s*((?P<seconds>\d+)\s*s)?\s*$',
-                                                     condition.right).groupdict()
-                                tocompare = timedelta(seconds=int(time_dict['seconds'] or "0"),
-                                                      minutes=int(time_dict['minutes'] or "0"),
-                                                      hours=int(time_dict['hours'] or "0"))
-                            else:
-                                tocompare = typed(condition.right)
-                            myeval = functions[condition.op](tocompare, d[condition.left])
-                        except:
-                            myeval = False
+                value = self.get_value(obj, row, condition.left)
+                if isinstance(condition, IdCondition):
+                    myeval = condition.is_valid(value, obj.id)
                 else:
-                    raise ResultsConditionError(u'Field "%s" is not valid.' % condition.left)
+                    myeval = condition.is_valid(value)
                 # Do not try all AND conditions if one is false
                 if not myeval:
                     break
@@ -150,3 +223,28 @@ class ResultsCondition(IResultsCondition):
 
     def __unicode__(self):
         return self.condition_str
+
+
+def test():
+    from decimal import Decimal
+    from weboob.capabilities.base import BaseObject, DecimalField, Field
+
+    class Obj(BaseObject):
+        date = Field('Date', date)
+        amount = DecimalField('Amount')
+
+    obj = Obj(u'1', backend='backend')
+    obj.date = date(2014, 3, 1)
+    obj.amount = Decimal('-12.5')
+
+    assert ResultsCondition('date>2014-01-01 AND amount<0').is_valid(obj)
+    assert not ResultsCondition('date<2014-01-01 AND amount<0').is_valid(obj)
+    assert ResultsCondition('amount>0 OR id=1@backend').is_valid(obj)
+    assert ResultsCondition('id=1').is_valid(obj)
+    assert not ResultsCondition('amount>foo').is_valid(obj)
+    try:
+        ResultsCondition('foo=1').is_valid(obj)
+    except ResultsConditionError:
+        pass
+    else:
+        assert False, 'invalid field not detected'
@@ -19,12 +19,13 @@
 
 
 import os
-from threading import RLock
+from threading import RLock, Condition, local
 from copy import copy
 
 from weboob.capabilities.base import BaseObject, FieldNotFound, \
     Capability, NotLoaded, NotAvailable
 from weboob.tools.misc import iter_fields
+from weboob.tools.ordereddict import OrderedDict
 from weboob.tools.log import getLogger
 from weboob.tools.value import ValuesDict
 
@@ -203,6 +204,96 @@ class BackendConfig(ValuesDict):
         self.weboob.backends_config.add_backend(self.instname, self.modname, dump, edit)
 
 
+class BrowsersPool(object):
+    """
+    Pool of browsers of a backend.
+
+    It is used when :attr:`Module.BROWSERS_POOL_SIZE` is greater than 1: each
+    thread entering the backend checks out a browser, which is returned to
+    the pool when it leaves it. Reentrant uses in the same thread get the
+    same browser.
+
+    :param module: backend which owns this pool
+    :type module: :class:`Module`
+    :param size: maximum number of browsers
+    :type size: :class:`int`
+    :param share_session: if True, every browser uses the same cookies jar,
+                          so a session logged with one of them is seen by
+                          all of them
+    :type share_session: :class:`bool`
+    """
+
+    def __init__(self, module, size, share_session=False):
+        self.module = module
+        self.size = size
+        self.share_session = share_session
+        self.created = 0
+        self.available = []
+        self.cookies = None
+        self.cond = Condition()
+        self.local = local()
+
+    def current(self):
+        """
+        Get the browser checked out by the current thread, if any.
+        """
+        return getattr(self.local, 'browser', None)
+
+    def checkout(self):
+        """
+        Check out a browser for the current thread. It blocks until one is
+        available.
+        """
+        if self.current() is not None:
+            self.local.depth += 1
+            return
+
+        browser = None
+        with self.cond:
+            while not self.available and self.created >= self.size:
+                self.cond.wait()
+            if self.available:
+                browser = self.available.pop()
+            else:
+                self.created += 1
+
+        if browser is None:
+            try:
+                browser = self.create_browser()
+            except:
+                with self.cond:
+                    self.created -= 1
+                    self.cond.notify()
+                raise
+
+        self.local.browser = browser
+        self.local.depth = 1
+
+    def checkin(self):
+        """
+        Give back the browser of the current thread to the pool.
+        """
+        self.local.depth -= 1
+        if self.local.depth > 0:
+            return
+
+        browser = self.local.browser
+        self.local.browser = None
+        with self.cond:
+            self.available.append(browser)
+            self.cond.notify()
+
+    def create_browser(self):
+        browser = self.module.create_default_browser()
+        if self.share_session and hasattr(browser, 'session'):
+            with self.cond:
+                if self.cookies is None:
+                    self.cookies = browser.session.cookies
+                else:
+                    browser.session.cookies = self.cookies
+        return browser
+
+
 class Module(object):
     """
     Base class for modules.
@@ -249,6 +340,19 @@ class Module(object):
     # When the method is called, fields are only the one which are
     # NOT yet filled.
     OBJECTS = {}
+    # Fillers of several objects at once, used by fillobjs()
+    # The key is the class and the value the method to call to fill
+    # Method prototype: method(objects, fields)
+    # Objects given to the method all miss the same fields.
+    BATCH_OBJECTS = {}
+    # Number of browsers which can be used at the same time. By default,
+    # calls on a backend are serialized; with a greater value, each call
+    # checks out a browser of a BrowsersPool, so independent calls are
+    # processed in parallel.
+    BROWSERS_POOL_SIZE = 1
+    # When browsers are pooled, share the cookies (thus a logged session)
+    # between them.
+    BROWSERS_SHARE_SESSION = False
 
     class ConfigError(Exception):
         """
@@ -256,10 +360,16 @@ class Module(object):
         """
 
     def __enter__(self):
-        self.lock.acquire()
+        if self._browsers_pool is not None:
+            self._browsers_pool.checkout()
+        else:
+            self.lock.acquire()
 
     def __exit__(self, t, v, tb):
-        self.lock.release()
+        if self._browsers_pool is not None:
+            self._browsers_pool.checkin()
+        else:
+            self.lock.release()
 
     def __repr__(self):
         return u"<Backend %r>" % self.name
@@ -269,6 +379,9 @@ class Module(object):
         self.weboob = weboob
         self.name = name
         self.lock = RLock()
+        self._browsers_pool = None
+        if self.BROWSERS_POOL_SIZE > 1:
+            self._browsers_pool = BrowsersPool(self, self.BROWSERS_POOL_SIZE, self.BROWSERS_SHARE_SESSION)
         if config is None:
             config = {}
 
@@ -296,7 +409,15 @@ class Module(object):
         of this attribute, to avoid useless pages access.
 
         Note that the :func:`create_default_browser` method is called to create it.
+
+        When browsers are pooled (see :attr:`BROWSERS_POOL_SIZE`), it is the
+        browser checked out by the current thread.
         """
+        if self._browsers_pool is not None:
+            browser = self._browsers_pool.current()
+            if browser is not None:
+                return browser
+
         if self._browser is None:
             self._browser = self.create_default_browser()
         return self._browser
@@ -346,7 +467,71 @@ class Module(object):
             kwargs.setdefault('responses_dirname', os.path.join(self.logger.settings['responses_dirname'],
                                                                 self._private_config.get('_debug_dir', self.name)))
 
-        return self.BROWSER(*args, **kwargs)
+        from weboob.browser.browsers import Browser
+        if issubclass(self.BROWSER, Browser):
+            # deprecated browsers support neither cache nor replay
+            if self.logger.settings['replay_dirname']:
+                kwargs.setdefault('replay_dirname', os.path.join(self.logger.settings['replay_dirname'],
+                                                                 self._private_config.get('_debug_dir', self.name)))
+            elif self.logger.settings['http_cache'] and self.BROWSER.HTTP_CACHE:
+                kwargs.setdefault('cache_dirname', os.path.join(self.logger.settings['http_cache'], self.name))
+
+        browser = self.BROWSER(*args, **kwargs)
+        self.load_browser_state(browser)
+        return browser
+
+    def load_browser_state(self, browser):
+        """
+        Restore in a browser the session saved by :func:`dump_browser_state`.
+
+        It is only done for browsers with a
+        :attr:`weboob.browser.browsers.LoginBrowser.SESSION_DURATION`.
+        """
+        if not getattr(browser, 'SESSION_DURATION', None):
+            return
+
+        data = self.storage.get('browser_state', default=None)
+        if not data:
+            return
+
+        from weboob.browser.states import decrypt_state, StateError
+        try:
+            state = decrypt_state(data, browser.password)
+        except StateError as e:
+            self.logger.debug('unable to load the state of the browser: %s', e)
+            return
+
+        browser.load_state(state)
+
+    def dump_browser_state(self):
+        """
+        Save the session of a logged browser in the storage, encrypted with
+        the password of the backend.
+
+        It is called when the backend is unloaded, before :func:`deinit`.
+        """
+        browsers = [self._browser]
+        if self._browsers_pool is not None:
+            browsers += self._browsers_pool.available
+
+        for browser in browsers:
+            if not getattr(browser, 'SESSION_DURATION', None):
+                continue
+
+            state = browser.dump_state()
+            if state is None:
+                continue
+
+            from weboob.browser.states import encrypt_state, StateError
+            try:
+                data = encrypt_state(state, browser.password)
+            except StateError as e:
+                self.logger.debug('unable to save the state of the browser: %s', e)
+                return
+
+            self.storage.set('browser_state', data)
+            self.storage.save()
+            return
 
     @classmethod
     def iter_caps(klass):
@@ -383,6 +568,88 @@ class Module(object):
         if obj is None:
             return obj
 
+        missing_fields = self._get_missing_fields(obj, fields)
+        if not missing_fields:
+            return obj
+
+        filler = self._get_filler(self.OBJECTS, obj)
+        if filler is not None:
+            self.logger.debug(u'Fill %r with fields: %s' % (obj, missing_fields))
+            return filler(self, obj, missing_fields) or obj
+
+        # Object is not supported by backend. Do not notice it to avoid flooding user.
+        # That's not so bad.
+        for field in missing_fields:
+            setattr(obj, field, NotAvailable)
+
+        return obj
+
+    def fillobjs(self, objs, fields=None):
+        """
+        Fill several objects with the wanted fields.
+
+        Objects are given to the fillers of :attr:`BATCH_OBJECTS` when
+        there is one for their class. Otherwise, if browsers are pooled
+        (see :attr:`BROWSERS_POOL_SIZE`), objects are filled at the same
+        time on the executor of the browser, else one after the other.
+
+        :param objs: objects to fill
+        :type objs: :class:`list`
+        :param fields: what fields to fill; if None, all fields are filled
+        :type fields: :class:`list`
+        :rtype: :class:`list`
+        """
+        objs = list(objs)
+        batches = OrderedDict()
+        others = []
+        for i, obj in enumerate(objs):
+            if obj is None:
+                continue
+
+            missing_fields = self._get_missing_fields(obj, fields)
+            if not missing_fields:
+                continue
+
+            filler = self._get_filler(self.BATCH_OBJECTS, obj)
+            if filler is None:
+                others.append(i)
+            else:
+                batches.setdefault((filler, tuple(missing_fields)), []).append(obj)
+
+        for (filler, missing_fields), batch in batches.iteritems():
+            self.logger.debug(u'Fill %d objects with fields: %s' % (len(batch), list(missing_fields)))
+            filler(self, batch, list(missing_fields))
+
+        for i, obj in zip(others, self._fillobjs_concurrently([objs[i] for i in others], fields)):
+            objs[i] = obj
+
+        return objs
+
+    def _fillobjs_concurrently(self, objs, fields):
+        executor = getattr(getattr(self.browser, 'session', None), 'executor', None)
+        workers = 0
+        if self._browsers_pool is not None:
+            workers = self._browsers_pool.size
+            if self._browsers_pool.current() is not None:
+                # the browser of the current thread is not available
+                workers -= 1
+
+        if executor is None or workers < 2 or len(objs) < 2:
+            return [self.fillobj(obj, fields) for obj in objs]
+
+        def fill(obj):
+            with self:
+                return self.fillobj(obj, fields)
+
+        filled = []
+        # do not give more objects to the executor than available browsers,
+        # its threads would be blocked waiting for them
+        for start in xrange(0, len(objs), workers):
+            futures = [executor.submit(fill, obj) for obj in objs[start:start + workers]]
+            filled.extend(future.result() for future in futures)
+        return filled
+
+    def _get_missing_fields(self, obj, fields):
         def not_loaded(v):
             return (v is NotLoaded or isinstance(v, BaseObject) and not v.__iscomplete__())
 
@@ -414,17 +681,10 @@ class Module(object):
             if missing:
                 missing_fields.append(field)
 
-        if not missing_fields:
-            return obj
+        return missing_fields
 
-        for key, value in self.OBJECTS.iteritems():
+    def _get_filler(self, fillers, obj):
+        for key, value in fillers.iteritems():
             if isinstance(obj, key):
-                self.logger.debug(u'Fill %r with fields: %s' % (obj, missing_fields))
-                return value(self, obj, missing_fields) or obj
-
-        # Object is not supported by backend. Do not notice it to avoid flooding user.
-        # That's not so bad.
-        for field in missing_fields:
-            setattr(obj, field, NotAvailable)
-
-        return obj
+                return value
+        return None
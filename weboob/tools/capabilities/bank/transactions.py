@@ -356,3 +356,28 @@ def test():
     decimal_amount = AmericanTransaction.decimal_amount
     assert decimal_amount('$12,442.12 USD') == Decimal('12442.12')
     assert decimal_amount('') == Decimal('0')
+
+
+def test_pickle():
+    import pickle
+
+    tr = Transaction(u'42', backend='bank')
+    tr.date = datetime.date(2017, 1, 1)
+    tr.label = u'CARREFOUR'
+    tr.amount = Decimal('-12.50')
+    tr._account = u'1234'
+    del tr.category
+
+    for protocol in (0, 2):
+        other = pickle.loads(pickle.dumps(tr, protocol))
+        assert type(other) is Transaction
+        assert other == tr
+        assert other.to_dict() == tr.to_dict()
+        assert 'category' not in other.to_dict()
+        assert other.amount == Decimal('-12.50')
+        assert other.raw is NotLoaded
+        assert other.date == datetime.date(2017, 1, 1)
+        assert other._account == u'1234'
+        # values are not shared with the pickled object
+        other.label = u'OTHER'
+        assert tr.label != u'OTHER'
@@ -20,7 +20,6 @@
 
 import time
 from weboob.capabilities.messages import CapMessages, Message, Thread
-from weboob.capabilities.base import find_object
 from weboob.tools.backend import Module
 from weboob.tools.newsfeed import Newsfeed
 
@@ -44,7 +43,8 @@ class GenericNewspaperModule(Module, CapMessages):
             thread = _id
             id = thread.id
         else:
-            thread = find_object(self.iter_threads(), id=_id)
+            entry = Newsfeed(self.RSS_FEED, GenericNewspaperModule.RSSID).get_entry(_id)
+            thread = self._entry2thread(entry) if entry else None
             id = _id
 
         with self.browser:
@@ -79,10 +79,13 @@ class GenericNewspaperModule(Module, CapMessages):
 
     def iter_threads(self):
         for article in Newsfeed(self.RSS_FEED, GenericNewspaperModule.RSSID).iter_entries():
-            thread = Thread(article.id)
-            thread.title = article.title
-            thread.date = article.datetime
-            yield(thread)
+            yield self._entry2thread(article)
+
+    def _entry2thread(self, article):
+        thread = Thread(article.id)
+        thread.title = article.title
+        thread.date = article.datetime
+        return thread
 
     def fill_thread(self, thread, fields):
         "fill the thread"
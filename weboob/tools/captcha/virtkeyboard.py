@@ -27,6 +27,11 @@ try:
 except ImportError:
     raise ImportError('Please install python-imaging')
 
+try:
+    import numpy
+except ImportError:
+    raise ImportError('Please install python-numpy')
+
 
 class VirtKeyboardError(Exception):
     pass
@@ -85,6 +90,39 @@ class VirtKeyboard(object):
         self.width, self.height = self.image.size
         self.pixar = self.image.load()
 
+        # Pixels as an array indexed by [y, x], with a last axis for bands
+        # of multi-band images.
+        self.array = numpy.asarray(self.image)
+        if self.image.mode == '1':
+            # same values as pixar
+            self.array = self.array.astype(numpy.uint8) * 255
+        self._mask = None
+
+    def get_mask(self):
+        """
+        Get pixels of the image which match :meth:`check_color`.
+
+        :rtype: boolean :class:`numpy.ndarray` indexed by [y, x]
+        """
+        if self._mask is None:
+            if type(self).check_color == VirtKeyboard.check_color:
+                mask = self.array == numpy.array(self.color, dtype=self.array.dtype)
+                if mask.ndim == 3:
+                    mask = mask.all(axis=2)
+            else:
+                # check_color() is overloaded: call it only once for each
+                # color of the image.
+                if self.array.ndim == 3:
+                    colors, inverse = numpy.unique(self.array.reshape(-1, self.array.shape[2]),
+                                                   axis=0, return_inverse=True)
+                    matches = [self.check_color(tuple(c)) for c in colors.tolist()]
+                else:
+                    colors, inverse = numpy.unique(self.array, return_inverse=True)
+                    matches = [self.check_color(c) for c in colors.tolist()]
+                mask = numpy.array(matches, dtype=bool)[inverse].reshape(self.height, self.width)
+            self._mask = mask
+        return self._mask
+
     def load_symbols(self, coords):
         self.coords = {}
         self.md5 = {}
@@ -104,48 +142,49 @@ class VirtKeyboard(object):
             top, right, bottom, left = self.margin
             x1, y1, x2, y2 = x1 + left, y1 + top, x2 - right, y2 - bottom
 
-        newY1 = -1
-        newY2 = -1
-        for y in range(y1, min(y2 + 1, self.height)):
-            empty_line = True
-            for x in range(x1, min(x2 + 1, self.width)):
-                if self.check_color(self.pixar[x, y]):
-                    empty_line = False
-                    if newY1 < 0:
-                        newY1 = y
-                    break
-            if newY1 >= 0 and not empty_line:
-                newY2 = y
-        newX1 = -1
-        newX2 = -1
-        for x in range(x1, min(x2 + 1, self.width)):
-            empty_column = True
-            for y in range(y1, min(y2 + 1, self.height)):
-                if self.check_color(self.pixar[x, y]):
-                    empty_column = False
-                    if newX1 < 0:
-                        newX1 = x
-                    break
-            if newX1 >= 0 and not empty_column:
-                newX2 = x
-        return (newX1, newY1, newX2, newY2)
+        x1, y1 = max(x1, 0), max(y1, 0)
+        mask = self.get_mask()[y1:y2 + 1, x1:x2 + 1]
+        rows = numpy.flatnonzero(mask.any(axis=1))
+        if not len(rows):
+            return (-1, -1, -1, -1)
+        cols = numpy.flatnonzero(mask.any(axis=0))
+        return (x1 + int(cols[0]), y1 + int(rows[0]), x1 + int(cols[-1]), y1 + int(rows[-1]))
+
+    @staticmethod
+    def fingerprint(mask):
+        """
+        Get the md5 of a mask, where each matching pixel is a "." and the
+        other ones a space, line by line.
+
+        :type mask: boolean :class:`numpy.ndarray`
+        :rtype: :class:`str`
+        """
+        chars = numpy.where(mask, numpy.uint8(ord('.')), numpy.uint8(ord(' ')))
+        return hashlib.md5(chars.tobytes()).hexdigest()
 
     def checksum(self, coords):
         (x1, y1, x2, y2) = coords
-        s = ''
-        for y in range(y1, min(y2 + 1, self.height)):
-            for x in range(x1, min(x2 + 1, self.width)):
-                if self.check_color(self.pixar[x, y]):
-                    s += "."
-                else:
-                    s += " "
-        return hashlib.md5(s).hexdigest()
+        return self.fingerprint(self.get_mask()[max(y1, 0):y2 + 1, max(x1, 0):x2 + 1])
+
+    def get_symbols_codes(self, md5sums):
+        """
+        Get codes of several symbols at once.
+
+        :param md5sums: checksums of symbols
+        :type md5sums: iterable
+        :rtype: :class:`list`
+        :raises: :class:`VirtKeyboardError` if a symbol is not found
+        """
+        codes = {}
+        for i in self.md5:
+            codes.setdefault(self.md5[i], i)
+        try:
+            return [codes[md5sum] for md5sum in md5sums]
+        except KeyError:
+            raise VirtKeyboardError('Symbol not found')
 
     def get_symbol_code(self, md5sum):
-        for i in self.md5:
-            if md5sum == self.md5[i]:
-                return i
-        raise VirtKeyboardError('Symbol not found')
+        return self.get_symbols_codes([md5sum])[0]
 
     def check_symbols(self, symbols, dirname):
         # symbols: dictionary <symbol>:<md5 value>
@@ -161,14 +200,8 @@ class VirtKeyboard(object):
 
     def generate_MD5(self, dir):
         for i in self.coords:
-            width = self.coords[i][2] - self.coords[i][0] + 1
-            height = self.coords[i][3] - self.coords[i][1] + 1
-            img = Image.new(''.join(self.bands), (width, height))
-            matrix = img.load()
-            for y in range(height):
-                for x in range(width):
-                    matrix[x, y] = self.pixar[self.coords[i][0] + x, self.coords[i][1] + y]
-            img.save(dir + "/" + self.md5[i] + ".png")
+            x1, y1, x2, y2 = self.coords[i]
+            self.image.crop((x1, y1, x2 + 1, y2 + 1)).save(dir + "/" + self.md5[i] + ".png")
         self.image.save(dir + "/image.png")
 
 
@@ -237,3 +270,97 @@ class GridVirtKeyboard(VirtKeyboard):
 
     def get_string_code(self, string):
         return str(string).translate(self._trans)
+
+
+def test():
+    import random
+    import shutil
+    from io import BytesIO
+
+    class LegacyMixin(object):
+        # per-pixel implementation used before the masks, to check hashes
+        # are the same
+        def get_symbol_coords(self, coords):
+            (x1, y1, x2, y2) = coords
+            if self.margin:
+                top, right, bottom, left = self.margin
+                x1, y1, x2, y2 = x1 + left, y1 + top, x2 - right, y2 - bottom
+
+            newY1 = newY2 = newX1 = newX2 = -1
+            for y in range(y1, min(y2 + 1, self.height)):
+                if any(self.check_color(self.pixar[x, y]) for x in range(x1, min(x2 + 1, self.width))):
+                    if newY1 < 0:
+                        newY1 = y
+                    newY2 = y
+            for x in range(x1, min(x2 + 1, self.width)):
+                if any(self.check_color(self.pixar[x, y]) for y in range(y1, min(y2 + 1, self.height))):
+                    if newX1 < 0:
+                        newX1 = x
+                    newX2 = x
+            return (newX1, newY1, newX2, newY2)
+
+        def checksum(self, coords):
+            (x1, y1, x2, y2) = coords
+            s = ''
+            for y in range(y1, min(y2 + 1, self.height)):
+                for x in range(x1, min(x2 + 1, self.width)):
+                    s += '.' if self.check_color(self.pixar[x, y]) else ' '
+            return hashlib.md5(s.encode('ascii')).hexdigest()
+
+    class BrightKeyboard(VirtKeyboard):
+        def check_color(self, pixel):
+            if isinstance(pixel, tuple):
+                return sum(pixel) > 300
+            return pixel > 100
+
+    class MarginKeyboard(BrightKeyboard):
+        margin = (1, 2)
+
+    rand = random.Random(42)
+    colors = [(0, 0, 0), (255, 255, 255), (200, 10, 10), (10, 200, 10)]
+    image = Image.new('RGB', (40, 30))
+    image.putdata([rand.choice(colors) for i in range(40 * 30)])
+    # a blank area, where no symbol is found
+    image.paste((0, 0, 0), (30, 0, 40, 10))
+
+    coords = dict(('%d%d' % (x, y), (x * 10, y * 10, x * 10 + 9, y * 10 + 9))
+                  for x in range(4) for y in range(3))
+    # area partly out of the image
+    coords['out'] = (35, 25, 50, 50)
+
+    images = [(image, (255, 255, 255)),
+              (image.convert('L'), 255),
+              (image.convert('P'), image.convert('P').getpixel((0, 0))),
+              (image.convert('1'), 255)]
+
+    for img, color in images:
+        for cls in (VirtKeyboard, BrightKeyboard, MarginKeyboard):
+            data = BytesIO()
+            img.save(data, 'PNG')
+            legacy = type('Legacy', (LegacyMixin, cls), {})
+
+            expected = legacy()
+            expected.load_image(BytesIO(data.getvalue()), color)
+            expected.load_symbols(coords)
+            vk = cls()
+            vk.load_image(BytesIO(data.getvalue()), color)
+            vk.load_symbols(coords)
+
+            assert vk.md5, (img.mode, cls)
+            assert vk.coords == expected.coords, (img.mode, cls)
+            assert vk.md5 == expected.md5, (img.mode, cls)
+            if cls is VirtKeyboard:
+                assert '30' not in vk.coords
+
+            dirname = tempfile.mkdtemp(prefix='weboob_test_virtkeyboard_')
+            try:
+                vk.generate_MD5(dirname)
+                for i, (x1, y1, x2, y2) in vk.coords.items():
+                    symbol = Image.open('%s/%s.png' % (dirname, vk.md5[i]))
+                    assert symbol.size == (x2 - x1 + 1, y2 - y1 + 1)
+                    symbol = symbol.load()
+                    for y in range(y2 - y1 + 1):
+                        for x in range(x2 - x1 + 1):
+                            assert symbol[x, y] == vk.pixar[x1 + x, y1 + y]
+            finally:
+                shutil.rmtree(dirname)
@@ -18,7 +18,7 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
-__all__ = ['unicode', 'long', 'basestring']
+__all__ = ['unicode', 'long', 'basestring', 'izip']
 
 
 try:
@@ -35,3 +35,8 @@ try:
     basestring = basestring
 except NameError:
     basestring = str
+
+try:
+    from itertools import izip
+except ImportError:
+    izip = zip
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2017 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function
+
+import atexit
+import os
+import sys
+from threading import Lock, local
+from time import time
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+
+__all__ = ['ImportProfiler', 'profiler', 'profile_imports', 'profile_imports_if_requested']
+
+
+class ImportProfiler(object):
+    """
+    Measure the time spent to import each module.
+
+    The builtin ``__import__`` is replaced while the profiler is running.
+    The time of an import is given to the modules it has added in
+    ``sys.modules``, excluding the time of nested imports, which is given
+    to the modules they have added.
+    """
+
+    def __init__(self):
+        self.modules = {}
+        self.preloaded = 0
+        self._local = local()
+        self._lock = Lock()
+        self._import = None
+
+    @property
+    def running(self):
+        return self._import is not None
+
+    def start(self):
+        if self.running:
+            return
+        self.preloaded = len(sys.modules)
+        self._import = builtins.__import__
+        builtins.__import__ = self._profiled_import
+
+    def stop(self):
+        if not self.running:
+            return
+        builtins.__import__ = self._import
+        self._import = None
+
+    @property
+    def _stack(self):
+        # imports are nested in each thread
+        try:
+            return self._local.stack
+        except AttributeError:
+            stack = self._local.stack = []
+            return stack
+
+    def _profiled_import(self, name, *args, **kwargs):
+        stack = self._stack
+        with self._lock:
+            before = set(sys.modules)
+            # [time of nested imports, modules added by nested imports]
+            stack.append([0, set()])
+        start = time()
+        try:
+            return self._import(name, *args, **kwargs)
+        finally:
+            elapsed = time() - start
+            with self._lock:
+                nested_time, nested_modules = stack.pop()
+                # python 2 stores failed implicit relative imports as None
+                added = set([modname for modname in set(sys.modules) - before
+                             if sys.modules[modname] is not None])
+                own = added - nested_modules
+                if own:
+                    # the module asked is the deepest one, its packages
+                    # may have been imported with it
+                    modname = max(own, key=len)
+                    self.modules[modname] = (elapsed, elapsed - nested_time)
+                if stack:
+                    stack[-1][0] += elapsed
+                    stack[-1][1].update(added)
+
+    def report(self, out=None, limit=50):
+        """
+        Print imports sorted by cumulative time.
+
+        :param out: stream to write on (default is stderr)
+        :param limit: maximum number of modules to display
+        :type limit: :class:`int`
+        """
+        if out is None:
+            out = sys.stderr
+
+        imports = sorted(self.modules.items(), key=lambda item: -item[1][0])
+        total = sum(self_time for _, (_, self_time) in imports)
+        print('Import profile: %d modules imported in %.3fs (%d were already imported)' %
+              (len(imports), total, self.preloaded), file=out)
+        print('%10s %10s  %s' % ('cumulative', 'self', 'module'), file=out)
+        for modname, (cumulative, self_time) in imports[:limit]:
+            print('%9.1fms %9.1fms  %s' % (cumulative * 1000, self_time * 1000, modname), file=out)
+
+
+profiler = ImportProfiler()
+
+
+def profile_imports(out=None):
+    """
+    Start the profiler, and print its report when the process exits.
+
+    It does nothing if the profiler is already running.
+
+    :param out: stream to write the report on (default is stderr)
+    """
+    if profiler.running:
+        return
+    profiler.start()
+    atexit.register(profiler.report, out)
+
+
+def profile_imports_if_requested(argv=None):
+    """
+    Start the profiler if the ``--import-profile`` option is given, or if
+    the ``WEBOOB_IMPORT_PROFILE`` environment variable is set.
+
+    It is called by launchers of applications before they import anything
+    else, so imports of the application are measured too.
+
+    :param argv: command line arguments (default is sys.argv)
+    """
+    if argv is None:
+        argv = sys.argv
+    if '--import-profile' in argv or os.environ.get('WEBOOB_IMPORT_PROFILE'):
+        profile_imports()
@@ -18,6 +18,8 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 import datetime
+from threading import Lock
+from time import time
 
 try:
     import feedparser
@@ -31,7 +33,7 @@ if '5.1' > feedparser.__version__ >= '5.0':
     import re
     sgmllib.endbracket = re.compile('[<>]')
 
-__all__ = ['Entry', 'Newsfeed']
+__all__ = ['Entry', 'Newsfeed', 'FeedsCache']
 
 
 class Entry(object):
@@ -86,16 +88,191 @@ class Entry(object):
             self.id = rssid_func(self)
 
 
+class CachedFeed(object):
+    def __init__(self, url):
+        self.url = url
+        self.lock = Lock()
+        self.feed = None
+        self.etag = None
+        self.modified = None
+        self.fetched = None
+        self.indexes = {}
+
+    def is_fresh(self, ttl):
+        return self.fetched is not None and time() - self.fetched < ttl
+
+    def fetch(self):
+        feed = feedparser.parse(self.url, etag=self.etag, modified=self.modified)
+        self.fetched = time()
+        if self.feed is not None and feed.get('status') == 304:
+            # not modified since the last download
+            return
+
+        self.feed = feed
+        self.etag = feed.get('etag')
+        self.modified = feed.get('modified')
+        self.indexes = {}
+
+    def get_entries(self, rssid_func=None):
+        """
+        Get the list of entries, and a dict of entries by id.
+        """
+        with self.lock:
+            try:
+                return self.indexes[rssid_func]
+            except KeyError:
+                entries = [Entry(entry, rssid_func) for entry in self.feed['entries']]
+                by_id = {}
+                for entry in entries:
+                    # keep the first entry, as a linear search would
+                    by_id.setdefault(entry.id, entry)
+                self.indexes[rssid_func] = entries, by_id
+                return entries, by_id
+
+
+class FeedsCache(object):
+    """
+    Cache of downloaded feeds, by URL.
+
+    A feed is downloaded again only when it is older than *ttl* seconds,
+    with a conditional request (using ETag and Last-Modified headers) so
+    the server can reply that it has not changed.
+
+    :param ttl: number of seconds a feed is considered fresh
+    :type ttl: :class:`int`
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = Lock()
+        self._feeds = {}
+
+    def get(self, url, ttl=None):
+        """
+        Get the cached feed of this URL, downloading it if needed.
+
+        :rtype: :class:`CachedFeed`
+        """
+        if ttl is None:
+            ttl = self.ttl
+
+        with self._lock:
+            try:
+                cached = self._feeds[url]
+            except KeyError:
+                cached = self._feeds[url] = CachedFeed(url)
+
+        # only one thread downloads a given feed
+        with cached.lock:
+            if not cached.is_fresh(ttl):
+                cached.fetch()
+        return cached
+
+    def invalidate(self, url=None):
+        """
+        Forget a feed, or all feeds if *url* is None.
+        """
+        with self._lock:
+            if url is None:
+                self._feeds.clear()
+            else:
+                self._feeds.pop(url, None)
+
+
+FEEDS_CACHE = FeedsCache()
+
+
 class Newsfeed(object):
-    def __init__(self, url, rssid_func=None):
-        self.feed = feedparser.parse(url)
+    """
+    Parsed RSS or Atom feed.
+
+    :param url: URL of the feed
+    :param rssid_func: function to compute the id of an :class:`Entry`
+    :param ttl: number of seconds a previous download of the feed can be
+                used (default is :attr:`FeedsCache.ttl`)
+    :param cache: cache to use (default is a global one)
+    :type cache: :class:`FeedsCache`
+    """
+
+    def __init__(self, url, rssid_func=None, ttl=None, cache=None):
+        if cache is None:
+            cache = FEEDS_CACHE
+        self.cached = cache.get(url, ttl)
+        self.feed = self.cached.feed
         self.rssid_func = rssid_func
 
     def iter_entries(self):
-        for entry in self.feed['entries']:
-            yield Entry(entry, self.rssid_func)
+        entries, _ = self.cached.get_entries(self.rssid_func)
+        return iter(entries)
 
     def get_entry(self, id):
-        for entry in self.iter_entries():
-            if entry.id == id:
-                return entry
+        _, by_id = self.cached.get_entries(self.rssid_func)
+        return by_id.get(id)
+
+
+def test():
+    from threading import Thread
+    try:
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+    except ImportError:
+        from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+    FEED = b'''<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>Test</title>
+<item><guid>tag:example.org,2017:1</guid><title>First</title><link>http://example.org/1</link></item>
+<item><guid>tag:example.org,2017:2</guid><title>Second</title><link>http://example.org/2</link></item>
+</channel></rss>'''
+    ETAG = '"v1"'
+    MODIFIED = 'Mon, 02 Jan 2017 10:00:00 GMT'
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(dict((name, self.headers.get(name)) for name in ('If-None-Match', 'If-Modified-Since')))
+            if self.headers.get('If-None-Match') == ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/rss+xml')
+            self.send_header('ETag', ETAG)
+            self.send_header('Last-Modified', MODIFIED)
+            self.end_headers()
+            self.wfile.write(FEED)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        url = 'http://127.0.0.1:%d/feed.rss' % server.server_address[1]
+        cache = FeedsCache(ttl=3600)
+
+        feed = Newsfeed(url, cache=cache)
+        assert [entry.title for entry in feed.iter_entries()] == [u'First', u'Second']
+        assert feed.get_entry(u'tag:example.org,2017:2').link == u'http://example.org/2'
+        assert requests == [{'If-None-Match': None, 'If-Modified-Since': None}]
+
+        # a fresh feed isn't downloaded again
+        assert Newsfeed(url, cache=cache).cached is feed.cached
+        assert len(requests) == 1
+
+        # when the feed is too old, it is downloaded with a conditional request
+        # and the previous entries are kept if the server replies 304
+        feed = Newsfeed(url, ttl=0, cache=cache)
+        assert requests[1] == {'If-None-Match': ETAG, 'If-Modified-Since': MODIFIED}
+        assert feed.feed.get('status') == 200
+        assert [entry.title for entry in feed.iter_entries()] == [u'First', u'Second']
+        assert feed.cached.is_fresh(3600)
+
+        # an invalidated feed is downloaded again without condition
+        cache.invalidate(url)
+        feed = Newsfeed(url, cache=cache)
+        assert requests[2] == {'If-None-Match': None, 'If-Modified-Since': None}
+        assert len(list(feed.iter_entries())) == 2
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -18,9 +18,24 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+import os
+from ast import literal_eval
+from contextlib import contextmanager
 from copy import deepcopy
+from threading import RLock
 
-from .config.yamlconfig import YamlConfig
+import yaml
+
+from .compat import basestring, long, unicode
+from .config.yamlconfig import YamlConfig, WeboobDumper, Loader
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+
+__all__ = ['IStorage', 'StandardStorage', 'SQLiteStorage', 'migrate_yaml_storage']
 
 
 class IStorage(object):
@@ -81,3 +96,351 @@ class StandardStorage(IStorage):
 
     def get(self, what, name, *args, **kwargs):
         return self.config.get(what, name, *args, **kwargs)
+
+
+class SQLiteStorage(IStorage):
+    """
+    Storage in a SQLite database, where each value of the tree is stored in
+    its own row.
+
+    The whole tree is read when the storage is opened, as with
+    :class:`StandardStorage`, but :func:`save` only writes the rows which
+    have changed. It looks for changes under the paths given to
+    :func:`set` and :func:`delete` since the last save, and under the
+    paths of dicts and lists returned by :func:`get`, as they can be
+    modified in place.
+
+    The database is opened in WAL mode, so several processes can use it,
+    and the object can be used by several threads. Several saves can be
+    grouped in one transaction with :func:`batch`.
+
+    Applications use it for new storage files. A storage file of
+    :class:`StandardStorage` has to be converted first with
+    :func:`migrate_yaml_storage`.
+
+    :param path: path of the database
+    :type path: :class:`str`
+    """
+
+    SEPARATOR = u'\x1f'
+    SEPARATOR_END = u'\x20'
+    TIMEOUT = 30
+
+    def __init__(self, path):
+        if sqlite3 is None:
+            raise ImportError('Please install the python sqlite3 module')
+
+        self.path = path
+        self.lock = RLock()
+        self.config = YamlConfig(path)
+        self.batch_depth = 0
+        # paths of values changed since the last save
+        self.dirty = set()
+        # paths of values returned by get(), which can be changed in place
+        self.tracked = set()
+        # serialized values of rows by encoded paths, and number of rows
+        # under each prefix
+        self.rows = {}
+        self.prefixes = {}
+
+        if os.path.exists(path) and not is_sqlite(path):
+            raise ValueError('%s is not a SQLite database, convert it with migrate_yaml_storage()' % path)
+
+        self.db = sqlite3.connect(path, timeout=self.TIMEOUT, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS storage (path TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self.db.commit()
+        self.read()
+
+    def read(self):
+        with self.lock:
+            self.config.values = {}
+            self.rows.clear()
+            self.prefixes.clear()
+            self.tracked.clear()
+            for encoded, value in self.db.execute('SELECT path, value FROM storage ORDER BY path'):
+                path = self.decode_path(encoded)
+                self.add_row(encoded, value)
+                self.config.set(*(path + (yaml.load(value, Loader=Loader),)))
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.db.close()
+
+    @classmethod
+    def encode_key(cls, key):
+        if isinstance(key, str) and str is not unicode:
+            try:
+                key = key.decode('ascii')
+            except UnicodeDecodeError:
+                pass
+        return repr(key)
+
+    @classmethod
+    def encode_path(cls, path):
+        return cls.SEPARATOR.join([cls.encode_key(key) for key in path])
+
+    @classmethod
+    def decode_path(cls, encoded):
+        return tuple([literal_eval(key) for key in encoded.split(cls.SEPARATOR)])
+
+    @classmethod
+    def is_encodable(cls, key):
+        return key is None or isinstance(key, (basestring, bool, int, long, float))
+
+    def add_row(self, encoded, value):
+        if encoded not in self.rows:
+            parts = encoded.split(self.SEPARATOR)
+            for i in range(1, len(parts)):
+                prefix = self.SEPARATOR.join(parts[:i])
+                self.prefixes[prefix] = self.prefixes.get(prefix, 0) + 1
+        self.rows[encoded] = value
+
+    def remove_row(self, encoded):
+        del self.rows[encoded]
+        parts = encoded.split(self.SEPARATOR)
+        for i in range(1, len(parts)):
+            prefix = self.SEPARATOR.join(parts[:i])
+            self.prefixes[prefix] -= 1
+            if not self.prefixes[prefix]:
+                del self.prefixes[prefix]
+
+    def iter_subrows(self, encoded):
+        """
+        Iterate on the row of this path and all rows under it.
+        """
+        if encoded in self.rows:
+            yield encoded
+        if encoded in self.prefixes:
+            start = encoded + self.SEPARATOR
+            for row in list(self.rows):
+                if row.startswith(start):
+                    yield row
+
+    def iter_new_rows(self, path, value):
+        """
+        Iterate on rows of a value, with one row for each item of non-empty
+        dicts.
+        """
+        if isinstance(value, dict) and value and all(self.is_encodable(key) for key in value):
+            for key, subvalue in value.items():
+                for row in self.iter_new_rows(path + (key,), subvalue):
+                    yield row
+            return
+
+        yield self.encode_path(path), yaml.dump(value, Dumper=WeboobDumper)
+
+    def write_rows(self, path):
+        """
+        Write the value of a path, or remove it if it doesn't exist anymore.
+        Only rows which have changed are written.
+        """
+        try:
+            new_rows = dict(self.iter_new_rows(path, self.lookup(path)))
+        except KeyError:
+            new_rows = {}
+
+        removed = [row for row in self.iter_subrows(self.encode_path(path)) if row not in new_rows]
+        for row in removed:
+            self.remove_row(row)
+        self.db.executemany('DELETE FROM storage WHERE path = ?', [(row,) for row in removed])
+
+        for encoded, value in new_rows.items():
+            if self.rows.get(encoded) != value:
+                self.db.execute('INSERT OR REPLACE INTO storage (path, value) VALUES (?, ?)',
+                                (encoded, value))
+                self.add_row(encoded, value)
+
+    def lookup(self, path):
+        v = self.config.values
+        for key in path:
+            try:
+                v = v[key]
+            except (KeyError, IndexError, TypeError):
+                raise KeyError(path)
+        return v
+
+    def flush(self):
+        """
+        Write changed paths in the database and commit.
+        """
+        with self.lock:
+            # Changes under a changed path are written with it.
+            paths = sorted(self.dirty | self.tracked, key=len)
+            written = set()
+            for path in paths:
+                if any(path[:i] in written for i in range(len(path))):
+                    continue
+
+                # A value which is not split into rows is written entirely.
+                target = path
+                for i in range(1, len(path)):
+                    if self.encode_path(path[:i]) in self.rows:
+                        target = path[:i]
+                        break
+
+                self.write_rows(target)
+                written.add(target)
+
+            self.dirty.clear()
+            self.db.commit()
+
+    @contextmanager
+    def batch(self):
+        """
+        Group saves made in this context in one transaction, committed when
+        leaving it.
+        """
+        with self.lock:
+            self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batch_depth -= 1
+                if not self.batch_depth:
+                    self.flush()
+
+    def load(self, what, name, default={}):
+        with self.lock:
+            values = self.config.values.setdefault(what, {})
+            d = values.get(name, {})
+            values[name] = deepcopy(default)
+            values[name].update(d)
+
+    def save(self, what, name):
+        with self.lock:
+            if not self.batch_depth:
+                self.flush()
+
+    def set(self, what, name, *args):
+        with self.lock:
+            self.config.set(what, name, *args)
+            self.dirty.add((what, name) + args[:-1])
+
+    def delete(self, what, name, *args):
+        with self.lock:
+            self.config.delete(what, name, *args)
+            self.dirty.add((what, name) + args)
+
+    def get(self, what, name, *args, **kwargs):
+        with self.lock:
+            value = self.config.get(what, name, *args, **kwargs)
+            if isinstance(value, (dict, list, set)) and \
+               ('default' not in kwargs or value is not kwargs['default']):
+                self.tracked.add((what, name) + args)
+            return value
+
+
+def is_sqlite(path):
+    """
+    Check if a file is a SQLite database.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read(16) == b'SQLite format 3\x00'
+    except IOError:
+        return False
+
+
+def migrate_yaml_storage(path, backup_path=None):
+    """
+    Convert a storage file of :class:`StandardStorage` to a database of
+    :class:`SQLiteStorage`, at the same path. Nothing is done if it is
+    already a database.
+
+    :param path: path of the YAML storage file
+    :type path: :class:`str`
+    :param backup_path: where the YAML file is moved (default is *path* with
+                        a ``.yaml`` suffix)
+    :type backup_path: :class:`str`
+    """
+    if backup_path is None:
+        backup_path = path + '.yaml'
+    if is_sqlite(path):
+        return
+
+    config = YamlConfig(path)
+    config.load()
+    os.rename(path, backup_path)
+
+    storage = SQLiteStorage(path)
+    with storage.batch():
+        for what, names in config.values.items():
+            for name, values in names.items():
+                storage.set(what, name, values)
+    storage.close()
+
+
+def test():
+    import shutil
+    import tempfile
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'test.storage')
+        yaml_storage = StandardStorage(path)
+        yaml_storage.load('backends', 'news', {'seen': {}})
+        yaml_storage.set('backends', 'news', 'seen', u'1', 'comments', [1, 2])
+        yaml_storage.set('backends', 'news', 'lastpurge', 42)
+        yaml_storage.save('backends', 'news')
+
+        try:
+            SQLiteStorage(path)
+        except ValueError:
+            pass
+        else:
+            assert False, 'YAML storage opened without being converted'
+
+        migrate_yaml_storage(path)
+        storage = SQLiteStorage(path)
+        assert os.path.exists(path + '.yaml')
+        assert storage.get('backends', 'news', 'seen', u'1', 'comments') == [1, 2]
+
+        storage.set('backends', 'news', 'seen', u'2', 'comments', [3])
+        storage.delete('backends', 'news', 'seen', u'1')
+        with storage.batch():
+            storage.set('backends', 'news', 'lastpurge', 43)
+            storage.save('backends', 'news')
+            storage.set('backends', 'news', 'lastpurge', 44)
+            storage.save('backends', 'news')
+        storage.close()
+
+        storage = SQLiteStorage(path)
+        assert storage.get('backends', 'news') == {'seen': {u'2': {'comments': [3]}}, 'lastpurge': 44}
+        assert len(storage.rows) == 2
+
+        # replace a tree by a single value, and add a value inside it back
+        storage.set('backends', 'news', 'seen', [])
+        storage.save('backends', 'news')
+        storage.set('backends', 'news', 'seen', {})
+        storage.set('backends', 'news', 'seen', u'3', True)
+        storage.save('backends', 'news')
+        storage.close()
+
+        storage = SQLiteStorage(path)
+        assert storage.get('backends', 'news', 'seen') == {u'3': True}
+
+        # values returned by get() can be changed in place, and only
+        # changed rows are written
+        seen = storage.get('backends', 'news', 'seen')
+        seen[u'4'] = {'comments': [1]}
+        storage.save('backends', 'news')
+        changes = storage.db.total_changes
+        seen[u'4']['comments'].append(2)
+        del seen[u'3']
+        storage.save('backends', 'news')
+        assert storage.db.total_changes == changes + 2
+        storage.save('backends', 'news')
+        assert storage.db.total_changes == changes + 2
+        # defaults are not stored
+        storage.get('backends', 'news', 'other', default={})[u'5'] = True
+        storage.save('backends', 'news')
+        storage.close()
+
+        storage = SQLiteStorage(path)
+        assert storage.get('backends', 'news') == {'seen': {u'4': {'comments': [1, 2]}}, 'lastpurge': 44}
+        storage.close()
+    finally:
+        shutil.rmtree(tmpdir)
@@ -17,11 +17,15 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import sys
 from random import choice
 from unittest import TestCase
 
 from weboob.core import Weboob
+from weboob.core.modules import ModuleLoadError
+from weboob.tools.backend import Module
+from weboob.tools.log import settings as log_settings
 
 # This is what nose does for Python 2.6 and lower compatibility
 # We do the same so nose becomes optional
@@ -35,6 +39,16 @@ __all__ = ['BackendTest', 'SkipTest']
 
 
 class BackendTest(TestCase):
+    """
+    Base class of module tests.
+
+    Tests are run with backends of the module configured by the user. When
+    the WEBOOB_REPLAY environment variable is set to a directory where
+    responses have been saved (with the ``-a`` option of applications),
+    browsers read responses from it instead of sending requests; if no
+    backend is configured, a backend named after the module is then
+    created with default parameters.
+    """
     MODULE = None
 
     def __init__(self, *args, **kwargs):
@@ -45,7 +59,17 @@ class BackendTest(TestCase):
         self.backend = None
         self.weboob = Weboob()
 
-        if self.weboob.load_backends(modules=[self.MODULE]):
+        replay_dirname = os.environ.get('WEBOOB_REPLAY')
+        if replay_dirname:
+            log_settings['replay_dirname'] = replay_dirname
+
+        if not self.weboob.load_backends(modules=[self.MODULE]) and replay_dirname:
+            try:
+                self.weboob.load_backend(self.MODULE, self.MODULE)
+            except (ModuleLoadError, Module.ConfigError):
+                pass
+
+        if self.weboob.backend_instances:
             # provide the tests with all available backends
             self.backends = self.weboob.backend_instances
             # chose one backend (enough for most tests)